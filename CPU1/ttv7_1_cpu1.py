@@ -17,6 +17,16 @@
 #            ttv7_motors.py
 #            ttv7_threads.py
 #            ttv7_robot.py
+#            ttv7_head.py
+#            ttv7_commands.py
+#            ttv7_framing.py
+#            ttv7_executor.py
+#            ttv7_server.py
+#            ttv7_telemetry.py
+#            ttv7_imu.py
+#            ttv7_head_sensors.py
+#            ttv7_levelling.py
+#            ttv7_odometry.py
 #
 #########################################################################################
 
@@ -31,12 +41,21 @@ import multiprocessing
 import ipaddress
 import ttv7_robot
 import ttv7_motors as m
+import ttv7_head as head
+from ttv7_commands import CommandRegistry
+from ttv7_framing import REPLY, TELEMETRY
+from ttv7_server import ControlServer
+from ttv7_executor import CommandExecutor
+from ttv7_telemetry import TelemetryPublisher
+from ttv7_imu import ImuService
+from ttv7_head_sensors import HeadSensor
+from ttv7_levelling import LevellingController
+from ttv7_odometry import OdometryService
 import RPi.GPIO as GPIO
 import adafruit_icm20x
-import numpy as np
 import math
 from datetime import datetime
-from time import sleep
+from time import sleep, monotonic
 
 
 def system_initialisation():
@@ -51,9 +70,10 @@ def system_initialisation():
         
     
     # Initialise motors
+    m.discover_motors(robbie.robot_type)
     m.stop_robot()
     m.terminate_motors()
-    sleep(1)
+    m.wait_until_shut_down(m.WHEEL_MOTORS + m.LEVER_MOTORS, timeout = 1)
     m.initialise_motors()
     robbie.system_message = "Motors initialised successfully."
     sleep(1)
@@ -71,25 +91,60 @@ def system_initialisation():
 
 
  
+# The fixed addresses of the clients. Any deviation will render the robot useless.
+CLIENT_ROLES = {
+    '192.168.0.70': 'CPU2',
+    '192.168.0.80': 'CTRL',
+}
+
+
+def lane_name(msg_prefix, addr):
+    return f"{msg_prefix} {addr[0]}/{addr[1]}"
+
+
+def client_lanes(addr):
+    return [lane_name(msg_prefix, addr) for msg_prefix in ("CTRL", "ADMN")]
+
+
+def client_connected(session):
+    global connected
+    connected = True
+    robbie.system_message = f"[NEW CONNECTION] {session.addr} connected."
+    print(robbie.system_message)
+    
+    role = CLIENT_ROLES.get(session.addr[0])
+    if role == 'CPU2':
+        robbie.cpu2_connected = True
+    elif role == 'CTRL':
+        robbie.ctrl_connected = True
+
+
+def client_disconnected(session):
+    print(f"{session.addr} closed the connection.")
+    
+    role = CLIENT_ROLES.get(session.addr[0])
+    if role == 'CPU2':
+        robbie.cpu2_connected = False
+    elif role == 'CTRL':
+        robbie.ctrl_connected = False
+    
+    # Nobody is left to see the result of commands still waiting for this client.
+    executor.cancel_pending(client_lanes(session.addr))
+    unsubscribe(session)
+
+
+def message_received(request, payload):
+    # Handlers reply through the request, which gives the reply the command's request id.
+    route_message(request, request.addr, payload.decode().strip(' ,'))
+
+ 
 def run_control_program():
-    global robbie, connected, s
+    global robbie
     
     SERVER = '192.168.0.60'     # This is the server, CPU1 - this one!
     PORT = 22001
     ADDR = (SERVER, PORT)
     
-    # Create socket for the Control Client, Pi4(2) client and Server to use...
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # Using TCP.
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-    # Manage any binding errors...
-    try:
-        s.bind(ADDR)
-    except socket.error:
-        robbie.system_message = "Socket bind failed."
-
-    s.listen()
-    
     # Enable all motors and set their initial operation mode (velocity not position).
     robbie.system_message = "Initialising the V7 Robot. All wheel levers will be set to their currently located positions."
     robbie.current_command = 'INITIALISING'
@@ -97,78 +152,48 @@ def run_control_program():
     
     robbie.system_message = "Awaiting connection request from TT robot controller..."
     
+    # Serves the Control Client, Pi4(2) client and admin messages from one event loop.
+    server = ControlServer(ADDR, message_received, client_connected, client_disconnected)
     
-    while True:
-        (conn, addr) = s.accept() # Blocking call; this loop runs for each new client connection.
-        connected = True
-        robbie.system_message = f"[NEW CONNECTION] {addr} connected. {threading.activeCount()-1}"
-        print(robbie.system_message)
-        
-        print(conn,addr)
-        
-        # These IP addresses are hard coded - very fixed indeed as any deviation will render the robot useless.
-        if '192.168.0.70' in str(conn):
-            robbie.cpu2_connected = True
-        if '192.168.0.80' in str(conn):
-            robbie.ctrl_connected = True
-
-            
-        filtered_msg = ''    
-        
-        msg_route_thread = threading.Thread(target = route_messages, args=(conn, addr))
-        msg_route_thread.start()
+    # Manage any binding errors...
+    try:
+        server.run()
+    except OSError as msg:
+        robbie.system_message = "Socket bind failed."
+        print(msg)
+        logging.exception("Control server failed: ")
          
         
-def route_messages(conn, addr):
-    global robbie, connected
-    # This method provides message routing depending upon the client who just connected (indicated in the message prefix e.g. 'ADMN').
-    #e clients are: Control Client (CTRL)
+# ADMN commands which must not wait behind queued motion work.
+URGENT_ADMN = ('STOP', 'PAUSE', 'RESUME')
+
+
+def route_message(conn, addr, data):
+    msg_prefix = data[0:4]
+    filtered_msg = data[5:]
     
-    print("\n Route thread started \n")
+    # Each client's CTRL and ADMN messages are run in order on their own lane.
+    lane = lane_name(msg_prefix, addr)
     
-    connected = True
-    try:
-        while connected:
-            # Waiting for messages (this is a blocking call and other threads will be running.)
-            raw_data = conn.recv(256) # custom command messages can be very long!
-            data = raw_data.decode()
-            raw_data = ""
-            x = len(raw_data)
-            #print(f"RAW_DATA_LENGTH: -------------------------------------> {x}")
-            data = data.strip(' ,')
-            
-            msg_prefix = data[0:4]
-            filtered_msg = data[5:]
-
-            
-            # Each of these procedure calls proceses one message. (None from CPU1 of course!)
-            def controller():
-                if msg_prefix == "CTRL":
-                    robbie.ctrl_latest_message = f"{msg_prefix}~ {filtered_msg}"
-                    process_ctrl_messages(conn, filtered_msg)
-                    
-            controller_route_thread = threading.Thread(target = controller)
-            controller_route_thread.start()
-#                 controller_route_thread.join()
-                
-            
-            def admin():
-                if msg_prefix == "ADMN":
-                    robbie.admn_latest_message = f"{msg_prefix}~ {filtered_msg}"
-                    process_admn_messages(filtered_msg)       
-            
-            admin_route_thread = threading.Thread(target = admin)
-            admin_route_thread.start()
-    #                 admin_route_thread.join()
-                
-    except socket.error as msg:
-        print(msg)
-        logging.exception("Control message command failed: ")
+    if msg_prefix == "CTRL":
+        robbie.ctrl_latest_message = f"{msg_prefix}~ {filtered_msg}"
+        command = commands.lookup(filtered_msg)
         
-    except KeyboardInterrupt:
-        connected = False
-        robbie.system_message = 'Server program was terminated on the robot.'
+        if command is not None and command.while_busy:
+            executor.submit_urgent(process_ctrl_messages, conn, filtered_msg)
+        elif command_running:
+            # Not queued, or it would run as soon as the long command finishes.
+            print(f"[BUSY] {filtered_msg} ignored while a command is running.")
+        else:
+            executor.submit(lane, process_ctrl_messages, conn, filtered_msg)
+    
+    elif msg_prefix == "ADMN":
+        robbie.admn_latest_message = f"{msg_prefix}~ {filtered_msg}"
         
+        if any(word in filtered_msg for word in URGENT_ADMN):
+            executor.submit_urgent(process_admn_messages, filtered_msg, preempt = 'STOP' in filtered_msg)
+        else:
+            executor.submit(lane, process_admn_messages, filtered_msg)
     
     
 
@@ -189,7 +214,7 @@ def process_admn_messages(msg):
         
         sleep(0.1)
         
-        m.stop_robot()
+        m.stop_robot(force = True)
         
         if robbie.head_initialised:
             m.stop_head()
@@ -197,19 +222,19 @@ def process_admn_messages(msg):
     
     elif 'PAUSE' in msg:
         robbie.current_command = 'PAUSE'
-        m.halt_motors()
+        m.halt_motors(force = True)
         
         if robbie.head_initialised:
-            m.halt_head_motors()
+            m.halt_head_motors(force = True)
             
         robbie.paused = True
         
     elif 'RESUME' in msg:
         robbie.current_command = 'RESUME'
-        m.unhalt_motors()
+        m.unhalt_motors(force = True)
         
         if robbie.head_initialised:
-            m.unhalt_head_motors()
+            m.unhalt_head_motors(force = True)
             
         robbie.paused = False
         
@@ -235,8 +260,18 @@ def process_admn_messages(msg):
 
     
 
+#### CONTROLLER COMMANDS ####
+
+# Every CTRL message is looked up by its verb in this table, see ttv7_commands.py.
+commands = CommandRegistry()
+
+
+def send_reply(conn, reply):
+    conn.send_message(reply, REPLY)
+
+
 def process_ctrl_messages(conn, msg):
-    global connected, robbie,  abort, command_running, StartPosition, FinishPosition
+    global robbie, abort
     
     abort = False
     
@@ -248,397 +283,460 @@ def process_ctrl_messages(conn, msg):
     robbie.ctrl_connected = True
     
     # A 'normal' command not prefixed with 'CC', so process the message received as a single control command...
-    if not (msg[0]=='C' and msg[1]=='C'):
-        
-        if 'L-TOGGLE' in msg:
-            robbie.current_command = 'TOGGLE_LIGHTS'
-            if GPIO.input(DRIVING_LIGHTS) == 0:
-                GPIO.output(DRIVING_LIGHTS, GPIO.HIGH)
-                robbie.driving_lights = ON
-            elif GPIO.input(DRIVING_LIGHTS) == 1:
-                GPIO.output(DRIVING_LIGHTS, GPIO.LOW)
-                robbie.driving_lights = OFF
-        
-        elif not command_running:
-            
-            if 'FASTER' in msg:
-                robbie.current_command = 'FASTER'
-                faster_responses = {"FORWARD", "REVERSE", "LEFT", "RIGHT", "FASTER", "SLOWER", "NO-COMMAND"}
-                if msg in faster_responses:
-                    if robbie.speed < 4000:
-                        robbie.speed += 500
-                        #m.stop_robot()
-                        print("Speeding up to {sp}".format(sp=robbie.speed))
-                        if robbie.current_command == 'FORWARD':
-                            m.forward(robbie.speed)
-                        elif robbie.current_command == 'REVERSE':
-                            m.reverse(robbie.speed)
-                        elif robbie.current_command == 'LEFT':
-                            m.left(robbie.speed)
-                        elif robbie.current_command == 'RIGHT':
-                            m.right(robbie.speed)
-                    reply = 'ACK~SPEED:' + str(robbie.speed)
-                    conn.send(reply.encode())  # Send this value back to the controller so it can display the speed in cm/s.
-            
-            elif 'SLOWER' in msg:
-                robbie.current_command = 'SLOWER'
-                slower_responses = {"FORWARD", "REVERSE", "LEFT", "RIGHT", "FASTER", "SLOWER", "NO-COMMAND"}
-                if msg in slower_responses:
-                    if robbie.speed > 500:
-                        robbie.speed -= 500
-                        #m.stop_robot()
-                        print("Slowing down to {sp}".format(sp=robbie.speed))
-                        if robbie.current_command == 'FORWARD':
-                            m.forward(robbie.speed)
-                        elif robbie.current_command == 'REVERSE':
-                            m.reverse(robbie.speed)
-                        elif robbie.current_command == 'LEFT':
-                            m.left(robbie.speed)
-                        elif robbie.current_command == 'RIGHT':
-                            m.right(robbie.speed)
-                    reply = 'ACK~SPEED:' + str(robbie.speed)
-                    conn.send(reply.encode())  # Send this value back to the controller so it can display the speed in cm/s.
-            
-            
+    if not msg.startswith('CC'):
+        
+        # While a long command runs only the commands registered with while_busy are accepted.
+        if commands.dispatch(conn, msg, busy = command_running):
+            # Set the last_command value to the one just processed...
+            robbie.last_command = robbie.current_command
 
-            elif 'IMU' in msg:
-                
-                robbie.current_command = 'IMU'
-                reply = (str(robbie.roll) + ',' + str(robbie.pitch) + ',' + str(robbie.yaw))
-                conn.send(reply.encode())
-                print(reply)
 
-                
-            elif 'LEFT' in msg:
-                
-                robbie.current_command = 'LEFT'
-                m.left(robbie.speed)
-            
-            elif 'L-CLIMB' in msg:
-                global TubeSize
+@commands.command('L-TOGGLE', while_busy = True)
+def ctrl_toggle_lights(conn):
+    robbie.current_command = 'TOGGLE_LIGHTS'
+    if GPIO.input(DRIVING_LIGHTS) == 0:
+        GPIO.output(DRIVING_LIGHTS, GPIO.HIGH)
+        robbie.driving_lights = ON
+    elif GPIO.input(DRIVING_LIGHTS) == 1:
+        GPIO.output(DRIVING_LIGHTS, GPIO.LOW)
+        robbie.driving_lights = OFF
 
-                robbie.current_command = 'LEFT_CLIMB'
 
-                msg = msg.split(",")
-                TubeSize = msg[1]
+def change_speed(conn, step):
+    speed = robbie.speed + step
+    if 500 <= speed <= 4000:
+        robbie.speed = speed
+        print("Speed set to {sp}".format(sp=robbie.speed))
+    send_reply(conn, 'ACK~SPEED:' + str(robbie.speed))  # Send this value back to the controller so it can display the speed in cm/s.
 
-                left_climb(TubeSize)
-            
-            elif 'RIGHT' in msg:
-                
-                robbie.current_command = 'RIGHT'
-                m.right(robbie.speed)
-            
-            elif 'R-CLIMB' in msg:
- 
 
-                robbie.current_command = 'RIGHT_CLIMB'
+@commands.command('FASTER')
+def ctrl_faster(conn):
+    robbie.current_command = 'FASTER'
+    change_speed(conn, 500)
 
-                msg = msg.split(",")
-                TubeSize = msg[1]
 
-                right_climb(TubeSize)
-                
-            
-            elif 'REVERSE' in msg:
-                
-                robbie.current_command = 'REVERSE'
-                m.reverse(robbie.speed)
-            
-            elif 'RVRS-BC' in msg:
-                
-                robbie.current_command = 'RVRS-BC'
-                reverse_baffle_climb()
-            
-            elif 'FORWARD' in msg:
-                
-                robbie.current_command = 'FORWARD'
-                m.forward(robbie.speed)
-            elif 'FRWD-BC' in msg:
-                
-                robbie.current_command = 'FRWD-BC'
-                forward_baffle_climb()
-      
-            elif 'RSIDE-UP' in msg:
-                
-                robbie.current_command = 'RIGHT_AXLES_UP'
-                ru_conditions = [(robbie.lever_09["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_09["MAX_AXLE_LIFT"],
-                                 (robbie.lever_0A["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_0A["MAX_AXLE_LIFT"],
-                                 (robbie.lever_0B["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_0B["MAX_AXLE_LIFT"],
-                                 (robbie.lever_0C["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_0C["MAX_AXLE_LIFT"]]
-                if all(ru_conditions):
-                    m.axles_raise_right_side(robbie.cc_step_size)
-                    robbie.lever_09["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_0A["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_0B["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_0C["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    
-            elif 'LSIDE-DN' in msg:
-                
-                robbie.current_command = 'LEFT_AXLES_DOWN'
-                ld_conditions = [(robbie.lever_05["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_06["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_07["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_08["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0]
-                if all(ld_conditions):
-                    m.axles_lower_left_side(robbie.cc_step_size)
-                    robbie.lever_05["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_06["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_07["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_08["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size           
-                    
-            elif 'RSIDE-DN' in msg:
-                
-                robbie.current_command = 'RIGHT_AXLES_DOWN'               
-                rd_conditions = [(robbie.lever_09["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_0A["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_0B["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0,
-                                 (robbie.lever_0C["CURRENT_AXLE_LIFT"] - robbie.cc_step_size) >= 0]
-                if all(rd_conditions):
-                    m.axles_lower_right_side(robbie.cc_step_size)
-                    robbie.lever_09["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_0A["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_0B["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    robbie.lever_0C["CURRENT_AXLE_LIFT"] -= robbie.cc_step_size
-                    
-            elif 'LSIDE-UP' in msg:
-                
-                robbie.current_command = 'LEFT_AXLES_UP'
-                lu_conditions = [(robbie.lever_05["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_05["MAX_AXLE_LIFT"],
-                                 (robbie.lever_06["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_06["MAX_AXLE_LIFT"],
-                                 (robbie.lever_07["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_07["MAX_AXLE_LIFT"],
-                                 (robbie.lever_08["CURRENT_AXLE_LIFT"] + robbie.cc_step_size) <= robbie.lever_08["MAX_AXLE_LIFT"]]
-                if all(lu_conditions):
-                    m.axles_raise_left_side(robbie.cc_step_size)
-                    robbie.lever_05["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_06["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_07["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                    robbie.lever_08["CURRENT_AXLE_LIFT"] += robbie.cc_step_size
-                
-            elif 'TILTR' in msg:
-                robbie.current_command = 'TILT RIGHT'
-                tilt_right()
-            
-            elif 'TILTL' in msg:
-                robbie.current_command = 'TILT LEFT'
-                tilt_left()
-                
-            elif 'SAVEMOTORPOS' in msg:
-                robbie.current_command = 'SAVE MOTOR POSITION'
-                reply = str(m.Motor_1.getPosition())
-                conn.send(reply.encode())
-                print(reply)
+@commands.command('SLOWER')
+def ctrl_slower(conn):
+    robbie.current_command = 'SLOWER'
+    change_speed(conn, -500)
 
+
+@commands.command('IMU')
+def ctrl_imu(conn):
+    robbie.current_command = 'IMU'
+    reply = f'{robbie.roll:.2f},{robbie.pitch:.2f},{robbie.yaw:.2f}'
+    send_reply(conn, reply)
+    print(reply)
+
+
+@commands.command('COMMAND_STATS')
+def ctrl_command_stats(conn):
+    robbie.current_command = 'COMMAND STATS'
+    reply = commands.summary()
+    send_reply(conn, reply)
+    print(reply)
+
+
+@commands.command('QUEUE_STATS', while_busy = True)
+def ctrl_queue_stats(conn):
+    robbie.current_command = 'QUEUE STATS'
+    reply = executor.summary()
+    send_reply(conn, reply)
+    print(reply)
+
+
+#### TELEMETRY ####
+
+
+FAULT_CHECK_INTERVAL = 1.0      # Seconds between motor status reads for the telemetry.
+
+subscriptions = {}              # Client session -> TelemetryPublisher.
+faulty_motors = []
+faulty_motors_time = 0
+
+
+def telemetry_sample():
+    """The telemetry fields, see ttv7_telemetry.FIELDS."""
+    global faulty_motors, faulty_motors_time
     
-            # Manual head control
-            
-            
-            elif 'SLIDEANGLE' in msg:
-                msg = msg.split(",")
-                Angle = msg[1]
+    # Reading every status word is the slowest part, so it is not done every frame.
+    if monotonic() - faulty_motors_time >= FAULT_CHECK_INTERVAL:
+        faulty_motors = m.get_all_motors_status()
+        faulty_motors_time = monotonic()
+    
+    # While a segment is measured the odometry service reads the wheel positions anyway, no
+    # need for another bus turnaround.
+    positions = odometry.positions if odometry.active.is_set() else m.get_wheel_positions()
+    wheels = [0 if position is None else position for position in positions]
+    
+    sensors = (bool(robbie.slide_motor_homed) << 0) | (bool(robbie.roll_motor_homed) << 1) | (bool(robbie.pitch_motor_homed) << 2)
+    
+    return {
+        'attitude': (robbie.roll, robbie.pitch, robbie.yaw),
+        'head_sensors': sensors,
+        'levers': [lever["CURRENT_AXLE_LIFT"] for lever in left_side_levers() + right_side_levers()],
+        'wheels': wheels,
+        'speed': robbie.speed,
+        'command': robbie.current_command,
+        'faulty_motors': faulty_motors,
+    }
 
-                slide_out_distance(Angle)
-            
-            elif 'SLIDEL' in msg:
-                m.slide_motor_left()
-            
-            elif 'SLIDER' in msg:
-                m.slide_motor_right()
 
-            elif 'ROLLANGLE' in msg:
-                msg = msg.split(",")
-                Angle = msg[1]
+def unsubscribe(session):
+    publisher = subscriptions.pop(session, None)
+    if publisher is not None:
+        publisher.stop()
 
-                roll_to_angle(Angle)
-            
-            elif 'ROLLCLOCK' in msg:
-                m.roll_motor_clockwise()
-            
-            elif 'ROLLANTICLOCK' in msg:
-                m.roll_motor_anticlockwise()
 
-            elif 'PITCHANGLE' in msg:
-                msg = msg.split(",")
-                Angle = msg[1]
+@commands.command('SUBSCRIBE', ('rate', float), while_busy = True)
+def ctrl_subscribe(conn, rate):
+    # Telemetry frames per second, 0 to stop them.
+    session = conn.session
+    unsubscribe(session)
+    if rate > 0:
+        subscriptions[session] = TelemetryPublisher(telemetry_sample, lambda frame: session.send_message(frame, TELEMETRY), rate)
+    send_reply(conn, 'ACK~SUBSCRIBE:' + str(rate))
 
-                pitch_to_angle(Angle)
-                
-            elif 'PITCHUP' in msg:
-                m.pitch_motor_up()
-            
-            elif 'PITCHDOWN' in msg:
-                m.pitch_motor_down()
-            
-            elif 'HEAD_INIT' in msg:
-                m.terminate_head_motors()
-                m.initialise_head_motors()
-                robbie.system_message = "Head motors initialised successfully."
-                flash_lights()
-                
-                robbie.head_initialised = True
-            
-            elif 'HOME_HEAD' in msg:
-                home_head_motors()
-                
-            elif 'MANUAL_HOME' in msg:
-                manual_home_head_motors()
-                
-            elif 'SLIDE_HOME' in msg:
-                slide_home()
-            
-            elif 'ROLL_HOME' in msg:
-                roll_home()
-            
-            elif 'PITCH_HOME' in msg:
-                pitch_home()
-                
-            elif 'LANCE_ANGLE_A' in msg:
-                msg = msg.split(",")
 
-                SlideDistance = int(msg[1])
-                RollAngle = int(msg[2])
+#### TRACTION COMMANDS ####
 
-                Angle_A(SlideDistance, RollAngle)
-            
-            elif 'LANCE_ANGLE_B' in msg:
-                msg = msg.split(",")
 
-                SlideDistance = int(msg[1])
-                RollAngle = int(msg[2])
+TUBE_SIZES = ('S', 'M', 'B')
 
-                Angle_B(SlideDistance, RollAngle)
-                
-            elif 'HEAD_SENSORS' in msg:
-                 
-                robbie.current_command = 'HEAD SENSORS READING'
-                reply = (str(robbie.slide_motor_homed) + ',' + str(robbie.roll_motor_homed) + ',' + str(robbie.pitch_motor_homed))
-                conn.send(reply.encode())
-                print(reply)
-                
-                
-                
-                
-            # Automatic mode command
-            
-            elif 'AS' in msg:
-                
-                split_msg = msg.split("~")
-                print(split_msg)
-                
-                
-                if split_msg[1]=='F':
-                    speed = "FAST"
-                    
-                
-                elif split_msg[1]=='M':
-                    speed = "MEDIUM"
-                
-                    
-                elif split_msg[1]=='S':
-                    speed = "SLOW"
-                    
-                    
-                
-                if split_msg[2] == 'L':
-                       
-                    direction = "LEFT"
-                       
-                elif split_msg[2] == 'R':
-                    
-                    direction = "RIGHT"
-                        
-                
-                if ',' in split_msg[3]:
-                    
-                    length_split = split_msg[3].split(',')
-                    
-                    StartPosition = int(length_split[0])
-                    FinishPosition = int(length_split[1])
-                    
-                    length = -1
-                
-                else:
-                    
-                    length = int(split_msg[3])
-                    
-                piperuns = int(split_msg[4])
 
-                pipesize = split_msg[5]
-                
-                runsPerPipe = split_msg[6]
-                    
-                automatic_run(speed,direction,length,piperuns,pipesize,runsPerPipe)
-                
-            # Levers commands
-                
-            elif 'RAISE1' in msg:
-                axle_1_manual_raising()
-                    
-            elif 'LOWER1' in msg:
-                axle_1_manual_lowering()
-                
-            elif 'RAISE2' in msg:
-                axle_2_manual_raising()
-                    
-            elif 'LOWER2' in msg:
-                axle_2_manual_lowering()
-                    
-            elif 'RAISE3' in msg:
-                axle_3_manual_raising()
-                    
-            elif 'LOWER3' in msg:
-                axle_3_manual_lowering()
-                
-            elif 'RAISE4' in msg:
-                axle_4_manual_raising()
-                    
-            elif 'LOWER4' in msg:
-                axle_4_manual_lowering()
-                
-            elif 'LEVEL' in msg:
-                set_robot_level()
-                flash_lights()
-                            
-            elif 'FULL_INIT' in msg: #CHANGED FROM INIT AS PREVIOUSLY USED IN 'HEAD_INIT'
-                # The delay of 8 seconds here gives the user time to reposition the robot or reset its wheels orthogonal to the pipes in the pipe wells.
-                print("Re-initialising the V7 Robot. Set all wheel levers to their zeroed positions!")
-                robbie.current_command = 'RE-INITIALISING'
-                m.stop_robot()
-                m.terminate_motors()
-                sleep(5)
-                m.initialise_motors()
-                reset_levers_model_values()
-                flash_lights()
-                
-            elif 'MOTORS_STATUS' in msg:
-                
-                robbie.current_command = 'MOTORS STATUS'
-                m.get_all_motors_status()
-                reply = str(m.get_all_motors_status())
-                conn.send(reply.encode())
-                print(reply)
+@commands.command('LEFT')
+def ctrl_left(conn):
+    robbie.current_command = 'LEFT'
+    m.left(robbie.speed)
+
+
+@commands.command('RIGHT')
+def ctrl_right(conn):
+    robbie.current_command = 'RIGHT'
+    m.right(robbie.speed)
+
+
+@commands.command('FORWARD')
+def ctrl_forward(conn):
+    robbie.current_command = 'FORWARD'
+    m.forward(robbie.speed)
+
+
+@commands.command('REVERSE')
+def ctrl_reverse(conn):
+    robbie.current_command = 'REVERSE'
+    m.reverse(robbie.speed)
+
+
+@commands.command('L-CLIMB', ('tube size', TUBE_SIZES))
+def ctrl_left_climb(conn, size):
+    global TubeSize
+    robbie.current_command = 'LEFT_CLIMB'
+    TubeSize = size
+    left_climb(TubeSize)
+
+
+@commands.command('R-CLIMB', ('tube size', TUBE_SIZES))
+def ctrl_right_climb(conn, size):
+    global TubeSize
+    robbie.current_command = 'RIGHT_CLIMB'
+    TubeSize = size
+    right_climb(TubeSize)
+
+
+@commands.command('FRWD-BC')
+def ctrl_forward_baffle_climb(conn):
+    robbie.current_command = 'FRWD-BC'
+    forward_baffle_climb()
+
+
+@commands.command('RVRS-BC')
+def ctrl_reverse_baffle_climb(conn):
+    robbie.current_command = 'RVRS-BC'
+    reverse_baffle_climb()
+
+
+#### LEVER COMMANDS ####
+
+
+def left_side_levers():
+    return [robbie.lever_05, robbie.lever_06, robbie.lever_07, robbie.lever_08]
+
+
+def right_side_levers():
+    return [robbie.lever_09, robbie.lever_0A, robbie.lever_0B, robbie.lever_0C]
+
+
+def move_side_levers(levers, step, move):
+    """Moves one side of the robot by step (negative to lower) if every lever stays within 0 ... MAX_AXLE_LIFT."""
+    if all(0 <= lever["CURRENT_AXLE_LIFT"] + step <= lever["MAX_AXLE_LIFT"] for lever in levers):
+        move(abs(step))
+        for lever in levers:
+            lever["CURRENT_AXLE_LIFT"] += step
+
+
+@commands.command('LSIDE-UP')
+def ctrl_left_side_up(conn):
+    robbie.current_command = 'LEFT_AXLES_UP'
+    move_side_levers(left_side_levers(), robbie.cc_step_size, m.axles_raise_left_side)
+
+
+@commands.command('LSIDE-DN')
+def ctrl_left_side_down(conn):
+    robbie.current_command = 'LEFT_AXLES_DOWN'
+    move_side_levers(left_side_levers(), -robbie.cc_step_size, m.axles_lower_left_side)
+
+
+@commands.command('RSIDE-UP')
+def ctrl_right_side_up(conn):
+    robbie.current_command = 'RIGHT_AXLES_UP'
+    move_side_levers(right_side_levers(), robbie.cc_step_size, m.axles_raise_right_side)
+
+
+@commands.command('RSIDE-DN')
+def ctrl_right_side_down(conn):
+    robbie.current_command = 'RIGHT_AXLES_DOWN'
+    move_side_levers(right_side_levers(), -robbie.cc_step_size, m.axles_lower_right_side)
+
+
+@commands.command('TILTR')
+def ctrl_tilt_right(conn):
+    robbie.current_command = 'TILT RIGHT'
+    tilt_right()
+
+
+@commands.command('TILTL')
+def ctrl_tilt_left(conn):
+    robbie.current_command = 'TILT LEFT'
+    tilt_left()
+
+
+@commands.command('RAISE1')
+def ctrl_raise_axle_1(conn):
+    axle_1_manual_raising()
+
+
+@commands.command('LOWER1')
+def ctrl_lower_axle_1(conn):
+    axle_1_manual_lowering()
+
+
+@commands.command('RAISE2')
+def ctrl_raise_axle_2(conn):
+    axle_2_manual_raising()
+
+
+@commands.command('LOWER2')
+def ctrl_lower_axle_2(conn):
+    axle_2_manual_lowering()
+
+
+@commands.command('RAISE3')
+def ctrl_raise_axle_3(conn):
+    axle_3_manual_raising()
+
+
+@commands.command('LOWER3')
+def ctrl_lower_axle_3(conn):
+    axle_3_manual_lowering()
+
+
+@commands.command('RAISE4')
+def ctrl_raise_axle_4(conn):
+    axle_4_manual_raising()
+
+
+@commands.command('LOWER4')
+def ctrl_lower_axle_4(conn):
+    axle_4_manual_lowering()
+
+
+@commands.command('LEVEL')
+def ctrl_level(conn):
+    set_robot_level()
+    flash_lights()
+
+
+@commands.command('SAVEMOTORPOS')
+def ctrl_save_motor_position(conn):
+    robbie.current_command = 'SAVE MOTOR POSITION'
+    reply = str(m.Motor_1.getPosition())
+    send_reply(conn, reply)
+    print(reply)
+
+
+#### HEAD COMMANDS ####
+
+
+@commands.command('SLIDEANGLE', ('distance', int))
+def ctrl_slide_angle(conn, distance):
+    slide_out_distance(distance)
+
+
+@commands.command('SLIDEL')
+def ctrl_slide_left(conn):
+    m.slide_motor_left()
+
+
+@commands.command('SLIDER')
+def ctrl_slide_right(conn):
+    m.slide_motor_right()
+
+
+@commands.command('ROLLANGLE', ('angle', float))
+def ctrl_roll_angle(conn, angle):
+    roll_to_angle(angle)
+
+
+@commands.command('ROLLCLOCK')
+def ctrl_roll_clockwise(conn):
+    m.roll_motor_clockwise()
+
+
+@commands.command('ROLLANTICLOCK')
+def ctrl_roll_anticlockwise(conn):
+    m.roll_motor_anticlockwise()
+
+
+@commands.command('PITCHANGLE', ('angle', int))
+def ctrl_pitch_angle(conn, angle):
+    pitch_to_angle(angle)
+
+
+@commands.command('PITCHUP')
+def ctrl_pitch_up(conn):
+    m.pitch_motor_up()
+
+
+@commands.command('PITCHDOWN')
+def ctrl_pitch_down(conn):
+    m.pitch_motor_down()
+
+
+@commands.command('HEAD_INIT')
+def ctrl_head_init(conn):
+    m.terminate_head_motors()
+    m.initialise_head_motors()
+    robbie.system_message = "Head motors initialised successfully."
+    flash_lights()
+    
+    robbie.head_initialised = True
+
+
+@commands.command('HOME_HEAD')
+def ctrl_home_head(conn):
+    home_head_motors()
+
+
+@commands.command('MANUAL_HOME')
+def ctrl_manual_home(conn):
+    manual_home_head_motors()
+
+
+@commands.command('SLIDE_HOME')
+def ctrl_slide_home(conn):
+    slide_home()
+
+
+@commands.command('ROLL_HOME')
+def ctrl_roll_home(conn):
+    roll_home()
+
+
+@commands.command('PITCH_HOME')
+def ctrl_pitch_home(conn):
+    pitch_home()
+
+
+@commands.command('LANCE_ANGLE_A', ('slide distance', int), ('roll angle', int))
+def ctrl_lance_angle_a(conn, SlideDistance, RollAngle):
+    Angle_A(SlideDistance, RollAngle)
+
+
+@commands.command('LANCE_ANGLE_B', ('slide distance', int), ('roll angle', int))
+def ctrl_lance_angle_b(conn, SlideDistance, RollAngle):
+    Angle_B(SlideDistance, RollAngle)
+
+
+@commands.command('HEAD_SENSORS')
+def ctrl_head_sensors(conn):
+    robbie.current_command = 'HEAD SENSORS READING'
+    reply = (str(robbie.slide_motor_homed) + ',' + str(robbie.roll_motor_homed) + ',' + str(robbie.pitch_motor_homed))
+    send_reply(conn, reply)
+    print(reply)
+
+
+#### AUTOMATIC MODE COMMAND ####
+
+
+@commands.command('WHEEL', ('wheel diameter', float), while_busy = True)
+def ctrl_wheel(conn, diameter):
+    """ The diameter in mm of the wheels fitted, for the odometry. """
+    odometry.set_wheel_diameter(diameter)
+    print(f"Wheel diameter set to {diameter}mm")
+
+
+AUTOMATIC_SPEEDS = {'F': "FAST", 'M': "MEDIUM", 'S': "SLOW"}
+AUTOMATIC_DIRECTIONS = {'L': "LEFT", 'R': "RIGHT"}
+
+
+@commands.command('AS', ('speed', tuple(AUTOMATIC_SPEEDS)), ('direction', tuple(AUTOMATIC_DIRECTIONS)),
+                  ('length', str), ('pipe runs', int), ('pipe size', str), ('runs per pipe', str))
+def ctrl_automatic_run(conn, speed, direction, length, piperuns, pipesize, runsPerPipe):
+    global StartPosition, FinishPosition
+    
+    # The length is either a distance, or the start and finish positions saved with SAVEMOTORPOS.
+    if ',' in length:
+        length_split = length.split(',')
         
-                
-            elif 'EXIT' in msg: # Client wants to exit the connection, but which client?
-                connected = False
-                robbie.current_command = 'EXIT'
-                robbie.ctrl_connected = False
-                #reply = 'ACK: ' + msg
-                #conn.send(reply.encode())
-                print("The Operator has terminated the robot control program.")
-                m.stop_robot()
-                m.terminate_motors()
-                conn.close()
-                #sys.exit()
-            
-            else:
-                # An unknown command is received.
-                print(f'[UNKNOWN COMMAND] {msg} >>>')
-                logging.warning('[UNKNOWN COMMAND] %s >>>', msg)
-                
-            # Set the last_command value to the one just processed...
-            robbie.last_command = robbie.current_command
-            
+        StartPosition = int(length_split[0])
+        FinishPosition = int(length_split[1])
+        
+        length = -1
+    
+    else:
+        
+        length = int(length)
+    
+    automatic_run(AUTOMATIC_SPEEDS[speed], AUTOMATIC_DIRECTIONS[direction], length, piperuns, pipesize, runsPerPipe)
+
+
+#### SYSTEM COMMANDS ####
+
+
+@commands.command('FULL_INIT')
+def ctrl_full_init(conn):
+    # The delay of 8 seconds here gives the user time to reposition the robot or reset its wheels orthogonal to the pipes in the pipe wells.
+    print("Re-initialising the V7 Robot. Set all wheel levers to their zeroed positions!")
+    robbie.current_command = 'RE-INITIALISING'
+    m.stop_robot()
+    m.terminate_motors()
+    m.wait_until_shut_down(m.WHEEL_MOTORS + m.LEVER_MOTORS)
+    m.initialise_motors()
+    reset_levers_model_values()
+    flash_lights()
+
+
+@commands.command('MOTORS_STATUS')
+def ctrl_motors_status(conn):
+    robbie.current_command = 'MOTORS STATUS'
+    reply = str(m.get_all_motors_status())
+    send_reply(conn, reply)
+    print(reply)
+
+
+@commands.command('EXIT')
+def ctrl_exit(conn):
+    # Client wants to exit the connection, but which client?
+    global connected
+    connected = False
+    robbie.current_command = 'EXIT'
+    robbie.ctrl_connected = False
+    print("The Operator has terminated the robot control program.")
+    m.stop_robot()
+    m.terminate_motors()
+    conn.close()
     
  
 #### LIGHTS FUNCTION ####
@@ -675,68 +773,48 @@ def flash_lights():
     
 
 
-def get_roll_pitch_yaw_data():
-    global robbie, i2c, icm
+def store_attitude(snapshot):
+    """ Called by the IMU service (ttv7_imu.py) with every new snapshot of the filtered roll, pitch and yaw in degrees """
+    # Roll is used by the LEFT/RIGHT climbing algorithm to determine how the 'turn' left or right is progressing.
     
-    """ Thread procedure that collects the Roll, pitch and Yaw data from the IMU chip on the sensors interface board """
-    # Only interested in Roll at present and only 60 roll lookup values in list at prresent - this is the most roll the robot can tolerate!
-    icm_roll_value = 0
-    icm_pitch_value = 0
-    icm_yaw_value = 0
-    
-    while True:
-        
-        N = 100
-        icm_roll = np.zeros((N,),dtype=float)
-     
-        for i in range(N):
-        
-            icm_roll[i] = icm.acceleration[0]
-    
-    
-        icm_roll_avg = np.mean(icm_roll)
-        
-        icm_roll_value = icm_roll_avg * 100
-        icm_pitch_value = icm.acceleration[1] * 100
-        icm_yaw_value = icm.acceleration[2] * 100
-        
-        # Roll is used by the LEFT/RIGHT climbing algorithm to determine how the 'turn' left or right is progressing.
-        
-        # Store the latest value of roll in Robbie's object model.
-        robbie.roll = int(icm_roll_value)
-        robbie.pitch = int(icm_pitch_value)
-        robbie.yaw = int(icm_yaw_value)
+    # Store the latest value of roll in Robbie's object model.
+    robbie.roll = round(snapshot.roll, 2)
+    robbie.pitch = round(snapshot.pitch, 2)
+    robbie.yaw = round(snapshot.yaw, 2)
         
         
         
 
 #### LANCE SENSORS FUNCTION ####
 
-def read_head_sensors():
-    global robbie
-    
-    while True:
+def slide_sensor_changed(homed):
+    robbie.slide_motor_homed = homed
 
-        if GPIO.input(SLIDE_SENSOR):
-                    robbie.slide_motor_homed = False
-        else:
-            robbie.slide_motor_homed = True
 
-        
-        if GPIO.input(ROLL_SENSOR):
-            robbie.roll_motor_homed = True
-        else:
-            robbie.roll_motor_homed = False
+def roll_sensor_changed(homed):
+    robbie.roll_motor_homed = homed
 
-            
-        if GPIO.input(PITCH_SENSOR):
-            robbie.pitch_motor_homed = True
-        else:
-            robbie.pitch_motor_homed = False
-            
-#         print(robbie.slide_motor_homed, robbie.roll_motor_homed, robbie.pitch_motor_homed)
 
-        sleep(0.1)
+def pitch_sensor_changed(homed):
+    robbie.pitch_motor_homed = homed
+
+
+def slide_homed(edge_time):
+    """ Runs on the GPIO callback thread the moment the slide sensor reports home. """
+    m.stop_slide_motor()
+    robbie.slide_home_position = m.Motor_D.getPosition()
+
+
+def roll_homed(edge_time):
+    """ Runs on the GPIO callback thread the moment the roll sensor reports home. """
+    # The home position is taken after roll_home()'s move off the sensor, not here.
+    m.stop_roll_motor()
+
+
+def pitch_homed(edge_time):
+    """ Runs on the GPIO callback thread the moment the pitch sensor reports home. """
+    m.stop_pitch_motor()
+    robbie.pitch_home_position = m.Motor_F.getPosition()
 
 
 #### ROBOT LEVELLING ####
@@ -757,33 +835,38 @@ def tilt_left():
         
         robbie.tilt_steps["CURRENT_TILT"] -= 1
 
+def move_levels(left, right):
+    """
+    Raises (positive) or lowers (negative) each side of levers for the levelling controller.
+    Returns whether they reached their targets and how far each lever really lifted.
+    """
+    before = m.get_lever_positions()
+    m.axles_lift_sides(left, right)
+    
+    while True:
+        reached = m.wait_for_levers(timeout = 3, abort = lambda: abort)
+        if not robbie.paused or abort:
+            break
+        # PAUSE halts the levers, which then report target reached where they stopped.
+        # They carry on to their targets on RESUME, so wait for that and then for them.
+        while robbie.paused and not abort:
+            sleep(0.1)
+    
+    after = m.get_lever_positions()
+    lifts = [None if a is None or b is None else motor.sign * (a - b) for motor, b, a in zip(m.LEVER_MOTORS, before, after)]
+    
+    return reached, lifts
+
+
 def set_robot_level() -> bool:
     """ Sets the robot to as close to horizontal as it can get whenever this function is called. """
-    # Uses the real IMU values (which are probably degrees), not the quantised values! 
-    horizontal = False
-    # IMU value is 0 => level, do nothing.
-
-    while not horizontal:
-               
-        # IMU roll negative => raise the left side
-        while robbie.roll > -10:
-            
-            m.axles_lower_right_side(robbie.mm_step_size)
-            m.axles_raise_left_side(robbie.mm_step_size)
-            sleep(0.2)
-            
-        horizontal = True
-
-        # IMU roll positive => raise the right side.
-        while robbie.roll < -15:                                                                                                                                                                                                                           
-           
-            m.axles_lower_left_side(robbie.mm_step_size)
-            m.axles_raise_right_side(robbie.mm_step_size)
-            sleep(0.2)
-            
-        horizontal = True
-
-    return(horizontal)
+    # Closed loop on the filtered IMU roll in degrees, see ttv7_levelling.py.
+    result = levelling.run(abort = lambda: abort, paused = lambda: robbie.paused)
+    
+    print(f"[LEVEL] {result}")
+    logging.info("Levelling: %s", result)
+    
+    return(result.converged)
 
 
 
@@ -791,39 +874,46 @@ def set_robot_level() -> bool:
 
 #### AUTOMATIC RUN FUNCTIONS ####
     
+RUN_TIMEOUT = float('inf')   # A run segment can be paused for as long as the operator wants.
+RUN_POLL_INTERVAL = 0.5      # Seconds between status reads, the drives stop at the targets by themselves.
+
+
+def move_wheels_to(targets):
+    """ Drives the wheels to absolute targets in profile position mode, the drives stop there themselves. """
+    reached = False
+    
+    while not abort:
+        m.drive_to_positions(targets, robbie.flush_speed)
+        m.wait_for_wheels(timeout = RUN_TIMEOUT, abort = lambda: abort or robbie.paused, interval = RUN_POLL_INTERVAL)
+        
+        # PAUSE halts the drives, and a halted drive reports target reached wherever it stopped.
+        while robbie.paused and not abort:
+            sleep(0.1)
+        
+        reached = m.wheels_at_targets(targets)
+        if reached:
+            break
+    
+    m.wheels_velocity_mode()
+    
+    if abort:
+        robbie.system_message = "Aborting Automatic Sequence command"
+    
+    return reached
+
+
 def reposition_robot_to_start_position():
     
-    CurrentMotorPos = m.Motor_1.getPosition()
+    positions = m.get_wheel_positions()
     
     sleep(1)
-        
-    if CurrentMotorPos < StartPosition:
-        
-        m.reverse(robbie.flush_speed)
-        
-        while m.Motor_1.getPosition() < StartPosition:
-            if abort == True: # Check to see if someone wants the robot stopped by putting their hand in front (<10cm) of the rear LIDAR unit.
-                m.stop_robot()
-                robbie.system_message = "Aborting Automatic Sequence command"
-                break
-            
-            sleep(0.1)
-            
-        m.stop_robot()
     
-    elif CurrentMotorPos > StartPosition:
-        
-        m.forward(robbie.flush_speed)
-        
-        while m.Motor_1.getPosition() > StartPosition:
-            if abort == True: # Check to see if someone wants the robot stopped by putting their hand in front (<10cm) of the rear LIDAR unit.
-                m.stop_robot()
-                robbie.system_message = "Aborting Automatic Sequence command"
-                break
-            
-            sleep(0.1)
-            
-        m.stop_robot()
+    if positions[0] is None:
+        print("Cannot reposition: Motor_1 is not answering.")
+        return
+    
+    # StartPosition is a Motor_1 position, the other wheels move the same distance.
+    move_wheels_to(m.wheel_targets(positions, (StartPosition - positions[0]) * m.Motor_1.sign))
 
     sleep(3)
         
@@ -841,15 +931,12 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
 # Select speed of the automatic run   
     if speed == "FAST":
         robbie.flush_speed = 3000
-        odometry_steps = 10.35
     
     elif speed == "MEDIUM":
         robbie.flush_speed = 2000
-        odometry_steps = 6.9
 
     elif speed == "SLOW":
         robbie.flush_speed = 1000
-        odometry_steps = 3.45
 
 
 # Select length of the automatic run
@@ -870,25 +957,14 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
                     
                     ### FOWRWARD ###
                     
-                    CurrentPosition = m.Motor_1.getPosition()
+                    # Every wheel runs PosDifference forwards (Motor_1 from Start to Finish) and stops there.
+                    CurrentPositions = m.get_wheel_positions()
               
-                    m.forward(robbie.flush_speed)
                     robbie.system_message = 'FORWARD'
-                    
-                    
-                    while(m.Motor_1.getPosition() > (CurrentPosition - PosDifference)):
-                        if abort == True: # Check to see if someone wants the robot stopped by pressing the STOP button.
-                            
-                            m.stop_robot()
-                                
-                            robbie.system_message = "Aborting Automatic Sequence command"
-                            break
-
-                        sleep(0.5)
-                        print(m.Motor_1.getPosition(),(CurrentPosition + PosDifference))
+                    move_wheels_to(m.wheel_targets(CurrentPositions, PosDifference))
                      
-                    robbie.system_message = 'STOPPED'
-                    m.stop_robot()
+                    if not abort:
+                        robbie.system_message = 'STOPPED'
                     
                         
                     set_robot_level()
@@ -898,24 +974,11 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
                     if not abort:
                      
                         ### REVERSE IN THE CURRENT TUBE ###
-                        m.reverse(robbie.flush_speed)
+                        # Back to 300 short of where the forward run started.
                         robbie.system_message = 'REVERSE'
-                        odom_position = 0
-                        
-
-                        while (m.Motor_1.getPosition() < (CurrentPosition) - 300):
-                            if abort == True: # Check to see if someone wants the robot stopped by pressing the STOP button.
-                                
-                                m.stop_robot()
-                                    
-                                robbie.system_message = "Aborting Automatic Sequence command"
-                                break
-                            
-                            
-                            sleep(0.5)
+                        move_wheels_to(m.wheel_targets(CurrentPositions, 300))
                         
                         robbie.sytem_message = 'STOPPED'
-                        m.stop_robot()
 
 
                 if not abort:
@@ -958,28 +1021,25 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
             for n in range(0, piperuns):
                 for i in range(0, runsPerPipe):
               
+                    # Distance travelled in the tube is measured by the odometry, in mm.
+                    odometry.begin()
+                    
                     m.forward(robbie.flush_speed)
                     robbie.system_message = 'FORWARD'
                     
-                    
-                    odom_position = 0
-                    
-                    while((overall_run_length - odom_position) > 60):
+                    while((overall_run_length - abs(odometry.distance) / 10) > 60):
                         if abort == True: # Check to see if someone wants the robot stopped by pressing the STOP button.
                             
                             m.stop_robot()
                                 
                             robbie.system_message = "Aborting Automatic Sequence command"
                             break
-                        
-     
-                        if not robbie.paused:
-                            odom_position += odometry_steps
 
-                        sleep(0.5)
+                        sleep(0.1)
                      
                     robbie.system_message = 'STOPPED'
                     m.stop_robot()
+                    odometry.end()
                     
                     set_robot_level()
                     sleep(0.5)
@@ -988,13 +1048,13 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
                     if not abort:
                      
                         # Reverse, and back down the current tube...
+                        odometry.begin()
                         m.reverse(robbie.flush_speed)
                         robbie.system_message = 'REVERSE'
-                        odom_position = 0
                         sleep(1)
 
 
-                        while((overall_run_length - odom_position) > 60):
+                        while((overall_run_length - abs(odometry.distance) / 10) > 60):
                             if abort == True: # Check to see if someone wants the robot stopped by pressing the STOP button.
                                 
                                 m.stop_robot()
@@ -1002,13 +1062,11 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
                                 robbie.system_message = "Aborting Automatic Sequence command"
                                 break
                             
-                            if not robbie.paused:
-                                odom_position += odometry_steps
-                            
-                            sleep(0.5)
+                            sleep(0.1)
                         
                         robbie.sytem_message = 'STOPPED'
                         m.stop_robot()
+                        odometry.end()
 
 
                 if not abort:
@@ -1052,6 +1110,12 @@ def automatic_run(speed, direction, length, piperuns, pipesize, runsPerPipe):
 
 #### PIPE CLIMBING FUNCTIONS ####
 
+# Roll in degrees. A turn only starts within CLIMB_LEVEL_ROLL of level and ends when the roll
+# passes the threshold for the tube size. They are the 100 and 150/200/300 the climbs were tuned
+# with when roll was the raw acceleration x 100, converted with asin(value / 100 / g).
+CLIMB_LEVEL_ROLL = 5.85
+CLIMB_ROLL_THRESHOLDS = {"S": 8.8, "M": 11.8, "B": 17.8}
+
   
 
   
@@ -1062,15 +1126,15 @@ def left_climb(TubeSize):
 
     if TubeSize == "S":
         ClimbTimeLimit = 5
-        RollThreshold = -150
+        RollThreshold = -CLIMB_ROLL_THRESHOLDS["S"]
 
     elif TubeSize == "M":
         ClimbTimeLimit = 15
-        RollThreshold = -200
+        RollThreshold = -CLIMB_ROLL_THRESHOLDS["M"]
 
     elif TubeSize == "B":
         ClimbTimeLimit = 25
-        RollThreshold = -300
+        RollThreshold = -CLIMB_ROLL_THRESHOLDS["B"]
     
     # Set the speed to move the robot rightwards as though on flat ground.
     m.stop_robot()
@@ -1083,7 +1147,7 @@ def left_climb(TubeSize):
     while not abort and n < 1:
         
         # Only allow this left turn if robbie is close to level...
-        if (abs(robbie.roll) <= 100):
+        if (abs(robbie.roll) <= CLIMB_LEVEL_ROLL):
             m.left_1_2(robbie.CLIMB_SPEED)                          # TL
             sleep(0.25)                                            #
             m.axles_raise_left_side_climb(robbie.cc_step_size * 2)    # LU, LU
@@ -1124,15 +1188,15 @@ def right_climb(TubeSize):
     
     if TubeSize == "S":
         ClimbTimeLimit = 5
-        RollThreshold = 150
+        RollThreshold = CLIMB_ROLL_THRESHOLDS["S"]
 
     elif TubeSize == "M":
         ClimbTimeLimit = 15
-        RollThreshold = 200
+        RollThreshold = CLIMB_ROLL_THRESHOLDS["M"]
 
     elif TubeSize == "B":
         ClimbTimeLimit = 25
-        RollThreshold = 300
+        RollThreshold = CLIMB_ROLL_THRESHOLDS["B"]
    
     # Instrumented version of right_climb(TubeSize) intended to prove that the IMU is working OK and is actually useful!
     # Set the speed to move the robot rightwards as though on flat ground.
@@ -1145,7 +1209,7 @@ def right_climb(TubeSize):
 
     while not abort and n < 1:
        
-        if (abs(robbie.roll) <= 100):
+        if (abs(robbie.roll) <= CLIMB_LEVEL_ROLL):
             m.right_3_4(robbie.CLIMB_SPEED)                         # TR - wheels turning right now...
             sleep(0.25)
             m.axles_raise_right_side_climb(robbie.cc_step_size * 2)   # RU, RU
@@ -1215,7 +1279,7 @@ def axle_1_raising():
         m.axle_1_raise(robbie.hl_step_size)
         robbie.lever_08["CURRENT_AXLE_LIFT"] += robbie.hl_step_size
         robbie.lever_09["CURRENT_AXLE_LIFT"] += robbie.hl_step_size
-        sleep(1)
+        m.wait_for_axle(1, timeout = 1, abort = lambda: abort)
         m.Motor_2.setTargetVelocity(0)
         m.Motor_3.setTargetVelocity(-0)
         
@@ -1229,7 +1293,7 @@ def axle_1_manual_raising():
         m.axle_1_raise(robbie.sl_step_size)
         robbie.lever_08["CURRENT_AXLE_LIFT"] += robbie.sl_step_size
         robbie.lever_09["CURRENT_AXLE_LIFT"] += robbie.sl_step_size
-        sleep(0.5)
+        m.wait_for_axle(1, timeout = 0.5, abort = lambda: abort)
         m.Motor_2.setTargetVelocity(0)
         m.Motor_3.setTargetVelocity(-0)
         
@@ -1244,7 +1308,7 @@ def axle_1_lowering():
         m.axle_1_lower(robbie.hl_step_size)
         robbie.lever_08["CURRENT_AXLE_LIFT"] -= robbie.hl_step_size
         robbie.lever_09["CURRENT_AXLE_LIFT"] -= robbie.hl_step_size
-        sleep(1)
+        m.wait_for_axle(1, timeout = 1, abort = lambda: abort)
         m.Motor_2.setTargetVelocity(0)
         m.Motor_3.setTargetVelocity(-0)
         
@@ -1259,7 +1323,7 @@ def axle_1_manual_lowering():
         m.axle_1_lower(robbie.sl_step_size)
         robbie.lever_08["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
         robbie.lever_09["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
-        sleep(0.5)
+        m.wait_for_axle(1, timeout = 0.5, abort = lambda: abort)
         m.Motor_2.setTargetVelocity(0)
         m.Motor_3.setTargetVelocity(-0)
         
@@ -1353,7 +1417,7 @@ def axle_4_raising():
         m.axle_4_raise(robbie.hl_step_size)
         robbie.lever_05["CURRENT_AXLE_LIFT"] += robbie.hl_step_size
         robbie.lever_0C["CURRENT_AXLE_LIFT"] += robbie.hl_step_size
-        sleep(1)
+        m.wait_for_axle(4, timeout = 1, abort = lambda: abort)
         m.Motor_1.setTargetVelocity(0)
         m.Motor_4.setTargetVelocity(0)
         
@@ -1367,7 +1431,7 @@ def axle_4_manual_raising():
         m.axle_4_raise(robbie.sl_step_size)
         robbie.lever_05["CURRENT_AXLE_LIFT"] += robbie.sl_step_size
         robbie.lever_0C["CURRENT_AXLE_LIFT"] += robbie.sl_step_size
-        sleep(0.5)
+        m.wait_for_axle(4, timeout = 0.5, abort = lambda: abort)
         m.Motor_1.setTargetVelocity(0)
         m.Motor_4.setTargetVelocity(0)
     
@@ -1382,7 +1446,7 @@ def axle_4_lowering():
         m.axle_4_lower(robbie.hl_step_size)
         robbie.lever_05["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
         robbie.lever_0C["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
-        sleep(1)
+        m.wait_for_axle(4, timeout = 1, abort = lambda: abort)
         m.Motor_1.setTargetVelocity(0)
         m.Motor_4.setTargetVelocity(0)
         
@@ -1396,7 +1460,7 @@ def axle_4_manual_lowering():
         m.axle_4_lower(robbie.sl_step_size)
         robbie.lever_05["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
         robbie.lever_0C["CURRENT_AXLE_LIFT"] -= robbie.sl_step_size
-        sleep(0.5)
+        m.wait_for_axle(4, timeout = 0.5, abort = lambda: abort)
         m.Motor_1.setTargetVelocity(0)
         m.Motor_4.setTargetVelocity(0)
         
@@ -1507,7 +1571,7 @@ def forward_baffle_climb():
         axle_3_raising()    
         m.axle_4_lower(400)   
        
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         start_distance = robbie.rear_lidar_value
         m.forward(robbie.BAFFLE_CLIMB_SPEED)
 #         while robbie.rear_lidar_value < start_distance + 18:
@@ -1522,7 +1586,7 @@ def forward_baffle_climb():
         axle_2_raising()
         
         
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         start_distance = robbie.rear_lidar_value
         m.forward(robbie.BAFFLE_CLIMB_SPEED)
 #         while robbie.rear_lidar_value < start_distance + 24:
@@ -1533,10 +1597,10 @@ def forward_baffle_climb():
           
           
         axle_3_lowering()
-        sleep(1)
+        m.wait_for_axle(3, timeout = 1, abort = lambda: abort)
         axle_4_raising()
         m.axle_1_raise(400)
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         
         start_distance = robbie.rear_lidar_value
         m.forward(robbie.BAFFLE_CLIMB_SPEED)
@@ -1568,7 +1632,7 @@ def reverse_baffle_climb():
         axle_2_raising()    
         m.axle_1_lower(400)   
        
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         start_distance = robbie.rear_lidar_value
         m.reverse(robbie.BAFFLE_CLIMB_SPEED)
         while robbie.rear_lidar_value > start_distance - 17:
@@ -1582,7 +1646,7 @@ def reverse_baffle_climb():
         axle_3_raising()
         
         
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         start_distance = robbie.rear_lidar_value
         m.reverse(robbie.BAFFLE_CLIMB_SPEED)
         while robbie.rear_lidar_value > start_distance - 23:
@@ -1592,12 +1656,12 @@ def reverse_baffle_climb():
           
           
         axle_2_lowering()
-        sleep(1)
+        m.wait_for_axle(2, timeout = 1, abort = lambda: abort)
         axle_1_raising()
         m.axle_4_raise(400)
 
         
-        sleep(2)
+        m.wait_for_levers(timeout = 2, abort = lambda: abort)
         start_distance = robbie.rear_lidar_value
         m.reverse(robbie.BAFFLE_CLIMB_SPEED)
         while robbie.rear_lidar_value > start_distance - 22:
@@ -1633,16 +1697,12 @@ def slide_home():
     
     """ The slide could be anywhere so try to wind it in unless already homed. """
     if not robbie.slide_motor_homed or abort:
-        # Always negative (anticlockwise) to home...
-        m.home_slide_motor()
-        while True:
-            if robbie.slide_motor_homed or abort:
-                m.stop_slide_motor()
-                robbie.slide_home_position = m.Motor_D.getPosition()
-                sleep(0.5)
-                break
- 
-            sleep(0.1)
+        # Always negative (anticlockwise) to home... slide_homed() stops it at the sensor edge.
+        if slide_sensor.arm(slide_homed):
+            m.home_slide_motor()
+            slide_sensor.wait(abort = lambda: abort)
+            slide_sensor.disarm()
+            sleep(0.5)
             
         m.stop_slide_motor()
         
@@ -1650,7 +1710,7 @@ def slide_home():
             
             m.Motor_D.setPositionMode()
             m.Motor_D.setPositionRelative(-3000)
-            sleep(3)
+            m.Motor_D.waitTargetReached(timeout = 3, abort = lambda: abort)
             
     command_running = False
 
@@ -1670,15 +1730,12 @@ def roll_home():
     
     """ The lance head could be rotated to any angle so crank it in to the home position unless it is already there. """
     if not robbie.roll_motor_homed or abort:
-        m.home_roll_motor()
-        while True:
-            if robbie.roll_motor_homed or abort:
-                sleep(0.1)
-                break
+        # roll_homed() stops it at the sensor edge.
+        if roll_sensor.arm(roll_homed):
+            m.home_roll_motor()
+            roll_sensor.wait(abort = lambda: abort)
+            roll_sensor.disarm()
             
-            sleep(0.1)
-            
-        sleep(0.15)    
         m.stop_roll_motor()
         
        
@@ -1687,7 +1744,7 @@ def roll_home():
             sleep(1)
             m.Motor_E.setPositionMode()
             m.Motor_E.setPositionRelative(1800)
-            sleep(3)
+            m.Motor_E.waitTargetReached(timeout = 3, abort = lambda: abort)
             robbie.roll_home_position = m.Motor_E.getPosition()
             
 
@@ -1707,19 +1764,15 @@ def pitch_home():
     
     """ The lance could be pointing (pitch) at any angle, so crank it in to 0 degrees (i.e. horizontal) unless it is already there. """
     m.Motor_F.setPositionRelative(-200)
-    sleep(1)
+    m.Motor_F.waitTargetReached(timeout = 1, abort = lambda: abort)
         
     if not robbie.pitch_motor_homed or abort:
-        m.home_pitch_motor()
-
-        while True:
-            if robbie.pitch_motor_homed or abort:
-                m.stop_pitch_motor()
-                robbie.pitch_home_position = m.Motor_F.getPosition()
-                sleep(0.5)
-                break
-            
-            sleep(0.1)
+        # pitch_homed() stops it at the sensor edge.
+        if pitch_sensor.arm(pitch_homed):
+            m.home_pitch_motor()
+            pitch_sensor.wait(abort = lambda: abort)
+            pitch_sensor.disarm()
+            sleep(0.5)
         
         m.stop_pitch_motor()
 
@@ -1734,9 +1787,9 @@ def oscillate_lance(StartOscillationAngle, FinishOscillationAngle):
         print(StartOscillationAngle, FinishOscillationAngle)
         m.Motor_F.setPositionMode()
         m.Motor_F.setPositionAbsolute(robbie.pitch_home_position - StartOscillationAngle*10)
-        sleep(3)
+        m.Motor_F.waitTargetReached(timeout = 3, abort = lambda: not oscillate)
         m.Motor_F.setPositionAbsolute(robbie.pitch_home_position - FinishOscillationAngle*10)
-        sleep(3)
+        m.Motor_F.waitTargetReached(timeout = 3, abort = lambda: not oscillate)
     
 
 def home_head_motors():
@@ -1755,9 +1808,9 @@ def home_head_motors():
     elif robbie.head_initialised and robbie.head_homed:
     
         m.Motor_F.setPositionAbsolute(robbie.pitch_home_position)
-        sleep(5)
+        m.Motor_F.waitTargetReached(timeout = 5, abort = lambda: abort)
         m.Motor_E.setPositionAbsolute(robbie.roll_home_position)
-        sleep(5)
+        m.Motor_E.waitTargetReached(timeout = 5, abort = lambda: abort)
         m.Motor_D.setPositionAbsolute(robbie.slide_home_position)
         
     else:
@@ -1785,17 +1838,8 @@ def manual_home_head_motors():
     
 def move_lance_to_position(SlideDistance, RollAngle):
     """Takes a list generated by 'get_head_positions' and moves the slide and roll motors to the required position"""
-    m.Motor_D.setPositionMode()
-    m.Motor_E.setPositionMode()
-    
-    SlideDistance = -SlideDistance*1000
-    
-    m.Motor_F.setPositionAbsolute(robbie.pitch_home_position)
-    sleep(5)
-    m.Motor_D.setPositionAbsolute(robbie.slide_home_position + SlideDistance)
-    sleep(10)
-    m.Motor_E.setPositionAbsolute(robbie.roll_home_position + RollAngle)
-    sleep(3)
+    # Pitch goes level first, then slide and roll move together, see ttv7_head.py.
+    return head.move_head(robbie, SlideDistance, RollAngle, pitch = 0, abort = lambda: abort)
     
 def Angle_A(SlideDistance,RollAngle):
     global command_running
@@ -1902,6 +1946,9 @@ if __name__ == "__main__":
     
     StartPosition = 0
     FinishPosition = 0
+    
+    # Runs the commands received on the control socket.
+    executor = CommandExecutor()
    
     # Create an instance of the Robot!
     robbie = ttv7_robot.robot('FLUSHING', 6.5)  # To be read from the configuration spreadsheet.
@@ -1913,9 +1960,10 @@ if __name__ == "__main__":
     GPIO.setup(DRIVING_LIGHTS, GPIO.OUT)
     GPIO.output(DRIVING_LIGHTS, GPIO.LOW)
 
-    GPIO.setup(SLIDE_SENSOR, GPIO.IN)
-    GPIO.setup(ROLL_SENSOR, GPIO.IN)
-    GPIO.setup(PITCH_SENSOR, GPIO.IN)
+    # The head homing sensors keep robbie.*_motor_homed up to date from GPIO edges, no polling.
+    slide_sensor = HeadSensor(SLIDE_SENSOR, GPIO.LOW, on_change = slide_sensor_changed)
+    roll_sensor = HeadSensor(ROLL_SENSOR, GPIO.HIGH, on_change = roll_sensor_changed)
+    pitch_sensor = HeadSensor(PITCH_SENSOR, GPIO.HIGH, on_change = pitch_sensor_changed)
 
     # Initialise variables --------------------------------------------------------------------------------
     sesison_id = "XYZ123"
@@ -1928,11 +1976,17 @@ if __name__ == "__main__":
     
     # Start critical threads...
     
-    IMU_thread = threading.Thread(target=get_roll_pitch_yaw_data)
-    IMU_thread.start()
+    # Samples the IMU at a fixed rate, every snapshot updates robbie.roll, pitch and yaw.
+    imu = ImuService(icm, on_snapshot = store_attitude)
+    imu.start()
+    
+    # Distance travelled and velocity from the traction encoders, while a run segment is measured.
+    odometry = OdometryService(m.WHEEL_MOTORS)
+    odometry.start()
+    
+    # Levels the robot from the IMU roll, moving the levers within the lever model's limits.
+    levelling = LevellingController(left_side_levers(), right_side_levers(), move_levels, lambda: imu.snapshot)
 
-    Head_Sensors_thread = threading.Thread(target=read_head_sensors)
-    Head_Sensors_thread.start()
    
  
     
@@ -0,0 +1,178 @@
+#########################################################################################
+#
+# Program  : ttv7_bus.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Owner of the serial port shared by every MC5005 on the motor network.
+#            Frames are queued by any thread and written by a single worker thread,
+#            which also reads the reply before the next frame goes out, so two
+#            threads can never interleave their writes and reads on the port.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_crc.py
+#
+#########################################################################################
+
+import queue
+import struct
+import threading
+from collections import deque
+from concurrent.futures import Future
+from ttv7_crc import crc8
+
+S = b'\x53'
+E = b'\x45'
+
+
+class CRCError(Exception):
+    """A reply frame whose CRC does not match its contents."""
+
+
+def build_frame(command):
+    """Wraps a command in S, length, CRC and E. The length byte counts itself, the command and the CRC."""
+    command = struct.pack("B", len(command) + 2) + command
+    return S + command + bytes((crc8(command),)) + E
+
+
+def reply_key(frame):
+    """Node ID, register address and subindex. A reply carries the same key as the request it answers."""
+    return frame[2], bytes(frame[4:7])
+
+
+class SerialBus():
+
+    def __init__(self, port):
+        self.port = port
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="MC5005 bus", daemon=True)
+        self.worker.start()
+
+    def submit(self, frame) -> Future:
+        """
+        Queues a complete frame for the bus. The returned future resolves to the raw reply
+        frame, or to None if no node answered before the serial timeout or the reply
+        failed its CRC check.
+        """
+        future = Future()
+        self.requests.put(([(frame, future)], None))
+        return future
+
+    def submit_batch(self, frames, timeout = None) -> list:
+        """
+        Queues several frames to be written back to back, normally one per node. The replies
+        are matched to the requests by node ID and register, so the nodes can answer in any
+        order. Returns one future per frame, in the same order as frames.
+
+        timeout replaces the port's read timeout for this batch only, e.g. to find out
+        quickly which nodes are on the network.
+        """
+        futures = [Future() for _ in frames]
+        self.requests.put((list(zip(frames, futures)), timeout))
+        return futures
+
+    def transact(self, frame):
+        """Submits a frame and waits for its reply."""
+        return self.submit(frame).result()
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+        self.port.close()
+
+    #---------------------------------------------------------------------------------
+    # Everything below runs on the worker thread only.
+    #---------------------------------------------------------------------------------
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+
+            batch, timeout = request
+            batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            default_timeout = self.port.timeout
+            if timeout is not None:
+                self.port.timeout = timeout
+
+            try:
+                if len(batch) == 1:
+                    replies = [self.exchange(batch[0][0])]
+                else:
+                    replies = self.exchange_batch([frame for frame, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), reply in zip(batch, replies):
+                    future.set_result(reply)
+            finally:
+                if timeout is not None:
+                    self.port.timeout = default_timeout
+
+    def exchange(self, frame):
+        self.port.flushOutput()
+        self.port.flushInput()
+        self.port.write(frame)
+
+        try:
+            return self.read_frame()
+        except CRCError:
+            return None   # Counted as a missed reply.
+
+    def exchange_batch(self, frames):
+        self.port.flushOutput()
+        self.port.flushInput()
+        self.port.write(b''.join(frames))
+
+        # Requests waiting for a reply, by key. A node answers its own frames in order, so
+        # repeated writes to the same register are matched first in, first out.
+        waiting = {}
+        for index, frame in enumerate(frames):
+            waiting.setdefault(reply_key(frame), deque()).append(index)
+
+        replies = [None] * len(frames)
+        outstanding = len(frames)
+        while outstanding:
+            try:
+                reply = self.read_frame()
+            except CRCError:
+                # Nothing in a corrupt frame can be trusted, not even who sent it. Its request
+                # is left unanswered, the rest of the replies are still read.
+                outstanding -= 1
+                continue
+            if reply is None:
+                break   # Serial timeout, whoever has not answered by now is not going to.
+
+            indexes = waiting.get(reply_key(reply))
+            if not indexes:
+                continue   # Not one of ours, e.g. a late reply to an earlier request.
+
+            replies[indexes.popleft()] = reply
+            outstanding -= 1
+
+        return replies
+
+    def read_frame(self):
+        """First read the start bit and the length, then read the rest of the transmission."""
+        ans = self.port.read(2)
+        if len(ans) < 2:
+            return None
+
+        ansAll = ans + self.port.read(ans[1])
+
+        #check CRC is correct (once, on a view of the frame rather than a copy)
+        crc = crc8(memoryview(ansAll)[1:-2])
+        if crc != ansAll[-2]:
+            print(struct.pack("B", crc))
+            print(struct.pack("B", ansAll[-2]))
+            raise CRCError(f"CRC {crc:#04x} does not match {ansAll[-2]:#04x}")
+
+        return ansAll
@@ -0,0 +1,159 @@
+#########################################################################################
+#
+# Program  : ttv7_commands.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Command table for the messages sent by the robot controller. A message is a
+#            verb, optionally followed by arguments separated by ',' or '~' (whichever
+#            comes first after the verb), e.g.
+#
+#                LEFT
+#                L-CLIMB,S
+#                LANCE_ANGLE_A,120,-300
+#                AS~F~L~1500~10~S~2
+#
+#            Handlers are registered against their exact verb with @commands.command(),
+#            together with the type of each argument, so lookup is one dict access and
+#            'LEFT' can no longer be mistaken for 'L-CLIMB'. Bad arguments are reported
+#            and the handler is not called. Every verb keeps a count of calls and how
+#            long they took.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import time
+import logging
+
+SEPARATORS = (',', '~')
+
+
+def parse_message(msg):
+    """Splits a message into its verb and a list of argument strings."""
+    msg = msg.strip()
+
+    positions = [msg.find(separator) for separator in SEPARATORS if separator in msg]
+    if not positions:
+        return msg, []
+
+    split = min(positions)
+    return msg[:split], msg[split + 1:].split(msg[split])
+
+
+def convert(name, kind, text):
+    """
+    Converts one argument. kind is a function such as int or float, or a tuple of the
+    strings allowed. Raises ValueError with a readable message if text does not fit.
+    """
+    if isinstance(kind, tuple):
+        if text not in kind:
+            raise ValueError(f"{name} must be one of {', '.join(kind)}, not '{text}'")
+        return text
+
+    try:
+        return kind(text)
+    except ValueError:
+        raise ValueError(f"{name} must be {kind.__name__}, not '{text}'")
+
+
+class CommandStats():
+
+    def __init__(self):
+        self.calls = 0
+        self.rejected = 0
+        self.total = 0.0
+        self.longest = 0.0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.longest = max(self.longest, elapsed)
+
+    def average(self):
+        return self.total / self.calls if self.calls else 0.0
+
+
+class Command():
+
+    def __init__(self, verb, handler, arguments, while_busy):
+        self.verb = verb
+        self.handler = handler
+        self.arguments = arguments      # List of (name, kind), see convert().
+        self.while_busy = while_busy    # Allowed while another command is running.
+        self.stats = CommandStats()
+
+    def parse_arguments(self, texts):
+        if len(texts) != len(self.arguments):
+            names = ','.join(name for name, _ in self.arguments)
+            raise ValueError(f"{self.verb} takes {len(self.arguments)} argument(s) ({names}), got {len(texts)}")
+
+        return [convert(name, kind, text.strip()) for (name, kind), text in zip(self.arguments, texts)]
+
+
+class CommandRegistry():
+
+    def __init__(self):
+        self.commands = {}
+
+    def command(self, verb, *arguments, while_busy = False):
+        """
+        Decorator registering handler(conn, *args) for verb. arguments are (name, kind)
+        pairs, one per argument the message has to carry.
+        """
+        def register(handler):
+            if verb in self.commands:
+                raise ValueError(f"Command {verb} is already registered.")
+            self.commands[verb] = Command(verb, handler, list(arguments), while_busy)
+            return handler
+
+        return register
+
+    def lookup(self, msg):
+        verb, _ = parse_message(msg)
+        return self.commands.get(verb)
+
+    def dispatch(self, conn, msg, busy = False):
+        """
+        Runs the handler for msg. While busy only commands registered with while_busy run.
+        Returns True if a handler ran.
+        """
+        verb, texts = parse_message(msg)
+        command = self.commands.get(verb)
+
+        if command is None:
+            print(f'[UNKNOWN COMMAND] {msg} >>>')
+            logging.warning('[UNKNOWN COMMAND] %s >>>', msg)
+            return False
+
+        if busy and not command.while_busy:
+            return False
+
+        try:
+            args = command.parse_arguments(texts)
+        except ValueError as error:
+            command.stats.rejected += 1
+            print(f'[BAD COMMAND] {msg} >>> {error}')
+            logging.warning('[BAD COMMAND] %s >>> %s', msg, error)
+            return False
+
+        start = time.monotonic()
+        try:
+            command.handler(conn, *args)
+        finally:
+            command.stats.record(time.monotonic() - start)
+
+        return True
+
+    def summary(self):
+        """One line per verb used so far: calls, rejected, average and longest time in ms."""
+        lines = []
+        for verb, command in sorted(self.commands.items()):
+            stats = command.stats
+            if stats.calls or stats.rejected:
+                lines.append(f"{verb}:{stats.calls},{stats.rejected},{stats.average() * 1000:.1f},{stats.longest * 1000:.1f}")
+        return '~'.join(lines)
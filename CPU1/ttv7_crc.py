@@ -0,0 +1,68 @@
+#########################################################################################
+#
+# Program  : ttv7_crc.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : CRC-8 used by the Faulhaber MC5005 serial framing (polynomial 0xD5,
+#            reflected, initial value 0xFF). The checksum is calculated from a
+#            precomputed 256 entry lookup table, one table access per byte.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+CRC_POLY = 0xd5
+CRC_INIT = 0xff
+
+
+def crc8_bitwise(msg) -> int:
+    """Reference implementation (8 shifts per byte) the lookup table is built from."""
+    crc = CRC_INIT
+
+    for byte in msg:
+        crc = crc ^ byte
+        for _ in range(8):
+            if crc & 0x01:
+                crc = ((crc >> 1) ^ CRC_POLY)
+            else:
+                crc >>= 1
+
+    return crc
+
+
+def _build_crc_table():
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            if crc & 0x01:
+                crc = ((crc >> 1) ^ CRC_POLY)
+            else:
+                crc >>= 1
+        table.append(crc)
+
+    return bytes(table)
+
+
+CRC_TABLE = _build_crc_table()
+
+
+def crc8(msg) -> int:
+    """
+    Returns the CRC of msg as an int.
+
+    msg can be bytes, bytearray or a memoryview, so a slice of a received frame
+    can be checked without copying it first.
+    """
+    crc = CRC_INIT
+    table = CRC_TABLE
+
+    for byte in msg:
+        crc = table[crc ^ byte]
+
+    return crc
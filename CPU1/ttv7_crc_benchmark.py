@@ -0,0 +1,64 @@
+#########################################################################################
+#
+# Program  : ttv7_crc_benchmark.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Micro-benchmark comparing the bit-by-bit MC5005 CRC with the table driven
+#            version over the frame sizes seen on the motor network. Runs off the robot:
+#
+#                python3 ttv7_crc_benchmark.py
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_crc.py
+#
+#########################################################################################
+
+import os
+import struct
+import timeit
+from ttv7_crc import crc8, crc8_bitwise
+
+# Bytes covered by the CRC (length byte up to the last data byte) for the frames we send
+# and receive most often.
+FRAME_SIZES = {
+    "GET request (0x6041)": 6,
+    "SET 2 byte (0x6040)": 8,
+    "SET 4 byte (0x60FF)": 10,
+    "GET reply 4 byte (0x6064)": 10,
+}
+
+NUMBER = 20000
+
+
+def legacy_crc(msg):
+    """The old MotorController.CRC(): bitwise CRC packed into a bytes object."""
+    return struct.pack("B", crc8_bitwise(msg))
+
+
+def check_tables_agree():
+    for value in range(256):
+        assert crc8(bytes((value,))) == crc8_bitwise(bytes((value,)))
+    for size in FRAME_SIZES.values():
+        for _ in range(200):
+            frame = os.urandom(size)
+            assert crc8(frame) == crc8_bitwise(frame)
+            assert crc8(memoryview(frame)) == crc8_bitwise(frame)
+
+
+def main():
+    check_tables_agree()
+
+    print(f"{'frame':<28}{'bytes':>6}{'bitwise us':>13}{'table us':>11}{'speed-up':>10}")
+    for name, size in FRAME_SIZES.items():
+        frame = os.urandom(size)
+        old = min(timeit.repeat(lambda: legacy_crc(frame), number=NUMBER, repeat=5)) / NUMBER
+        new = min(timeit.repeat(lambda: crc8(frame), number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:<28}{size:>6}{old * 1e6:>13.2f}{new * 1e6:>11.2f}{old / new:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
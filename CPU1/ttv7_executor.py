@@ -0,0 +1,167 @@
+#########################################################################################
+#
+# Program  : ttv7_executor.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Runs the commands received from the control socket on a fixed pool of
+#            worker threads instead of two new threads per message.
+#
+#            Commands from one client lane (e.g. the controller's CTRL messages) run one
+#            at a time in the order they arrived; different lanes run side by side. A
+#            separate urgent lane with its own thread runs ADMN STOP, PAUSE and RESUME
+#            straight away, however much motion work is queued, and a STOP also throws
+#            away everything still waiting in the normal lanes.
+#
+#            Queue depths and the time commands waited before starting are kept for
+#            every lane, see summary().
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+WORKERS = 4
+URGENT = 'URGENT'
+
+
+class LaneStats():
+
+    def __init__(self):
+        self.submitted = 0
+        self.started = 0
+        self.dropped = 0
+        self.deepest = 0
+        self.total_wait = 0.0
+        self.longest_wait = 0.0
+
+    def record_wait(self, waited):
+        self.started += 1
+        self.total_wait += waited
+        self.longest_wait = max(self.longest_wait, waited)
+
+    def average_wait(self):
+        return self.total_wait / self.started if self.started else 0.0
+
+
+class CommandExecutor():
+
+    def __init__(self, workers = WORKERS):
+        self.lock = threading.Lock()
+        self.lanes = {}             # Lane -> deque of (submit time, function, args) waiting.
+        self.active = set()         # Lanes a worker is running, or which are waiting for one.
+        self.stats = {}             # Lane -> LaneStats.
+        self.ready = queue.Queue()  # Lanes with work, in the order they became ready.
+        self.urgent = queue.Queue()
+
+        for number in range(workers):
+            threading.Thread(target = self.worker, name = f"command-worker-{number}", daemon = True).start()
+        threading.Thread(target = self.urgent_worker, name = "command-urgent", daemon = True).start()
+
+    def lane_stats(self, lane):
+        if lane not in self.stats:
+            self.stats[lane] = LaneStats()
+        return self.stats[lane]
+
+    def submit(self, lane, function, *args):
+        """Queues function(*args) behind everything already submitted on lane."""
+        with self.lock:
+            waiting = self.lanes.setdefault(lane, deque())
+            waiting.append((time.monotonic(), function, args))
+
+            stats = self.lane_stats(lane)
+            stats.submitted += 1
+            stats.deepest = max(stats.deepest, len(waiting))
+
+            if lane not in self.active:
+                self.active.add(lane)
+                self.ready.put(lane)
+
+    def submit_urgent(self, function, *args, preempt = False):
+        """
+        Runs function(*args) on the urgent lane, ahead of all normal work. With preempt,
+        everything still queued on the normal lanes is dropped first.
+        """
+        if preempt:
+            self.cancel_pending()
+
+        with self.lock:
+            stats = self.lane_stats(URGENT)
+            stats.submitted += 1
+            stats.deepest = max(stats.deepest, self.urgent.qsize() + 1)
+        self.urgent.put((time.monotonic(), function, args))
+
+    def cancel_pending(self, lanes = None):
+        """Drops every command not yet started on the given lanes, or all normal lanes. Returns how many."""
+        dropped = 0
+        with self.lock:
+            for lane, waiting in self.lanes.items():
+                if lanes is not None and lane not in lanes:
+                    continue
+                self.lane_stats(lane).dropped += len(waiting)
+                dropped += len(waiting)
+                waiting.clear()
+
+        if dropped:
+            print(f"[EXECUTOR] {dropped} queued command(s) cancelled.")
+        return dropped
+
+    def depth(self, lane):
+        with self.lock:
+            if lane == URGENT:
+                return self.urgent.qsize()
+            return len(self.lanes.get(lane, ()))
+
+    def run(self, lane, submitted, function, args):
+        with self.lock:
+            self.lane_stats(lane).record_wait(time.monotonic() - submitted)
+
+        try:
+            function(*args)
+        except Exception:
+            logging.exception("Command on lane %s failed: ", lane)
+
+    def worker(self):
+        while True:
+            lane = self.ready.get()
+
+            with self.lock:
+                waiting = self.lanes[lane]
+                if not waiting:
+                    # Everything was cancelled while the lane waited for a worker.
+                    self.active.discard(lane)
+                    continue
+                submitted, function, args = waiting.popleft()
+
+            self.run(lane, submitted, function, args)
+
+            # Only now may the lane's next command start, which keeps a lane in order.
+            with self.lock:
+                if self.lanes[lane]:
+                    self.ready.put(lane)
+                else:
+                    self.active.discard(lane)
+
+    def urgent_worker(self):
+        while True:
+            submitted, function, args = self.urgent.get()
+            self.run(URGENT, submitted, function, args)
+
+    def summary(self):
+        """One line per lane: submitted, dropped, waiting now, deepest, average and longest wait in ms."""
+        lines = []
+        with self.lock:
+            for lane, stats in sorted(self.stats.items(), key = lambda item: str(item[0])):
+                waiting = self.urgent.qsize() if lane == URGENT else len(self.lanes.get(lane, ()))
+                lines.append(f"{lane}:{stats.submitted},{stats.dropped},{waiting},{stats.deepest},"
+                             f"{stats.average_wait() * 1000:.1f},{stats.longest_wait * 1000:.1f}")
+        return '~'.join(lines)
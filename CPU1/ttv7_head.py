@@ -0,0 +1,180 @@
+#########################################################################################
+#
+# Program  : ttv7_head.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Motion planner for the lance head of a lancing robot: slide (0x0D, red),
+#            roll (0x0E, blue) and pitch (0x0F, yellow). A move is checked against the
+#            robot's MAX_STEPS_FROM_HOME limits and split into stages that are safe to
+#            run one after the other:
+#
+#                1. pitch to level, if slide or roll have to move and it is not level
+#                2. slide and roll together, timed to arrive at the same moment
+#                3. pitch to its target
+#
+#            Axes within a stage start in one burst and the stage ends when all of them
+#            report target reached.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_mc5005.py
+#            ttv7_motors.py
+#
+#########################################################################################
+
+import math
+import ttv7_mc5005 as mc
+import ttv7_motors as m
+
+SLIDE = 'slide'
+ROLL = 'roll'
+PITCH = 'pitch'
+
+HEAD_AXES = {
+    SLIDE: m.Motor_D,
+    ROLL: m.Motor_E,
+    PITCH: m.Motor_F,
+}
+
+POSITION_TOLERANCE = 2      # Steps. An axis this close to its target does not move.
+STAGE_TIMEOUT_MARGIN = 2.0  # Seconds allowed on top of the planned duration of a stage.
+
+
+class HeadMove():
+
+    def __init__(self, axis, start, target):
+        self.axis = axis
+        self.motor = HEAD_AXES[axis]
+        self.start = start
+        self.target = target
+        self.velocity = None    # Profile velocity, set by synchronise().
+
+    def distance(self):
+        return abs(self.target - self.start)
+
+
+def steps_per_second(axis, velocity):
+    """Speed in position steps for a profile velocity, see setLeadscrewControl() and setRotaryControl()."""
+    if axis == SLIDE:
+        return velocity * 1000.0            # mm/s, position in micrometres.
+
+    return velocity * 3600.0 / 60.0         # rpm, position in 0.1 degree steps.
+
+
+def home_positions(robot):
+    if not robot.head_homed:
+        return {SLIDE: 0, ROLL: 0, PITCH: 0}
+
+    return {SLIDE: robot.slide_home_position, ROLL: robot.roll_home_position, PITCH: robot.pitch_home_position}
+
+
+def head_targets(robot, slide_mm, roll, pitch):
+    """
+    Absolute positions for a slide distance in mm, and roll and pitch in 0.1 degrees, with
+    the same signs as slide_out_distance(), move_lance_to_position() and pitch_to_angle().
+    Returns None if any of them is beyond the robot's limits.
+    """
+    home = home_positions(robot)
+    offsets = {SLIDE: int(-slide_mm * 1000), ROLL: int(roll), PITCH: int(-pitch)}
+    limits = {SLIDE: robot.SLIDE_MOTOR_MAX_STEPS_FROM_HOME,
+              ROLL: robot.ROLL_MOTOR_MAX_STEPS_FROM_HOME,
+              PITCH: robot.PITCH_MOTOR_MAX_STEPS_FROM_HOME}
+
+    for axis, offset in offsets.items():
+        if abs(offset) > limits[axis]:
+            print(f"Head move rejected: {axis} target is {abs(offset)} steps from home, the limit is {limits[axis]}.")
+            return None
+
+    return {axis: home[axis] + offset for axis, offset in offsets.items()}
+
+
+def plan_head_move(robot, positions, targets):
+    """
+    Splits a move from positions to targets (both by axis) into a list of stages, each a list
+    of HeadMove that can run together. Slide and roll only ever move with the pitch level.
+    """
+    level = home_positions(robot)[PITCH]
+
+    def move(axis, start, target):
+        return HeadMove(axis, start, target) if abs(target - start) > POSITION_TOLERANCE else None
+
+    body = [move(SLIDE, positions[SLIDE], targets[SLIDE]), move(ROLL, positions[ROLL], targets[ROLL])]
+    body = [entry for entry in body if entry is not None]
+
+    stages = []
+    pitch = positions[PITCH]
+    if body:
+        to_level = move(PITCH, pitch, level)
+        if to_level is not None:
+            stages.append([to_level])
+            pitch = level
+        stages.append(body)
+
+    to_target = move(PITCH, pitch, targets[PITCH])
+    if to_target is not None:
+        stages.append([to_target])
+
+    return stages
+
+
+def synchronise(stage, velocities):
+    """
+    Chooses a profile velocity for every move of a stage so they all take as long as the
+    slowest one does at its normal velocity (velocities, by axis). Returns that duration.
+    Velocities are whole units, rounded up, so no axis is later than planned.
+    """
+    duration = max(move.distance() / steps_per_second(move.axis, velocities[move.axis]) for move in stage)
+
+    for move in stage:
+        if duration > 0:
+            wanted = move.distance() / duration / steps_per_second(move.axis, 1)
+            move.velocity = max(1, min(velocities[move.axis], math.ceil(wanted)))
+        else:
+            move.velocity = velocities[move.axis]
+
+    return duration
+
+
+def move_head(robot, slide_mm, roll, pitch = 0, abort = None):
+    """
+    Moves the lance head to a slide distance (mm), roll and pitch (0.1 degrees) relative to
+    home. abort is an optional function which stops the sequence between and during stages.
+    Returns True when the head is there, False if the move was rejected, timed out or aborted.
+    """
+    targets = head_targets(robot, slide_mm, roll, pitch)
+    if targets is None:
+        return False
+
+    axes = list(HEAD_AXES.items())
+    positions = mc.read_registers([(motor, 0x6064, 0) for _, motor in axes])
+    if None in positions:
+        print("Head move abandoned: not every head motor is answering.")
+        return False
+    velocities = [motor.readProfileVelocity() for _, motor in axes]
+
+    positions = {axis: int.from_bytes(data, byteorder='little', signed=True) for (axis, _), data in zip(axes, positions)}
+    velocities = {axis: max(1, velocity) for (axis, _), velocity in zip(axes, velocities)}
+
+    for stage in plan_head_move(robot, positions, targets):
+        duration = synchronise(stage, velocities)
+
+        with mc.burst():
+            for move in stage:
+                move.motor.setPositionMode()
+                move.motor.setProfileVelocity(move.velocity)
+                move.motor.setPositionAbsolute(move.target)
+
+        reached = mc.wait_for_targets([move.motor for move in stage], timeout = duration + STAGE_TIMEOUT_MARGIN, abort = abort)
+
+        # Leave every axis at its normal velocity for the single axis commands.
+        with mc.burst():
+            for move in stage:
+                move.motor.setProfileVelocity(velocities[move.axis])
+
+        if not reached:
+            return False
+
+    return True
@@ -0,0 +1,113 @@
+#########################################################################################
+#
+# Program  : ttv7_head_sensors.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Homing sensors of the lance head (slide, roll and pitch), handled by GPIO
+#            edge detection instead of a thread polling them every 100 ms. Every edge is
+#            timestamped on the RPi.GPIO callback thread, and a homing move can arm a
+#            sensor with an action (stop the motor, read its position) which runs on
+#            that thread as soon as the sensor reports home, not on the next poll.
+#
+#            The sensors are not all wired the same way: homed_level is the GPIO level
+#            a sensor reads when its axis is home.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import logging
+import threading
+import RPi.GPIO as GPIO
+from time import monotonic
+
+BOUNCE_TIME = 5     # Milliseconds, RPi.GPIO ignores further edges for this long.
+
+
+class HeadSensor():
+    """
+    One homing sensor on GPIO pin (BCM numbering). on_change(homed) is called on the GPIO
+    callback thread whenever the sensor changes state.
+    """
+
+    def __init__(self, pin, homed_level, on_change = None):
+        self.pin = pin
+        self.homed_level = homed_level
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.reached = threading.Event()    # Set while the sensor reports home.
+        self.on_homed = None
+        self.changed_at = None              # monotonic() of the last edge.
+
+        GPIO.setup(pin, GPIO.IN)
+        self.homed = GPIO.input(pin) == homed_level
+        if self.homed:
+            self.reached.set()
+        if on_change is not None:
+            on_change(self.homed)
+
+        GPIO.add_event_detect(pin, GPIO.BOTH, callback = self.edge, bouncetime = BOUNCE_TIME)
+
+    def edge(self, channel):
+        now = monotonic()
+        # The bounce time can swallow an edge, so read the level rather than toggle.
+        homed = GPIO.input(self.pin) == self.homed_level
+
+        with self.lock:
+            if homed == self.homed:
+                return
+            self.homed = homed
+            self.changed_at = now
+            action = None
+            if homed:
+                action, self.on_homed = self.on_homed, None
+                self.reached.set()
+            else:
+                self.reached.clear()
+
+        # The action stops the motor, so it goes first.
+        if action is not None:
+            try:
+                action(now)
+            except Exception:
+                logging.exception("Homing action on GPIO%d failed: ", self.pin)
+
+        if self.on_change is not None:
+            try:
+                self.on_change(homed)
+            except Exception:
+                logging.exception("Sensor handler on GPIO%d failed: ", self.pin)
+
+    def arm(self, on_homed):
+        """
+        Runs on_homed(edge_time) once, on the GPIO callback thread, when the sensor next
+        reports home. Returns False, and arms nothing, if it already does.
+        """
+        with self.lock:
+            if self.homed:
+                return False
+            self.on_homed = on_homed
+            return True
+
+    def disarm(self):
+        with self.lock:
+            self.on_homed = None
+
+    def wait(self, timeout = None, abort = lambda: False):
+        """Waits until the sensor reports home. Returns False on timeout or abort."""
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while not self.reached.wait(0.05):
+            if abort():
+                return False
+            if deadline is not None and monotonic() > deadline:
+                return False
+        return True
+
+    def close(self):
+        GPIO.remove_event_detect(self.pin)
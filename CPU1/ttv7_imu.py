@@ -0,0 +1,175 @@
+#########################################################################################
+#
+# Program  : ttv7_imu.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : IMU service for the ICM20948 on the sensors interface board. A thread reads
+#            the accelerometer and gyroscope at a fixed rate and fuses them with a
+#            complementary filter into roll and pitch in degrees: the gyro follows fast
+#            changes without lag, the accelerometer's direction of gravity corrects the
+#            gyro's drift over TIME_CONSTANT seconds. Wheel vibration and the robot's own
+#            acceleration, which swamp a raw accelerometer reading, are filtered out.
+#
+#            Every sample goes into a preallocated NumPy ring buffer with its time, and
+#            every few samples a snapshot of the attitude is published. A snapshot is never
+#            changed once published, the service only replaces it, so readers (climbing,
+#            levelling, telemetry) need no lock.
+#
+#            Axes are those of the chip. Roll is the tilt that puts gravity on the X axis
+#            (the robot leaning left or right), pitch the tilt that puts it on Y. Yaw is
+#            the integrated Z rate, so it drifts, and is only good for short turns.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import math
+import logging
+import threading
+import numpy as np
+from time import monotonic, sleep
+
+SAMPLE_RATE = 100.0     # Samples per second.
+BUFFER_SIZE = 256       # Samples kept, a little over 2.5 s at SAMPLE_RATE.
+WINDOW = 0.25           # Seconds averaged by attitude().
+PUBLISH_EVERY = 5       # Samples between snapshots, i.e. 20 snapshots per second.
+TIME_CONSTANT = 0.5     # Seconds over which the accelerometer corrects the gyro.
+
+# Columns of the ring buffer: time, acceleration (m/s^2), rotation rate (rad/s) and the
+# filtered attitude (degrees).
+TIME, X, Y, Z, GX, GY, GZ, ROLL, PITCH, YAW = range(10)
+COLUMNS = 10
+
+
+def accelerometer_attitude(x, y, z):
+    """Roll and pitch in degrees from the direction of gravity alone."""
+    roll = math.degrees(math.atan2(x, math.sqrt(y * y + z * z)))
+    pitch = math.degrees(math.atan2(y, math.sqrt(x * x + z * z)))
+    return roll, pitch
+
+
+class ComplementaryFilter():
+
+    def __init__(self, time_constant = TIME_CONSTANT):
+        self.time_constant = time_constant
+        self.roll = None
+        self.pitch = None
+        self.yaw = 0.0
+        self.time = None
+
+    def update(self, time, x, y, z, gx, gy, gz):
+        """Adds one sample and returns roll, pitch and yaw in degrees."""
+        roll, pitch = accelerometer_attitude(x, y, z)
+
+        if self.time is None:
+            # Start from the accelerometer, the gyro only knows changes.
+            self.roll, self.pitch = roll, pitch
+        else:
+            dt = time - self.time
+            weight = self.time_constant / (self.time_constant + dt)
+
+            # Rotating about Y moves gravity towards -X, rotating about X moves it towards +Y.
+            self.roll = weight * (self.roll - math.degrees(gy) * dt) + (1 - weight) * roll
+            self.pitch = weight * (self.pitch + math.degrees(gx) * dt) + (1 - weight) * pitch
+            self.yaw += math.degrees(gz) * dt
+
+        self.time = time
+        return self.roll, self.pitch, self.yaw
+
+
+class ImuSnapshot():
+
+    def __init__(self, time, roll, pitch, yaw, samples):
+        self.time = time            # monotonic() of the newest sample.
+        self.roll = roll
+        self.pitch = pitch
+        self.yaw = yaw
+        self.samples = samples      # How many samples were averaged.
+
+
+class ImuService():
+    """
+    Samples sensor.acceleration (m/s^2) and sensor.gyro (rad/s), both (x, y, z) tuples, at
+    rate per second once start() is called. on_snapshot(snapshot) is called on the sampling
+    thread for every new snapshot.
+    """
+
+    def __init__(self, sensor, rate = SAMPLE_RATE, size = BUFFER_SIZE, on_snapshot = None):
+        self.sensor = sensor
+        self.interval = 1.0 / rate
+        self.filter = ComplementaryFilter()
+        self.samples = np.zeros((size, COLUMNS), dtype=float)
+        self.count = 0              # Samples written so far, the next one goes in row count % size.
+        self.errors = 0
+        self.overruns = 0           # Samples that started late because the last one took too long.
+        self.snapshot = None
+        self.on_snapshot = on_snapshot
+
+    def start(self):
+        threading.Thread(target = self.run, name = "imu", daemon = True).start()
+
+    def run(self):
+        next_sample = monotonic()
+
+        while True:
+            try:
+                acceleration = self.sensor.acceleration
+                rotation = self.sensor.gyro
+            except (OSError, ValueError):
+                # A failed I2C read, try again next period.
+                self.errors += 1
+            else:
+                self.add_sample(monotonic(), acceleration, rotation)
+
+            next_sample += self.interval
+            delay = next_sample - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                # Never try to catch up with a burst of reads.
+                self.overruns += 1
+                next_sample = monotonic()
+
+    def add_sample(self, time, acceleration, rotation):
+        attitude = self.filter.update(time, *acceleration, *rotation)
+
+        self.samples[self.count % len(self.samples)] = (time, *acceleration, *rotation, *attitude)
+        self.count += 1
+
+        if self.count % PUBLISH_EVERY == 0:
+            self.publish()
+
+    def window(self, seconds = WINDOW):
+        """A copy of the samples of the last seconds, oldest first, one row per sample (see COLUMNS)."""
+        count = self.count
+        size = len(self.samples)
+        wanted = min(count, size // 2, max(1, int(round(seconds / self.interval))))
+
+        rows = np.arange(count - wanted, count) % size
+        return self.samples[rows].copy()
+
+    def attitude(self, seconds = WINDOW):
+        """Filtered roll, pitch and yaw averaged over the last seconds, None before the first sample."""
+        samples = self.window(seconds)
+        if len(samples) == 0:
+            return None
+
+        roll, pitch, yaw = samples[:, ROLL:].mean(axis=0)
+        return ImuSnapshot(samples[-1, TIME], roll, pitch, yaw, len(samples))
+
+    def publish(self):
+        # The filter output itself, averaging would only add back the lag the gyro removes.
+        row = self.samples[(self.count - 1) % len(self.samples)]
+        snapshot = ImuSnapshot(row[TIME], row[ROLL], row[PITCH], row[YAW], 1)
+        self.snapshot = snapshot
+
+        if self.on_snapshot is not None:
+            try:
+                self.on_snapshot(snapshot)
+            except Exception:
+                logging.exception("IMU snapshot handler failed: ")
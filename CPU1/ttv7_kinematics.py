@@ -0,0 +1,57 @@
+#########################################################################################
+#
+# Program  : ttv7_kinematics.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Mecanum wheel kinematics for the four traction motors. Maps a body velocity
+#            (vx forwards, vy to the left, omega anticlockwise seen from above) to the
+#            four wheel target velocities with one matrix multiply, so straight, sideways,
+#            diagonal and turning motion all come from the same place. The matrix is built
+#            from each wheel's position and forward sign in ttv7_motors.MOTOR_TABLE.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import numpy as np
+
+# Wheel speed, positive when the wheel rolls the robot forwards, for a unit of vx, vy and
+# omega, by where the wheel sits (its role in ttv7_motors.MOTOR_TABLE). The rollers form an
+# X seen from above.
+#
+#                                 vx  vy  omega
+WHEEL_GEOMETRY = {'left front wheel':  (+1, -1, -1),
+                  'left rear wheel':   (+1, +1, -1),
+                  'right front wheel': (+1, +1, +1),
+                  'right rear wheel':  (+1, -1, +1)}
+
+MAX_WHEEL_SPEED = 6000    # Same as MotorController.setMaxSpeed().
+
+
+def mecanum(wheels):
+    """
+    The matrix from body velocity to wheel target velocities, one row per wheel in the order
+    given. wheels are the traction MotorControllers with the role and forward sign of
+    ttv7_motors.MOTOR_TABLE, e.g. the left wheels turn backwards to drive the robot forwards.
+    """
+    return np.array([[motor.sign * k for k in WHEEL_GEOMETRY[motor.role]] for motor in wheels], dtype=float)
+
+
+def body_to_wheels(matrix, vx, vy = 0, omega = 0):
+    """
+    Wheel target velocities, as ints in the row order of matrix (see mecanum()). If any
+    wheel would go faster than MAX_WHEEL_SPEED all four are scaled down together, so the
+    robot still moves in the direction asked for, only slower.
+    """
+    wheels = matrix @ np.array((vx, vy, omega), dtype=float)
+
+    peak = np.abs(wheels).max()
+    if peak > MAX_WHEEL_SPEED:
+        wheels *= MAX_WHEEL_SPEED / peak
+
+    return np.rint(wheels).astype(int)
@@ -0,0 +1,170 @@
+#########################################################################################
+#
+# Program  : ttv7_levelling.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Closed loop levelling of the robot body. A PID on the filtered IMU roll
+#            (ttv7_imu.py) works out how far to raise one side of the levers against the
+#            other, the move is made in one burst, and once the levers have reached their
+#            targets and the IMU has had SETTLE_TIME to see the result the next correction
+#            is worked out from a fresh snapshot. A few large proportional steps replace
+#            hundreds of fixed 3 unit steps.
+#
+#            Every move is kept within 0 ... MAX_AXLE_LIFT of each lever in the robot's
+#            lever model, which is updated by how far the levers actually moved, read back
+#            from the drives, not by what was asked of them. When one side has no room
+#            left the other side makes the whole correction. The loop ends when the roll
+#            is within TOLERANCE of TARGET_ROLL, after MAX_ITERATIONS moves, or when the
+#            levers have no room left in the direction needed. How far the roll moves
+#            for a lever unit depends on the tubes the robot stands on, so every time a
+#            move overshoots the level the gains are halved. While the robot is paused
+#            no move is started.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+from time import monotonic, sleep
+
+TARGET_ROLL = -0.73     # Degrees. The IMU is not mounted quite flat, this is the robot level.
+TOLERANCE = 0.15        # Degrees either side of TARGET_ROLL counted as level.
+
+KP = 50.0               # Lever units per degree of roll.
+KI = 10.0               # Lever units per degree second.
+KD = 5.0                # Lever units per degree per second.
+INTEGRAL_LIMIT = 20.0   # Degree seconds, so the integral cannot wind up on a long levelling.
+
+MIN_STEP = 3            # Lever units, a smaller move is lost in the lever backlash.
+MAX_STEP = 400          # Lever units, the most one move may open up between the sides.
+MAX_ITERATIONS = 20
+SETTLE_TIME = 0.2       # Seconds the IMU is given to see a move before roll is read again.
+SNAPSHOT_TIMEOUT = 1.0  # Seconds to wait for a snapshot newer than the last move.
+
+
+class LevellingResult():
+
+    def __init__(self, converged, iterations, elapsed, roll, reason):
+        self.converged = converged
+        self.iterations = iterations    # Moves made.
+        self.elapsed = elapsed          # Seconds.
+        self.roll = roll                # Degrees, the last roll read.
+        self.reason = reason
+
+    def __str__(self):
+        roll = 'unknown' if self.roll is None else f'{self.roll:.2f}'
+        return f'{self.reason} after {self.iterations} moves in {self.elapsed:.2f} s, roll {roll}'
+
+
+class LevellingController():
+    """
+    Levels the robot by its roll. left_levers and right_levers are the lever dicts of the
+    robot model (MAX_AXLE_LIFT, CURRENT_AXLE_LIFT). move(left, right) raises each side by
+    the lever units given, negative to lower, and returns whether the levers reached their
+    targets and how far each lever really lifted, a list in left_levers + right_levers
+    order with None for a lever whose position could not be read. read_attitude() returns
+    the latest IMU snapshot, or None before the first one.
+    """
+
+    def __init__(self, left_levers, right_levers, move, read_attitude, target = TARGET_ROLL, tolerance = TOLERANCE):
+        self.left_levers = left_levers
+        self.right_levers = right_levers
+        self.move = move
+        self.read_attitude = read_attitude
+        self.target = target
+        self.tolerance = tolerance
+
+    def room(self, levers):
+        """How far a side can be lowered and raised, as (lowest, highest) in lever units."""
+        return (-min(lever["CURRENT_AXLE_LIFT"] for lever in levers),
+                min(lever["MAX_AXLE_LIFT"] - lever["CURRENT_AXLE_LIFT"] for lever in levers))
+
+    def split(self, correction):
+        """
+        Left and right moves that raise the left side correction units above the right,
+        half each where there is room for it.
+        """
+        left_room = self.room(self.left_levers)
+        right_room = self.room(self.right_levers)
+
+        left = min(max(correction / 2, left_room[0]), left_room[1])
+        right = min(max(left - correction, right_room[0]), right_room[1])
+        # If the right side was short of room the left side makes up the rest.
+        left = min(max(right + correction, left_room[0]), left_room[1])
+
+        return int(round(left)), int(round(right))
+
+    def snapshot_after(self, time, abort):
+        """The first snapshot taken after time, None if there is none within SNAPSHOT_TIMEOUT."""
+        deadline = monotonic() + SNAPSHOT_TIMEOUT
+        while not abort():
+            snapshot = self.read_attitude()
+            if snapshot is not None and snapshot.time >= time:
+                return snapshot
+            if monotonic() > deadline:
+                return None
+            sleep(0.02)
+        return None
+
+    def run(self, abort = lambda: False, paused = lambda: False):
+        started = monotonic()
+        iterations = 0
+        integral = 0.0
+        previous = None
+        scale = 1.0     # Halved on every overshoot.
+
+        def result(converged, roll, reason):
+            return LevellingResult(converged, iterations, monotonic() - started, roll, reason)
+
+        settled_at = started
+        while True:
+            # A move would clear the halt the pause put on the levers.
+            while paused() and not abort():
+                sleep(0.1)
+
+            snapshot = self.snapshot_after(settled_at, abort)
+            if abort():
+                return result(False, None, 'Aborted')
+            if snapshot is None:
+                return result(False, None, 'No IMU data')
+
+            error = snapshot.roll - self.target
+            if abs(error) <= self.tolerance:
+                return result(True, snapshot.roll, 'Level')
+            if iterations >= MAX_ITERATIONS:
+                return result(False, snapshot.roll, 'Not level')
+
+            derivative = 0.0
+            if previous is not None and (error > 0) != (previous.roll > self.target):
+                scale /= 2
+                integral = 0.0
+            if previous is not None and snapshot.time > previous.time:
+                dt = snapshot.time - previous.time
+                integral = min(max(integral + error * dt, -INTEGRAL_LIMIT), INTEGRAL_LIMIT)
+                derivative = (error - (previous.roll - self.target)) / dt
+            previous = snapshot
+
+            # Positive roll is put right by raising the left side.
+            correction = scale * (KP * error + KI * integral + KD * derivative)
+            correction = min(max(correction, -MAX_STEP), MAX_STEP)
+            if abs(correction) < MIN_STEP:
+                correction = MIN_STEP if error > 0 else -MIN_STEP
+
+            left, right = self.split(correction)
+            if abs(left - right) < MIN_STEP:
+                return result(False, snapshot.roll, 'Levers at their limits')
+
+            reached, lifts = self.move(left, right)
+            iterations += 1
+            for lever, lift in zip(self.left_levers + self.right_levers, lifts):
+                if lift is not None:
+                    lever["CURRENT_AXLE_LIFT"] += lift
+
+            if not reached and not abort():
+                return result(False, snapshot.roll, 'Levers did not reach their targets')
+
+            settled_at = monotonic() + SETTLE_TIME
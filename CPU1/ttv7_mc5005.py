@@ -11,24 +11,64 @@
 # Copyright: IGS / Tubetech Industrial Ltd. 2023.
 #
 # External dependencies (Python files):
-#
+#            ttv7_crc.py
+#            ttv7_bus.py
+#            ttv7_register_cache.py
 #
 #########################################################################################
 
+import os
 import serial
 import struct
 import time
 import math
+import threading
+from ttv7_crc import crc8
+from ttv7_bus import SerialBus, build_frame
+from ttv7_register_cache import RegisterCache
 
 S32 = 2147483648
 
 OPERATION_MODE = 0x6060           # operation mode
 OPERATION_MODE_DISP = 0x6061      # operation mode display
 
+STATUS_WORD = 0x6041              # CiA 402 status word
+CIA_STATUS_MASK = 0x6f
+CIA_SWITCH_ON_DISABLED = 0x40
+CIA_READY_TO_SWITCH_ON = 0x21
+CIA_OPERATION_ENABLED = 0x27
+CIA_TARGET_REACHED = 0x400        # status word bit 10
+
 DEBUG = False
 
+# Registers whose last commanded value is shadowed per node, see MotorController.setRegister().
+SHADOWED_REGISTERS = (0x6040, 0x607A, 0x60FF)   # control word, target position, target velocity
+
+# Node health. A node that misses this many replies in a row is taken off the network, and
+# requests to it fail straight away instead of waiting out the serial timeout each time.
+# The health monitor probes dead nodes every PROBE_INTERVAL seconds to bring them back.
+MISSED_REPLIES_BEFORE_DEAD = 2
+DISCOVERY_TIMEOUT = 0.2
+PROBE_INTERVAL = 5.0
+
+def stops_motor(address, value):
+    """
+    Whether a write halts or stops a motor: a control word with the halt bit or without
+    enable operation, or a target velocity of 0. These go out even to a node taken off the
+    network, which may only have missed a reply or two and still be moving.
+    """
+    if address == 0x6040:
+        return bool(value & 0x100) or value & 0x0f != 0x0f
+    return address == 0x60FF and value == 0
+
 # All motors use the network attached to the first serial port - do not use the mini port for this!
-ser = serial.Serial("/dev/ttyS0", baudrate=115200, bytesize=serial.EIGHTBITS, stopbits=serial.STOPBITS_ONE, timeout=2, parity=serial.PARITY_NONE)
+# Set TTV7_MC5005_PORT to run against another port, e.g. the pty served by ttv7_mc5005_sim.py.
+SERIAL_PORT = os.environ.get("TTV7_MC5005_PORT", "/dev/ttyS0")
+ser = serial.Serial(SERIAL_PORT, baudrate=115200, bytesize=serial.EIGHTBITS, stopbits=serial.STOPBITS_ONE, timeout=2, parity=serial.PARITY_NONE)
+
+# The IMU, head sensor and message routing threads all command motors, so every frame goes
+# through the one bus object which owns the port and serialises the round trips.
+bus = SerialBus(ser)
 
 class MotorController():
     S = b'\x53'
@@ -38,86 +78,126 @@ class MotorController():
 
     def __init__(self, nodeId):
         self.node = nodeId
+        self.cache = RegisterCache()   # Registers of this node we do not need to read again.
+        self.shadow = {}               # Last value commanded to each of SHADOWED_REGISTERS.
+        self.skipped_writes = 0
+        self.alive = None              # Unknown until it answers or is probed, see probe_nodes().
+        self.missed_replies = 0
     
     #---------------------------------------------------------------------------------
     # Core functions. These allow you to write and read from the motor control card.
     #---------------------------------------------------------------------------------
     
     def close(self):
-        ser.close()
+        bus.close()
 
     def CRC(self, msg):
-        poly = 0xd5
-        crc = 0xff
-
-        for byte in msg:
-            crc = crc ^ byte
-            for _ in range(8):
-                if crc & 0x01:
-                    crc = ((crc >> 1) ^ poly) 
-                else:
-                    crc >>= 1
-
-        return struct.pack("B", crc)
+        return struct.pack("B", crc8(msg))
 
-    def write(self, command):
+    def write(self, command, urgent = False):
         """Write command. The length of the command is 
-        length of the argument  + 1 for the length byte + 1 for the CRC byte"""
+        length of the argument  + 1 for the length byte + 1 for the CRC byte
 
-        command = struct.pack("B", len(command) + 2) + command
-        command = self.S + command + self.CRC(command) + self.E
+        An urgent command is sent even if the node is off the network."""
 
-        # time.sleep(0.2)
-        ser.flushOutput()
-        ser.flushInput()
-        time.sleep(0.)
-        ser.write(command)
-        time.sleep(0.)
+        current_burst = getattr(_burst, 'current', None)
+        if current_burst is not None:
+            current_burst.commands.append((self, command, urgent))
+            return
+
+        if self.alive is False and not urgent:
+            return   # Known to be off the network, the health monitor will bring it back.
 
         #print("write :: " + dump(command))
-        return self.read()
+        data = self.read(bus.submit(build_frame(command)))
+        if data is not None:
+            self.written(command)
+        return data
 
-    def read(self):
-        """First read the start bit and the length,
-        then read the rest of the transmission."""
+    def read(self, reply):
+        """Waits for the bus to deliver the reply to a submitted frame.
+        The bus has already checked its CRC."""
 
-        ans = ser.read(2)        
-        try:
-            length = ans[1]
-            
-        except IndexError as e:
+        ansAll = reply.result()
+        if ansAll is None:
             print(f"Error in xyframe_mc5005.py/read():  Motor ID: {self.node} is not currently available on the motor control network.")
+            self.cache.invalidate()   # It may have been reset, so nothing it told us can be trusted.
+            self.shadow.clear()
+            self.missed_replies += 1
+            if self.missed_replies >= MISSED_REPLIES_BEFORE_DEAD and self.alive is not False:
+                self.alive = False
+                print(f"Motor ID: {self.node} taken off the motor control network, requests to it will fail immediately.")
             return
-
-        ansAll = ans + ser.read(length)
         #print("read :: " + dump(ansAll))
 
-        #check CRC is correct
-        #print(self.CRC(ansAll[1:-2]))
-        #print(struct.pack("B", ansAll[-2]))
-        if (self.CRC(ansAll[1:-2]) != struct.pack("B", ansAll[-2])):
-            print(self.CRC(ansAll[1:-2]))
-            print(struct.pack("B", ansAll[-2]))
-        assert self.CRC(ansAll[1:-2]) == struct.pack("B", ansAll[-2])
+        if self.alive is False:
+            # Back without a probe, whatever was written while it was away never reached it.
+            self.cache.invalidate()
+            self.shadow.clear()
+            print(f"Motor ID: {self.node} is back on the motor control network.")
+        self.missed_replies = 0
+        self.alive = True
 
         # ansAll includes self.S, so data starts at position 7
         return ansAll[7:-2]
 
+    def written(self, command):
+        """
+        Called once the node has answered a command. If it was a write to this node, what
+        was written is what the drive now holds, so it goes into the cache and, for
+        SHADOWED_REGISTERS, into the shadow. Nothing is remembered before the answer, a frame
+        that was never sent or never answered must not make the next write look redundant.
+        """
+        if command[0:1] != self.node or command[1:2] != self.SET:
+            return
+
+        address = int.from_bytes(command[2:4], 'little')
+        subindex = command[4]
+        data = command[5:]
+        self.cache.store(address, subindex, data)
+        if address in SHADOWED_REGISTERS and subindex == 0:
+            self.shadow[address] = int.from_bytes(data, 'little', signed=True)
+
 
     def readRegister(self, address, nodeID, subindex = 0):
         """Read Register 
         address: address of register to be read
         node = b'\x01' optional node
         sudindex = 0 optional subindex
+
+        Static and written-by-us registers come from the cache when they can, see
+        ttv7_register_cache.py. Reads inside a burst always go to the drive.
         """    
+        cacheable = nodeID == self.node and getattr(_burst, 'current', None) is None
+        if cacheable:
+            data = self.cache.lookup(address, subindex)
+            if data is not None:
+                return data
+
         command = nodeID + self.GET + int.to_bytes(address, 2, 'little') + int.to_bytes(subindex, 1, 'little')
         if DEBUG: 
             print(dump(command))
-        return self.write(command)
+        data = self.write(command)
 
-    def setRegister(self, address, value, length, node, subindex = 0):
+        if cacheable and data is not None:
+            self.cache.store(address, subindex, data)
+        return data
+
+    def setRegister(self, address, value, length, node, subindex = 0, force = False):
         """set register address: two byte address of the register, i.e. 0x6040
-        value: value of the register length: length of the register, in bytes"""
+        value: value of the register length: length of the register, in bytes
+
+        Writing a SHADOWED_REGISTERS value the node already holds does not change what the
+        drive is doing, so the write is skipped unless force is set. The shadow and the
+        cache only take the value once the node has answered the write, see written().
+
+        Forced writes and writes that stop the motor (see stops_motor()) are sent even to a
+        node off the network, everything else to it is dropped."""
+
+        if node == self.node and address in SHADOWED_REGISTERS and subindex == 0:
+            if not force and self.shadow.get(address) == value:
+                self.skipped_writes += 1
+                return
 
         command = ( node + self.SET
                     + int.to_bytes(address, 2, 'little')
@@ -126,7 +206,7 @@ class MotorController():
         #print(dump(command))
         #####print(command)
         
-        self.write(command)
+        self.write(command, urgent = force or stops_motor(address, value))
 
     def getCastedRegister(self, address, subindex = 0):
         return hex(int.from_bytes(self.readRegister(address, self.node, subindex = subindex), byteorder='little'))
@@ -135,8 +215,9 @@ class MotorController():
         print("Status: ", self.getCastedRegister(0x6041))
         return(self.getCastedRegister(0x6041))
     
-    def setControlWord(self, word):
-        self.setRegister(0x6040, word, 2, node = self.node)
+    def setControlWord(self, word, force = False):
+        """State machine transitions are always forced, a drive may have changed state by itself."""
+        self.setRegister(0x6040, word, 2, node = self.node, force = force)
     
 
     #--------------------------------------------
@@ -145,40 +226,39 @@ class MotorController():
     
     def shutDown(self):
         #Register(0x6040)
-        self.setControlWord(0x06)
+        self.setControlWord(0x06, force = True)
 
     def switchOn(self):
         #Register(0x6040)
-        self.setControlWord(0x07)
+        self.setControlWord(0x07, force = True)
 
     def enable(self):
         #Register(0x6040)
-        self.setControlWord(0x0f)
+        self.setControlWord(0x0f, force = True)
 
     def disable(self):
         #Register(0x6040)
-        self.setControlWord(0x07)
+        self.setControlWord(0x07, force = True)
         
     def quickStop(self):
         #Register(0x6040)
-        self.setControlWord(0x02)
+        self.setControlWord(0x02, force = True)
     
-    def halt(self):
+    def halt(self, force = False):
         """
         Pauses current movement without deleting movement command from memory. 
         When unhalted motor will resume the set movement.
         """
         #Register(0x6040)
-        self.setControlWord(0x10f)
+        self.setControlWord(0x10f, force = force)
     
-    def unhalt(self):
+    def unhalt(self, force = False):
         #Register(0x6040)
-        self.setControlWord(0x0f)
+        self.setControlWord(0x0f, force = force)
         
     
     def setSupplyVoltage(self, voltage: int):
-        voltage_upper_limit = 100*math.ceil(voltage*1.15)
-        self.setRegister(0x2325, voltage_upper_limit, 2, node = self.node, subindex=4)
+        self.setRegister(0x2325, supply_voltage_limit(voltage), 2, node = self.node, subindex=4)
 
 
     #--------------------------------------------
@@ -224,7 +304,7 @@ class MotorController():
         self.setRegister(0x6081, value, 4, node = self.node)
         
     def disableVoltage(self):
-        self.setControlWord(0x00)
+        self.setControlWord(0x00, force = True)
 
     def setHomingMethod(self, value):
         self.setRegister(0x6098, value, 2, node = self.node)
@@ -235,9 +315,7 @@ class MotorController():
     #--------------------------------------------  
 
     def setHomingMode(self):
-        #self.setRegister(0x6060, 1, 6)
-        command = self.node + b'\x02' + b'\x60\x60\x00' + b'\x06'
-        self.write(command)
+        self.setRegister(OPERATION_MODE, 6, 1, node = self.node)
 
 
     def setHomingSpeed(self, switch_seek_speed: int, zero_seek_speed: int):
@@ -247,7 +325,7 @@ class MotorController():
 
     def startHoming(self):
         # setRegister(0x6040)
-        self.setControlWord(0x1f)
+        self.setControlWord(0x1f, force = True)
 
 
     #------------------------------------------------
@@ -255,9 +333,7 @@ class MotorController():
     #------------------------------------------------
 
     def setPositionMode(self):
-        #self.setRegister(0x6060, 1, 1)
-        command = self.node + b'\x02' + b'\x60\x60\x00' + b'\x01'
-        self.write(command)
+        self.setRegister(OPERATION_MODE, 1, 1, node = self.node)
     
     def setPositionModeWindow(self, window: int):
         """
@@ -344,12 +420,11 @@ class MotorController():
     #------------------------------------------------
 
     def setVelocityMode(self):
-        #self.setRegister(0x6060, 1, 3)
-        command = self.node + b'\x02' + b'\x60\x60\x00' + b'\x03'
-        self.write(command)
+        self.setRegister(OPERATION_MODE, 3, 1, node = self.node)
     
-    def setTargetVelocity(self, value):
-        self.setRegister(0x60ff, value, 4, node = self.node)
+    def setTargetVelocity(self, value, force = False):
+        """Use force for stops that must reach the drive even if it should already be stopped."""
+        self.setRegister(0x60ff, value, 4, node = self.node, force = force)
 
 
     #--------------------------------------------
@@ -367,6 +442,10 @@ class MotorController():
         
         return converted_reading
 
+    def waitTargetReached(self, timeout = 10.0, abort = None):
+        """Waits for this motor's current move to finish, see wait_for_targets()."""
+        return wait_for_targets([self], timeout = timeout, abort = abort)
+
     def getPosition(self):
         """Reads the current position of the motor."""
         
@@ -582,13 +661,13 @@ class MotorController():
         CiAStatus_QuickStop = 0x07
         #check for being in stopped mode
         if CiAStatus == CiAStatus_QuickStop:
-            self.setControlWord(0x0f)   #Enable Operation
+            self.setControlWord(0x0f, force = True)   #Enable Operation
             EnState = 1
         elif CiAStatus == CiAStatus_OperationEnabled:   #drive is already enabled               
             EnState = 2
         elif CiAStatus != CiAStatus_SwitchOnDisabled: # otherwise it's safe to disable first
             # we need to send a shutdown first
-            self.setControlWord(0x00)   #Controlword = CiACmdDisableVoltage
+            self.setControlWord(0x00, force = True)   #Controlword = CiACmdDisableVoltage
 
         while EnState != 2:
             CiAStatusword = int(self.getCastedRegister(0x6041),base=16)
@@ -597,8 +676,8 @@ class MotorController():
             if EnState == 0:
                 if CiAStatus == 0x40:
                 #send the enable signature
-                    self.setControlWord(0x06) #CiACmdShutdown
-                    self.setControlWord(0x0f) #CiACmdEnableOperation
+                    self.setControlWord(0x06, force = True) #CiACmdShutdown
+                    self.setControlWord(0x0f, force = True) #CiACmdEnableOperation
                     #now wait for being enabled
                     EnState = 1
 
@@ -619,7 +698,7 @@ class MotorController():
         CiAStatus_OperationEnabled = 0x27
         if CiAStatus == CiAStatus_OperationEnabled:
             #send a shutdown command first to stop the motor
-            self.setControlWord(0x07) #CiACmdDisable
+            self.setControlWord(0x07, force = True) #CiACmdDisable
             DiState = 1
         else:
             #otherwise the disable voltage is the next command
@@ -637,7 +716,7 @@ class MotorController():
 
             elif DiState == 2:
                 #wait for enabled
-                self.setControlWord(0x00) #CiACmdDisableVoltage
+                self.setControlWord(0x00, force = True) #CiACmdDisableVoltage
                 DiState = 3
 
             elif DiState == 3:
@@ -646,6 +725,211 @@ class MotorController():
                     DiState = 4
 
 
+#--------------------------------------------
+# Transactions spanning several nodes.
+#--------------------------------------------
+
+_burst = threading.local()
+
+def transact_all(commands):
+    """
+    Sends a list of (motor, command, urgent) back to back and waits for all of the replies,
+    which costs one bus turnaround instead of one per command. Returns the data part of
+    each reply in the same order, or None where a node did not answer.
+    Commands for nodes known to be off the network are not sent unless they are urgent.
+    """
+    results = [None] * len(commands)
+    live = [(index, motor, command) for index, (motor, command, urgent) in enumerate(commands)
+            if urgent or motor.alive is not False]
+    if not live:
+        return results
+
+    replies = bus.submit_batch([build_frame(command) for _, _, command in live])
+    for (index, motor, command), reply in zip(live, replies):
+        results[index] = motor.read(reply)
+        if results[index] is not None:
+            motor.written(command)
+
+    return results
+
+
+class burst():
+    """
+    Collects every frame MotorController writes on this thread inside the with block and
+    sends them back to back when the block ends:
+
+        with mc.burst():
+            Motor_1.setTargetVelocity(-rate)
+            Motor_2.setTargetVelocity(-rate)
+
+    Commands return None inside the block; their replies are in results afterwards.
+    Nothing is sent if the block raises.
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.results = []
+
+    def __enter__(self):
+        self.outer = getattr(_burst, 'current', None)
+        _burst.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _burst.current = self.outer
+        if exc_type is None and self.commands:
+            self.results = transact_all(self.commands)
+
+
+def read_registers(requests):
+    """Reads a list of (motor, address, subindex) registers in one bus turnaround."""
+    with burst() as b:
+        for motor, address, subindex in requests:
+            motor.readRegister(address, motor.node, subindex = subindex)
+
+    for (motor, address, subindex), data in zip(requests, b.results):
+        if data is not None:
+            motor.cache.store(address, subindex, data)
+
+    return b.results
+
+
+def apply_configuration(profiles):
+    """
+    Brings the configuration registers of several nodes to the values in profiles, a list of
+    (motor, [(address, subindex, length, value), ...]). Everything is read back in one
+    bus turnaround and only the registers that differ are written, in a second one.
+    Returns the number of registers written.
+    """
+    registers = [(motor, entry) for motor, entries in profiles for entry in entries]
+    current = read_registers([(motor, address, subindex) for motor, (address, subindex, _, _) in registers])
+
+    written = 0
+    with burst():
+        for (motor, (address, subindex, length, value)), data in zip(registers, current):
+            if data is not None and int.from_bytes(data, byteorder='little', signed=True) == value:
+                continue
+            motor.setRegister(address, value, length, node = motor.node, subindex = subindex)
+            written += 1
+
+    return written
+
+
+def wait_for_targets(motors, timeout = 10.0, abort = None, interval = 0.05, settle = 0.1):
+    """
+    Waits for every motor to set the target reached bit of its status word, polling all of
+    them in one bus turnaround every interval seconds. Call it straight after commanding the
+    moves. abort is an optional function, e.g. lambda: abort, which ends the wait early when
+    it returns True. Returns True once all targets are reached, False on timeout or abort.
+
+    A drive can still show target reached from its previous move for a moment after a new
+    set point, so a motor only counts once it has cleared the bit, or after settle seconds
+    for a move so small it never clears it.
+    """
+    motors = [motor for motor in motors if motor.alive is not False]
+    started = time.monotonic()
+    moving = set()
+
+    while True:
+        words = read_registers([(motor, STATUS_WORD, 0) for motor in motors])
+        elapsed = time.monotonic() - started
+
+        reached = True
+        for motor, word in zip(motors, words):
+            if word is None:
+                continue   # Taken off the network, nothing to wait for.
+            if not int.from_bytes(word, byteorder='little') & CIA_TARGET_REACHED:
+                moving.add(motor.node)
+                reached = False
+            elif motor.node not in moving and elapsed < settle:
+                reached = False
+
+        if reached:
+            return True
+        if elapsed >= timeout or (abort is not None and abort()):
+            return False
+        time.sleep(interval)
+
+
+def wait_for_status(motors, status, timeout = 5.0, interval = 0.05):
+    """
+    Polls the status words of several nodes, all in one bus turnaround, until every one of
+    them is in the given CiA 402 state (e.g. CIA_READY_TO_SWITCH_ON). Returns True, or False
+    if they have not all got there within timeout seconds. Nodes off the network are ignored.
+    """
+    motors = [motor for motor in motors if motor.alive is not False]
+    deadline = time.monotonic() + timeout
+    while True:
+        words = read_registers([(motor, STATUS_WORD, 0) for motor in motors])
+        if all(word is not None and int.from_bytes(word, byteorder='little') & CIA_STATUS_MASK == status for word in words):
+            return True
+
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
+#--------------------------------------------
+# Node discovery and health.
+#--------------------------------------------
+
+def probe_nodes(motors, timeout = DISCOVERY_TIMEOUT):
+    """
+    Reads the status word of every motor in one batch with a short timeout, and marks each
+    of them alive or dead by whether it answered. Returns the motors that answered.
+    """
+    frames = [build_frame(motor.node + MotorController.GET + int.to_bytes(STATUS_WORD, 2, 'little') + b'\x00')
+              for motor in motors]
+    replies = bus.submit_batch(frames, timeout = timeout)
+
+    answered = []
+    for motor, reply in zip(motors, replies):
+        if reply.result() is None:
+            if motor.alive is not False:
+                motor.cache.invalidate()
+                motor.shadow.clear()
+            motor.alive = False
+        else:
+            if motor.alive is False:
+                # Whatever was written while it was away never reached it.
+                motor.cache.invalidate()
+                motor.shadow.clear()
+            motor.missed_replies = 0
+            motor.alive = True
+            answered.append(motor)
+
+    return answered
+
+
+class HealthMonitor():
+    """Background thread which probes the dead nodes every interval seconds and brings back the ones that answer."""
+
+    def __init__(self, motors, interval = PROBE_INTERVAL):
+        self.motors = motors
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="MC5005 health", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            dead = [motor for motor in self.motors if motor.alive is False]
+            if not dead:
+                continue
+
+            for motor in probe_nodes(dead):
+                print(f"Motor ID: {motor.node} is back on the motor control network.")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def supply_voltage_limit(voltage):
+    """Upper supply voltage limit (0x2325.4) for a nominal supply voltage, in 0.01 V."""
+    return 100*math.ceil(voltage*1.15)
+
+
 def enable_1(NodeNr):   #simple enable of axis
     NodeNr.shutDown()
     NodeNr.switchOn()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+
+#########################################################################################
+#
+# Program  : ttv7_mc5005_sim.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Software MC5005 motor network for running, profiling and benchmarking the
+#            CPU1 stack off the robot. Serves a pseudo-terminal which speaks the same
+#            S/E framing and CRC as the real drives, and models each node's CiA 402 state
+#            machine (0x6040/0x6041), operation modes (profile position, profile velocity,
+#            homing), target velocity and position and a simple ramped motion profile.
+#
+#                python3 ttv7_mc5005_sim.py --link /tmp/mc5005 --latency 0.002 --drop 0.01
+#                TTV7_MC5005_PORT=/tmp/mc5005 python3 <anything importing ttv7_motors>
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_crc.py
+#            ttv7_bus.py
+#
+#########################################################################################
+
+import os
+import sys
+import tty
+import math
+import time
+import random
+import signal
+import argparse
+from ttv7_crc import crc8
+from ttv7_bus import build_frame
+
+GET = 0x01
+SET = 0x02
+
+CONTROL_WORD = 0x6040
+STATUS_WORD = 0x6041
+OPERATION_MODE = 0x6060
+OPERATION_MODE_DISP = 0x6061
+POSITION_ACTUAL = 0x6064
+POSITION_WINDOW = 0x6067
+VELOCITY_ACTUAL = 0x606C
+CURRENT_ACTUAL = 0x6074
+TARGET_POSITION = 0x607A
+PROFILE_VELOCITY = 0x6081
+FEED = 0x6092
+VELOCITY_FACTOR = 0x6096
+TARGET_VELOCITY = 0x60FF
+
+PROFILE_POSITION_MODE = 1
+PROFILE_VELOCITY_MODE = 3
+HOMING_MODE = 6
+
+# CiA 402 states as they appear in the status word (masked with 0x6f).
+SWITCH_ON_DISABLED = 0x40
+READY_TO_SWITCH_ON = 0x21
+SWITCHED_ON = 0x23
+OPERATION_ENABLED = 0x27
+QUICK_STOP_ACTIVE = 0x07
+
+TARGET_REACHED = 0x400
+SETPOINT_ACKNOWLEDGE = 0x1000    # Homing attained when in homing mode.
+
+# Register sizes in bytes, anything not listed is answered as a 4 byte value.
+REGISTER_LENGTHS = {
+    CONTROL_WORD: 2,
+    STATUS_WORD: 2,
+    OPERATION_MODE: 1,
+    OPERATION_MODE_DISP: 1,
+    CURRENT_ACTUAL: 2,
+    0x6080: 2,
+    0x6098: 2,
+    0x2311: 2,
+    0x2325: 2,
+}
+
+DEFAULT_REGISTERS = {
+    (0x2329, 2): 2000,               # Continuous current limit, mA.
+    (POSITION_WINDOW, 0): 1,
+    (PROFILE_VELOCITY, 0): 1000,
+    (0x6091, 1): 1,
+    (0x6091, 2): 1,
+    (FEED, 1): 3000,
+}
+
+ACCELERATION = 5000      # Velocity units per second, for both ramps up and down.
+STEP = 0.005             # Motion profile integration step, seconds.
+
+
+class SimulatedNode():
+
+    def __init__(self, node_id):
+        self.node = node_id
+        self.registers = dict(DEFAULT_REGISTERS)
+        self.state = SWITCH_ON_DISABLED
+        self.mode = PROFILE_POSITION_MODE
+        self.control_word = 0
+        self.position = 0.0
+        self.velocity = 0.0
+        self.target = None               # Latched profile position target.
+        self.homed = False
+        self.last_update = time.monotonic()
+
+    #--------------------------------------------
+    # Register access.
+    #--------------------------------------------
+
+    def read(self, address, subindex):
+        self.advance(time.monotonic())
+
+        if address == STATUS_WORD:
+            value = self.status_word()
+        elif address in (OPERATION_MODE, OPERATION_MODE_DISP):
+            value = self.mode
+        elif address == POSITION_ACTUAL:
+            value = int(round(self.position))
+        elif address == VELOCITY_ACTUAL:
+            value = int(round(self.velocity))
+        elif address == CURRENT_ACTUAL:
+            value = min(1000, int(abs(self.velocity) / 10))
+        elif address == CONTROL_WORD:
+            value = self.control_word
+        else:
+            value = self.registers.get((address, subindex), 0)
+
+        length = REGISTER_LENGTHS.get(address, 4)
+        return int.to_bytes(value, length, 'little', signed=value < 0)
+
+    def write(self, address, subindex, value):
+        self.advance(time.monotonic())
+
+        if address == CONTROL_WORD:
+            self.control(value)
+        elif address == OPERATION_MODE:
+            self.mode = value
+            self.target = None
+        elif address == POSITION_ACTUAL:
+            self.position = float(value)
+        else:
+            self.registers[(address, subindex)] = value
+
+    #--------------------------------------------
+    # CiA 402 state machine.
+    #--------------------------------------------
+
+    def control(self, word):
+        previous = self.control_word
+        self.control_word = word
+
+        if not word & 0x02:                                   # Disable voltage.
+            self.state = SWITCH_ON_DISABLED
+        elif not word & 0x04:                                 # Quick stop.
+            self.state = QUICK_STOP_ACTIVE if self.state == OPERATION_ENABLED else SWITCH_ON_DISABLED
+        elif not word & 0x01:                                 # Shutdown.
+            self.state = READY_TO_SWITCH_ON
+        elif not word & 0x08:                                 # Switch on / disable operation.
+            if self.state in (READY_TO_SWITCH_ON, OPERATION_ENABLED):
+                self.state = SWITCHED_ON
+        else:                                                 # Enable operation.
+            if self.state in (READY_TO_SWITCH_ON, SWITCHED_ON, QUICK_STOP_ACTIVE):
+                self.state = OPERATION_ENABLED
+
+        if self.state != OPERATION_ENABLED:
+            self.velocity = 0.0
+            return
+
+        new_setpoint = word & 0x10 and not previous & 0x10
+        if not new_setpoint:
+            return
+
+        if self.mode == PROFILE_POSITION_MODE:
+            target = self.registers.get((TARGET_POSITION, 0), 0)
+            if word & 0x40:    # Relative to the last target.
+                origin = self.target if self.target is not None else self.position
+                self.target = origin + target
+            else:
+                self.target = float(target)
+
+        elif self.mode == HOMING_MODE:
+            # Every homing method is treated as method 37, home at the current position.
+            self.position = 0.0
+            self.target = None
+            self.homed = True
+
+    def halted(self):
+        return bool(self.control_word & 0x100)
+
+    def status_word(self):
+        word = self.state
+
+        if self.state == OPERATION_ENABLED:
+            if self.mode == PROFILE_VELOCITY_MODE:
+                wanted = 0 if self.halted() else self.registers.get((TARGET_VELOCITY, 0), 0)
+                if abs(self.velocity - wanted) < 1:
+                    word |= TARGET_REACHED
+            elif self.mode == PROFILE_POSITION_MODE:
+                # Like the real drive, a halted axis reports target reached once it has stopped.
+                if self.target is None or self.target_reached() or (self.halted() and abs(self.velocity) < 1):
+                    word |= TARGET_REACHED
+            elif self.mode == HOMING_MODE and self.homed:
+                word |= TARGET_REACHED | SETPOINT_ACKNOWLEDGE
+
+        return word
+
+    def target_reached(self):
+        window = self.registers.get((POSITION_WINDOW, 0), 1)
+        return abs(self.target - self.position) <= window and abs(self.velocity) < 1
+
+    #--------------------------------------------
+    # Motion profile.
+    #--------------------------------------------
+
+    def position_rate(self):
+        """Position units per second for one unit of velocity."""
+        if self.registers.get((VELOCITY_FACTOR, 2)) == 60000:
+            return 1000.0    # Leadscrew scaling: velocity in mm/s, position in micrometres.
+
+        return self.registers.get((FEED, 1), 3000) / 60.0    # Velocity in rpm of the output shaft.
+
+    def wanted_velocity(self, rate):
+        if self.state != OPERATION_ENABLED or self.halted():
+            return 0.0
+
+        if self.mode == PROFILE_VELOCITY_MODE:
+            return float(self.registers.get((TARGET_VELOCITY, 0), 0))
+
+        if self.mode == PROFILE_POSITION_MODE and self.target is not None:
+            distance = self.target - self.position
+            window = self.registers.get((POSITION_WINDOW, 0), 1)
+            if abs(distance) <= window:
+                return 0.0
+            braking = math.sqrt(2 * ACCELERATION * abs(distance) / rate)
+            speed = min(abs(self.registers.get((PROFILE_VELOCITY, 0), 1000)), braking)
+            return math.copysign(speed, distance)
+
+        return 0.0
+
+    def advance(self, now):
+        rate = self.position_rate()
+
+        while self.last_update < now:
+            dt = min(STEP, now - self.last_update)
+            self.last_update += dt
+
+            wanted = self.wanted_velocity(rate)
+            change = ACCELERATION * dt
+            if abs(wanted - self.velocity) <= change:
+                self.velocity = wanted
+            else:
+                self.velocity += math.copysign(change, wanted - self.velocity)
+
+            step = self.velocity * rate * dt
+
+            # Arrive exactly instead of stepping over the target, the steps can be coarser than the window.
+            if self.mode == PROFILE_POSITION_MODE and self.target is not None and self.state == OPERATION_ENABLED:
+                distance = self.target - self.position
+                if step * distance >= 0 and abs(step) >= abs(distance) and abs(wanted) <= abs(self.velocity):
+                    self.position = self.target
+                    self.velocity = 0.0
+                    continue
+
+            self.position += step
+
+
+class SimulatedNetwork():
+
+    def __init__(self, node_ids, latency=0.0, drop=0.0, baudrate=115200, seed=None):
+        self.nodes = {node_id: SimulatedNode(node_id) for node_id in node_ids}
+        self.latency = latency
+        self.drop = drop
+        self.byte_time = 10.0 / baudrate
+        self.random = random.Random(seed)
+
+    def handle(self, frame):
+        """Returns the reply to one complete request frame, or None if nobody answers."""
+        if crc8(memoryview(frame)[1:-2]) != frame[-2]:
+            return None
+
+        node = self.nodes.get(frame[2])
+        if node is None or self.random.random() < self.drop:
+            return None
+
+        command = frame[3]
+        address = frame[4] | (frame[5] << 8)
+        subindex = frame[6]
+        header = bytes(frame[2:7])
+
+        if command == GET:
+            return build_frame(header + node.read(address, subindex))
+
+        if command == SET:
+            node.write(address, subindex, int.from_bytes(frame[7:-2], 'little', signed=True))
+            return build_frame(header)
+
+        return None
+
+    def serve(self, fd):
+        buffer = bytearray()
+
+        while True:
+            buffer += os.read(fd, 4096)
+
+            while True:
+                frame = take_frame(buffer)
+                if frame is None:
+                    break
+
+                reply = self.handle(frame)
+                if reply is None:
+                    continue
+
+                time.sleep(self.latency + len(reply) * self.byte_time)
+                os.write(fd, reply)
+
+
+def take_frame(buffer):
+    """Removes and returns the first complete frame in buffer, skipping any noise before it."""
+    while buffer:
+        if buffer[0] != 0x53:
+            del buffer[0]
+            continue
+
+        if len(buffer) < 2:
+            return None
+
+        total = buffer[1] + 2
+        if len(buffer) < total:
+            return None
+
+        if buffer[total - 1] != 0x45:
+            del buffer[0]
+            continue
+
+        frame = bytes(buffer[:total])
+        del buffer[:total]
+        return frame
+
+    return None
+
+
+def parse_nodes(text):
+    """'1-15' or '1,2,3,4' or '1-12,15', node IDs in decimal or hex (0x0D)."""
+    nodes = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            nodes.extend(range(int(first, 0), int(last, 0) + 1))
+        else:
+            nodes.append(int(part, 0))
+
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated MC5005 motor network on a pseudo-terminal.")
+    parser.add_argument("--nodes", default="1-15", help="node IDs that answer, e.g. 1-12 for a flushing robot")
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds before each reply")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability that a request is not answered")
+    parser.add_argument("--baudrate", type=int, default=115200, help="used to model the time on the wire")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--link", default=None, help="create a symlink to the pty at this path")
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    port = os.ttyname(slave)
+
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(port, args.link)
+        port = args.link
+
+    network = SimulatedNetwork(parse_nodes(args.nodes), args.latency, args.drop, args.baudrate, args.seed)
+    print(f"MC5005 network simulator: nodes {args.nodes} on {port}")
+    print(f"Run the robot code with TTV7_MC5005_PORT={port}")
+    sys.stdout.flush()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        network.serve(master)   # The slave end stays open here so the pty survives clients reconnecting.
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+
+if __name__ == '__main__':
+    main()
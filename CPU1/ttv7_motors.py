@@ -14,372 +14,430 @@
 #
 # Dependencies (Python files):
 #            ttv7_mc5005.py
+#            ttv7_robot.py
+#            ttv7_kinematics.py
 #
 #
 ##############################################################################################
 
+import ttv7_robot
 import ttv7_mc5005 as mc
+import ttv7_kinematics as kinematics
 from time import sleep
 
 CURRENT_POSITION = 0x25    # Method No.37: Home motor at its current position...
 
-Motor_1 =  mc.MotorController(b'\x01')
-Motor_2 =  mc.MotorController(b'\x02')
-Motor_3 =  mc.MotorController(b'\x03')
-Motor_4 =  mc.MotorController(b'\x04')
-Motor_5 =  mc.MotorController(b'\x05')
-Motor_6 =  mc.MotorController(b'\x06')
-Motor_7 =  mc.MotorController(b'\x07')
-Motor_8 =  mc.MotorController(b'\x08')
-Motor_9 =  mc.MotorController(b'\x09')
-Motor_A =  mc.MotorController(b'\x0A')
-Motor_B =  mc.MotorController(b'\x0B')
-Motor_C =  mc.MotorController(b'\x0C')
-Motor_D =  mc.MotorController(b'\x0D')
-Motor_E =  mc.MotorController(b'\x0E')
-Motor_F =  mc.MotorController(b'\x0F')
+
+# Registers in the configuration profiles below, as (address, subindex, length, value).
+def homing_method(method):
+    return [(0x6098, 0, 2, method)]
+
+def supply_voltage(voltage):
+    return [(0x2325, 4, 2, mc.supply_voltage_limit(voltage))]
+
+def gear_ratio(motor_revolutions, drive_revolutions):
+    return [(0x6091, 1, 4, motor_revolutions), (0x6091, 2, 4, drive_revolutions)]
+
+def rotary_control():
+    return [(0x6092, 1, 4, 3600), (0x6096, 2, 4, 3600)]             # 0.1 degree steps, RPM
+
+def leadscrew_control(leadscrew_pitch):
+    return [(0x6092, 1, 4, int(leadscrew_pitch*1000)), (0x6096, 2, 4, 60000)]   # micrometers, mm/s
+
+def profile_velocity(value):
+    return [(0x6081, 0, 4, value)]
+
+
+# Motor groups.
+TRACTION = 'traction'
+LEVERS = 'levers'
+HEAD = 'head'
+
+# Every motor on the network. The sign is the direction that moves the robot forward for a
+# wheel, or raises the axle for a lever; gear ratio is motor:drive revolutions and scaling
+# the position/velocity units (none, rotary or leadscrew) written at initialisation.
+#
+#   node  name       role                   group     sign  gear      scaling                  other settings
+MOTOR_TABLE = [
+    (0x01, 'Motor_1', 'left rear wheel',    TRACTION, -1,  (1, 1),    [],                      []),
+    (0x02, 'Motor_2', 'left front wheel',   TRACTION, -1,  (1, 1),    [],                      []),
+    (0x03, 'Motor_3', 'right front wheel',  TRACTION, +1,  (1, 1),    [],                      []),
+    (0x04, 'Motor_4', 'right rear wheel',   TRACTION, +1,  (1, 1),    [],                      []),
+    (0x05, 'Motor_5', 'axle 4 left lever',  LEVERS,   +1,  (1, 1),    [],                      []),
+    (0x06, 'Motor_6', 'axle 3 left lever',  LEVERS,   +1,  (1, 1),    [],                      []),
+    (0x07, 'Motor_7', 'axle 2 left lever',  LEVERS,   -1,  (1, 1),    [],                      []),
+    (0x08, 'Motor_8', 'axle 1 left lever',  LEVERS,   -1,  (1, 1),    [],                      []),
+    (0x09, 'Motor_9', 'axle 1 right lever', LEVERS,   +1,  (1, 1),    [],                      []),
+    (0x0A, 'Motor_A', 'axle 2 right lever', LEVERS,   +1,  (1, 1),    [],                      []),
+    (0x0B, 'Motor_B', 'axle 3 right lever', LEVERS,   -1,  (1, 1),    [],                      []),
+    (0x0C, 'Motor_C', 'axle 4 right lever', LEVERS,   -1,  (1, 1),    [],                      []),
+    (0x0D, 'Motor_D', 'lance slide (red)',  HEAD,     +1,  (16, 1),   leadscrew_control(1.5),  []),
+    (0x0E, 'Motor_E', 'lance roll (blue)',  HEAD,     +1,  (196, 1),  rotary_control(),        []),
+    (0x0F, 'Motor_F', 'lance pitch (yellow)', HEAD,   +1,  (196, 1),  rotary_control(),        profile_velocity(5)),
+]
+
+# The groups fitted to each type of robot in ttv7_robot.robot.
+LAYOUTS = {
+    ttv7_robot.robot.FLUSHING: (TRACTION, LEVERS),              # 12 motors (0x01-0x0C)
+    ttv7_robot.robot.LANCING: (TRACTION, LEVERS, HEAD),         # 15 motors (0x01-0x0F)
+}
+
+
+MOTORS = {}     # MotorController by node ID, with the table entries as attributes.
+
+for node, name, role, group, sign, gear, scaling, settings in MOTOR_TABLE:
+    motor = mc.MotorController(bytes((node,)))
+    motor.name = name
+    motor.role = role
+    motor.group = group
+    motor.sign = sign
+    motor.gear = gear
+    # What the node should look like after initialisation, see initialise_motors().
+    motor.profile = homing_method(CURRENT_POSITION) + supply_voltage(24) + gear_ratio(*gear) + scaling + settings
+    MOTORS[node] = motor
+
+
+def motors_in(*groups):
+    """The motors of one or more groups, in node order."""
+    return [motor for node, motor in sorted(MOTORS.items()) if motor.group in groups]
+
+
+def layout_motors(robot_type):
+    """Every motor fitted to a robot type, given as ttv7_robot.robot.FLUSHING/LANCING or by name ('FLUSHING')."""
+    if isinstance(robot_type, str):
+        robot_type = getattr(ttv7_robot.robot, robot_type)
+
+    return motors_in(*LAYOUTS[robot_type])
+
+
+Motor_1 = MOTORS[0x01]
+Motor_2 = MOTORS[0x02]
+Motor_3 = MOTORS[0x03]
+Motor_4 = MOTORS[0x04]
+Motor_5 = MOTORS[0x05]
+Motor_6 = MOTORS[0x06]
+Motor_7 = MOTORS[0x07]
+Motor_8 = MOTORS[0x08]
+Motor_9 = MOTORS[0x09]
+Motor_A = MOTORS[0x0A]
+Motor_B = MOTORS[0x0B]
+Motor_C = MOTORS[0x0C]
+Motor_D = MOTORS[0x0D]
+Motor_E = MOTORS[0x0E]
+Motor_F = MOTORS[0x0F]
+
+WHEEL_MOTORS = motors_in(TRACTION)
+MECANUM = kinematics.mecanum(WHEEL_MOTORS)
+LEVER_MOTORS = motors_in(LEVERS)
+HEAD_MOTORS = motors_in(HEAD)
+
+AXLE_LEVERS = {
+    1: (Motor_8, Motor_9),
+    2: (Motor_7, Motor_A),
+    3: (Motor_6, Motor_B),
+    4: (Motor_5, Motor_C),
+}
+
+
+def start_and_home(motor):
+    """CiA 402 start up: enable, home at the current position, then leave the motor in homing mode."""
+    motor.shutDown()          #\x06
+    motor.switchOn()          #\x07
+    motor.setHomingMode()     #\x06
+    motor.enable()            #\x0f
+    motor.startHoming()       #\x1f
 
 
 def initialise_motors():
-    # initialise the four traction motors (Mecanum wheeled)
-    Motor_1.shutDown()
-    Motor_1.switchOn()
-    Motor_1.setHomingMode()   #\x06
-    Motor_1.setHomingMethod(CURRENT_POSITION)
-    Motor_1.enable()
-    Motor_1.setSupplyVoltage(24)
-    Motor_1.setGearRatio(1,1)
-    Motor_1.startHoming()     #\x1f
-    Motor_1.setVelocityMode()
-    #sleep(0.1)
-    Motor_2.shutDown()  #06
-    Motor_2.switchOn()  #07
-    Motor_2.setHomingMode()   #\x06
-    Motor_2.setHomingMethod(CURRENT_POSITION)
-    Motor_2.enable()    #0f
-    Motor_2.setSupplyVoltage(24)
-    Motor_2.setGearRatio(1,1)
-    Motor_2.startHoming()     #\x1f
-    Motor_2.setVelocityMode()
-    #sleep(0.1)
-    Motor_3.shutDown()
-    Motor_3.switchOn()
-    Motor_3.setHomingMode()   #\x06
-    Motor_3.setHomingMethod(CURRENT_POSITION)
-    Motor_3.enable()
-    Motor_3.setSupplyVoltage(24)
-    Motor_3.setGearRatio(1,1)
-    Motor_3.startHoming()     #\x1f
-    Motor_3.setVelocityMode()
-    #sleep(0.1)
-    Motor_4.shutDown()  #06
-    Motor_4.switchOn()  #07
-    Motor_4.setHomingMode()   #\x06
-    Motor_4.setHomingMethod(CURRENT_POSITION)
-    Motor_4.enable()    #0f
-    Motor_4.setSupplyVoltage(24)
-    Motor_4.setGearRatio(1,1)
-    Motor_4.startHoming()     #\x1f
-    Motor_4.setVelocityMode()
-    #sleep(0.1)
-  
-    Motor_5.shutDown()        #\x06
-    Motor_5.switchOn()        #\x07
-    Motor_5.setHomingMode()   #\x06
-    Motor_5.setHomingMethod(CURRENT_POSITION)
-    Motor_5.enable()          #\x0f
-    Motor_5.setSupplyVoltage(24)
-    Motor_5.setGearRatio(1,1)
-    Motor_5.startHoming()     #\x1f
-    Motor_5.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_6.shutDown()        #\x06
-    Motor_6.switchOn()        #\x07
-    Motor_6.setHomingMode()   #\x06
-    Motor_6.setHomingMethod(CURRENT_POSITION)
-    Motor_6.enable()          #\x0f
-    Motor_6.setSupplyVoltage(24)
-    Motor_6.setGearRatio(1,1)
-    Motor_6.startHoming()     #\x1f
-    Motor_6.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_7.shutDown()        #\x06
-    Motor_7.switchOn()        #\x07
-    Motor_7.setHomingMode()   #\x06
-    Motor_7.setHomingMethod(CURRENT_POSITION)
-    Motor_7.enable()
-    Motor_7.setSupplyVoltage(24)#\x0f
-    Motor_7.setGearRatio(1,1)
-    Motor_7.startHoming()     #\x1f
-    Motor_7.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_8.shutDown()        #\x06
-    Motor_8.switchOn()        #\x07
-    Motor_8.setHomingMode()   #\x06
-    Motor_8.setHomingMethod(CURRENT_POSITION)
-    Motor_8.enable()          #\x0f
-    Motor_8.setSupplyVoltage(24)
-    Motor_8.setGearRatio(1,1)
-    Motor_8.startHoming()     #\x1f
-    Motor_8.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_9.shutDown()        #\x06
-    Motor_9.switchOn()        #\x07
-    Motor_9.setHomingMode()   #\x06
-    Motor_9.setHomingMethod(CURRENT_POSITION)
-    Motor_9.enable()          #\x0f
-    Motor_9.setSupplyVoltage(24)
-    Motor_9.setGearRatio(1,1)
-    Motor_9.startHoming()     #\x1f
-    Motor_9.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_A.shutDown()        #\x06
-    Motor_A.switchOn()        #\x07
-    Motor_A.setHomingMode()   #\x06
-    Motor_A.setHomingMethod(CURRENT_POSITION)
-    Motor_A.enable()          #\x0f
-    Motor_A.setSupplyVoltage(24)
-    Motor_A.setGearRatio(1,1)
-    Motor_A.startHoming()     #\x1f
-    Motor_A.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_B.shutDown()        #\x06
-    Motor_B.switchOn()        #\x07
-    Motor_B.setHomingMode()   #\x06
-    Motor_B.setHomingMethod(CURRENT_POSITION)
-    Motor_B.enable()          #\x0f
-    Motor_B.setSupplyVoltage(24)
-    Motor_B.setGearRatio(1,1)
-    Motor_B.startHoming()     #\x1f
-    Motor_B.setPositionMode() #\x01
-    #sleep(0.1)
-    Motor_C.shutDown()        #\x06
-    Motor_C.switchOn()        #\x07
-    Motor_C.setHomingMode()   #\x06
-    Motor_C.setHomingMethod(CURRENT_POSITION)
-    Motor_C.enable()          #\x0f
-    Motor_C.setSupplyVoltage(24)
-    Motor_C.setGearRatio(1,1)
-    Motor_C.startHoming()     #\x1f
-    Motor_C.setPositionMode() #\x01
-    #sleep(0.1)
-    
+    # initialise the four traction motors (Mecanum wheeled) and the eight levers
+    mc.apply_configuration([(motor, motor.profile) for motor in WHEEL_MOTORS + LEVER_MOTORS])
+
+    with mc.burst():
+        for motor in WHEEL_MOTORS:
+            start_and_home(motor)
+            motor.setVelocityMode()   #\x03
+        for motor in LEVER_MOTORS:
+            start_and_home(motor)
+            motor.setPositionMode()   #\x01
+
+
 def initialise_head_motors():
     """ Pitch, roll and slide motors setup """
-    # SLIDE: 0x0D, RED
-    # Need to know how we home this motor at robot initialisation.
-    Motor_D.shutDown()        #\x06
-    Motor_D.switchOn()        #\x07
-    Motor_D.setHomingMode()   #\x06
-    Motor_D.setHomingMethod(CURRENT_POSITION)
-    Motor_D.enable()          #\x0f
-    Motor_D.setSupplyVoltage(24)
-    Motor_D.startHoming()    #\x1f # ???         #\x0f
-    Motor_D.setGearRatio(16,1)
-    Motor_D.setLeadscrewControl(1.5)
-    Motor_D.setPositionMode() #\x01
-    #sleep(0.1)
-    # ROLL: 0x0E, BLUE
-    # Need to know how we home this motor at robot initialisation.
-    Motor_E.shutDown()        #\x06
-    Motor_E.setHomingMode()   #\x06
-    Motor_E.setHomingMethod(CURRENT_POSITION)
-    Motor_E.enable()          #\x0f
-    Motor_E.setSupplyVoltage(24)
-    Motor_E.startHoming()          #\x0f
-    Motor_E.setGearRatio(196,1)
-    Motor_E.setRotaryControl()
-    Motor_E.setPositionMode() #\x01
-    #sleep(0.1)
-    # PITCH: 0x0F, YELLOW
-    # Need to know how we home this motor at robot initialisation.
-    Motor_F.shutDown()        #\x06
-    Motor_F.switchOn()        #\x07
-    Motor_F.setHomingMode()   #\x06
-    Motor_F.setHomingMethod(CURRENT_POSITION)
-    Motor_F.enable()          #\x0f
-    Motor_F.setSupplyVoltage(24)
-    Motor_F.startHoming()           #\x0f
-    Motor_F.setGearRatio(196,1)
-    Motor_F.setRotaryControl()
-    Motor_F.setProfileVelocity(5)
-    Motor_F.setPositionMode() #\x01
-    #sleep(0.1)
+    # SLIDE: 0x0D, RED. ROLL: 0x0E, BLUE. PITCH: 0x0F, YELLOW.
+    # Need to know how we home these motors at robot initialisation.
+    mc.apply_configuration([(motor, motor.profile) for motor in HEAD_MOTORS])
+
+    with mc.burst():
+        for motor in HEAD_MOTORS:
+            start_and_home(motor)
+            motor.setPositionMode()   #\x01
+
+
+def wait_until_shut_down(motors, timeout = 5.0):
+    """Waits for the motors to reach Ready To Switch On after terminate_motors(), instead of a fixed sleep."""
+    shut_down = mc.wait_for_status(motors, mc.CIA_READY_TO_SWITCH_ON, timeout = timeout)
+    if not shut_down:
+        print(f"Warning: not every motor has shut down after {timeout} seconds.")
+    return shut_down
  
-def stop_robot():
-    Motor_1.setTargetVelocity(0)
-    Motor_2.setTargetVelocity(0)
-    Motor_3.setTargetVelocity(0)
-    Motor_4.setTargetVelocity(0)
+#--------------------------------------------
+# Group operations, one burst per group.
+#--------------------------------------------
+
+# Writes that would not change a drive are skipped (see SHADOWED_REGISTERS in ttv7_mc5005.py),
+# force sends them anyway and is used by the operator's STOP and PAUSE.
+
+def stop_group(motors, force = False):
+    with mc.burst():
+        for motor in motors:
+            motor.setTargetVelocity(0, force = force)
+
+def halt_group(motors, force = False):
+    with mc.burst():
+        for motor in motors:
+            motor.halt(force = force)
+
+def unhalt_group(motors, force = False):
+    with mc.burst():
+        for motor in motors:
+            motor.unhalt(force = force)
+
+def terminate_group(motors):
+    with mc.burst():
+        for motor in motors:
+            motor.shutDown()
+    wait_until_shut_down(motors, timeout = 0.3)
+
+def get_group_status(motors):
+    """Node IDs of the motors that are not operation enabled or did not answer, read in one bus turnaround."""
+    try:
+        words = mc.read_registers([(motor, mc.STATUS_WORD, 0) for motor in motors])
+    except Exception as e:
+        # As when each motor was read on its own, a failed read means the motor is faulty.
+        print(f"Error reading the motor status words: {e}")
+        words = [None] * len(motors)
+
+    FaultyMotorsList = []
+    for motor, word in zip(motors, words):
+        if word is None or int.from_bytes(word, byteorder='little') not in (0x1427, 0x427, 0x27):
+            FaultyMotorsList.append(motor.node[0])
+
+    return FaultyMotorsList
+
+
+def stop_robot(force = False):
+    stop_group(WHEEL_MOTORS, force = force)
  
  
 def stop_head():
     Motor_D.setVelocityMode()
     Motor_E.setVelocityMode()
     Motor_F.setVelocityMode()
-    Motor_D.setTargetVelocity(0)
-    Motor_E.setTargetVelocity(0)
-    Motor_F.setTargetVelocity(0)
+    Motor_D.setTargetVelocity(0, force = True)
+    Motor_E.setTargetVelocity(0, force = True)
+    Motor_F.setTargetVelocity(0, force = True)
     Motor_D.setPositionMode()
     Motor_E.setPositionMode()
     Motor_F.setPositionMode()
 
-def halt_motors():
-
-    Motor_1.halt()
-    Motor_2.halt()
-    Motor_3.halt()
-    Motor_4.halt()
-    Motor_5.halt()
-    Motor_6.halt()
-    Motor_7.halt()
-    Motor_8.halt()
-    Motor_9.halt()
-    Motor_A.halt()
-    Motor_B.halt()
-    Motor_C.halt()
-    
-def halt_head_motors():    
-    
-    Motor_D.halt()
-    Motor_E.halt()
-    Motor_F.halt()
-
-def unhalt_motors():
-
-    Motor_1.unhalt()
-    Motor_2.unhalt()
-    Motor_3.unhalt()
-    Motor_4.unhalt()
-    Motor_5.unhalt()
-    Motor_6.unhalt()
-    Motor_7.unhalt()
-    Motor_8.unhalt()
-    Motor_9.unhalt()
-    Motor_A.unhalt()
-    Motor_B.unhalt()
-    Motor_C.unhalt()
-    
-def unhalt_head_motors():    
-    
-    Motor_D.unhalt()
-    Motor_E.unhalt()
-    Motor_F.unhalt()
+def halt_motors(force = False):
+    halt_group(WHEEL_MOTORS + LEVER_MOTORS, force = force)
+    
+def halt_head_motors(force = False):    
+    halt_group(HEAD_MOTORS, force = force)
+
+def unhalt_motors(force = False):
+    unhalt_group(WHEEL_MOTORS + LEVER_MOTORS, force = force)
     
+def unhalt_head_motors(force = False):    
+    unhalt_group(HEAD_MOTORS, force = force)
     
+    
+#--------------------------------------------
+# Traction. Every wheel command goes through drive(), see ttv7_kinematics.py.
+#--------------------------------------------
+
+ALL_WHEELS = (0, 1, 2, 3)      # Indexes into WHEEL_MOTORS.
+LEFT_WHEELS = (0, 1)           # Motor_1, Motor_2
+RIGHT_WHEELS = (2, 3)          # Motor_3, Motor_4
+AXLE_1_WHEELS = (1, 2)         # Motor_2, Motor_3 (front)
+AXLE_4_WHEELS = (0, 3)         # Motor_1, Motor_4 (rear)
+
+def drive(vx, vy = 0, omega = 0, wheels = ALL_WHEELS):
+    """
+    Sets the wheel velocities for a body velocity (vx forwards, vy left, omega anticlockwise)
+    in one burst. wheels picks which of the four wheels are sent their speed, the rest are
+    left as they are.
+    """
+    speeds = kinematics.body_to_wheels(MECANUM, vx, vy, omega)
+
+    with mc.burst():
+        for index in wheels:
+            WHEEL_MOTORS[index].setTargetVelocity(int(speeds[index]))
+
+
 def left(rate):
-    Motor_1.setTargetVelocity(-rate)
-    Motor_2.setTargetVelocity(rate)
-    Motor_3.setTargetVelocity(rate)
-    Motor_4.setTargetVelocity(-rate)   
+    drive(0, rate)
     
 def left_1_2(rate):
-    Motor_1.setTargetVelocity(-rate)
-    Motor_2.setTargetVelocity(rate)
+    drive(0, rate, wheels = LEFT_WHEELS)
     
 def left_3_4(rate):
-    Motor_3.setTargetVelocity(rate)
-    Motor_4.setTargetVelocity(-rate) 
+    drive(0, rate, wheels = RIGHT_WHEELS)
     
 def right(rate):
-    Motor_1.setTargetVelocity(rate)
-    Motor_2.setTargetVelocity(-rate)
-    Motor_3.setTargetVelocity(-rate)
-    Motor_4.setTargetVelocity(rate)
+    drive(0, -rate)
     
 def right_1_2(rate):
-    Motor_1.setTargetVelocity(rate)
-    Motor_2.setTargetVelocity(-rate)
+    drive(0, -rate, wheels = LEFT_WHEELS)
     
 def right_3_4(rate):
-    Motor_3.setTargetVelocity(-rate)
-    Motor_4.setTargetVelocity(rate)
+    drive(0, -rate, wheels = RIGHT_WHEELS)
 
 
 def forward(rate):
-    Motor_1.setTargetVelocity(-rate)
-    Motor_2.setTargetVelocity(-rate)
-    Motor_3.setTargetVelocity(rate)
-    Motor_4.setTargetVelocity(rate)
+    drive(rate)
     
 def fw_1(rate):
-    Motor_1.setTargetVelocity(-rate)
+    drive(rate, wheels = (0,))
     
 def fw_2(rate):
-    Motor_2.setTargetVelocity(-rate)
+    drive(rate, wheels = (1,))
 
 def fw_3(rate):
-    Motor_3.setTargetVelocity(rate)
+    drive(rate, wheels = (2,))
 
 def fw_4(rate):
-    Motor_4.setTargetVelocity(rate)
+    drive(rate, wheels = (3,))
     
+# NB: the axle 1 pair has always been driven the opposite way to forward() and reverse().
 def forward_axle_1(rate):
-    Motor_2.setTargetVelocity(rate)
-    Motor_3.setTargetVelocity(-rate)
+    drive(-rate, wheels = AXLE_1_WHEELS)
     
 def forward_axle_4(rate):
-    Motor_1.setTargetVelocity(-rate)
-    Motor_4.setTargetVelocity(rate)    
+    drive(rate, wheels = AXLE_4_WHEELS)
     
 def reverse(rate):
-    Motor_1.setTargetVelocity(rate)
-    Motor_2.setTargetVelocity(rate)
-    Motor_3.setTargetVelocity(-rate)
-    Motor_4.setTargetVelocity(-rate)
+    drive(-rate)
     
 def rv_1(rate):
-    Motor_1.setTargetVelocity(rate)
+    drive(-rate, wheels = (0,))
 
 def rv_2(rate):
-    Motor_2.setTargetVelocity(rate)
+    drive(-rate, wheels = (1,))
 
 def rv_3(rate):
-    Motor_3.setTargetVelocity(-rate)
+    drive(-rate, wheels = (2,))
 
 def rv_4(rate):
-    Motor_4.setTargetVelocity(-rate)
+    drive(-rate, wheels = (3,))
         
     
 def reverse_axle_1(rate):
-    Motor_2.setTargetVelocity(-rate)
-    Motor_3.setTargetVelocity(rate)
+    drive(rate, wheels = AXLE_1_WHEELS)
     
 def reverse_axle_4(rate):
-    Motor_1.setTargetVelocity(rate)
-    Motor_4.setTargetVelocity(-rate)    
-    
+    drive(-rate, wheels = AXLE_4_WHEELS)
+    
+
+# Profile position runs: the drives stop at their targets themselves, with no polling.
+
+def get_wheel_positions():
+    """Actual positions of Motor_1 ... Motor_4 in one bus turnaround, None for a wheel that does not answer."""
+    positions = mc.read_registers([(motor, 0x6064, 0) for motor in WHEEL_MOTORS])
+    return [None if data is None else int.from_bytes(data, byteorder='little', signed=True) for data in positions]
+
+def wheel_targets(positions, distance):
+    """Absolute targets distance position units forwards (negative for reverse) of positions, by each wheel's sign."""
+    return [None if position is None else position + motor.sign * distance for motor, position in zip(WHEEL_MOTORS, positions)]
+
+def drive_to_positions(targets, rate):
+    """Sends each wheel to its absolute target (None to leave it) at rate in profile position mode, in one burst."""
+    with mc.burst():
+        for motor, target in zip(WHEEL_MOTORS, targets):
+            if target is not None:
+                motor.setPositionMode()
+                motor.setProfileVelocity(abs(rate))
+                motor.setPositionAbsolute(target)
+
+def wheels_at_targets(targets):
+    """
+    True when every wheel with a target is within its position window (0x6067) of it, all read
+    in one bus turnaround. A halted drive reports target reached wherever it stopped, this does not.
+    """
+    data = mc.read_registers([(motor, 0x6064, 0) for motor in WHEEL_MOTORS] + [(motor, 0x6067, 0) for motor in WHEEL_MOTORS])
+    values = [None if value is None else int.from_bytes(value, byteorder='little', signed=True) for value in data]
+    positions, windows = values[:len(WHEEL_MOTORS)], values[len(WHEEL_MOTORS):]
+
+    for target, position, window in zip(targets, positions, windows):
+        if target is None or position is None or window is None:
+            continue   # No target, or the wheel is off the network.
+        if abs(position - target) > window:
+            return False
+    return True
+
+def wheels_velocity_mode():
+    """Back to velocity mode, stopped. The profile velocity is a top speed there, so it goes back to the maximum."""
+    with mc.burst():
+        for motor in WHEEL_MOTORS:
+            motor.setTargetVelocity(0, force = True)
+            motor.setVelocityMode()
+            motor.setProfileVelocity(kinematics.MAX_WHEEL_SPEED)
+
+def wait_for_wheels(timeout = 2.0, abort = None, interval = 0.05):
+    return mc.wait_for_targets(WHEEL_MOTORS, timeout = timeout, abort = abort, interval = interval)
+
+def wait_for_axle(axle, timeout = 2.0, abort = None):
+    """Waits for both levers of an axle (1 front ... 4 rear) to reach their targets, see mc.wait_for_targets()."""
+    return mc.wait_for_targets(AXLE_LEVERS[axle], timeout = timeout, abort = abort)
+
+def get_lever_positions():
+    """Actual positions of Motor_5 ... Motor_C in one bus turnaround, None for a lever that does not answer."""
+    positions = mc.read_registers([(motor, 0x6064, 0) for motor in LEVER_MOTORS])
+    return [None if data is None else int.from_bytes(data, byteorder='little', signed=True) for data in positions]
+
+def wait_for_levers(timeout = 2.0, abort = None):
+    return mc.wait_for_targets(LEVER_MOTORS, timeout = timeout, abort = abort)
+
 def axle_1_raise(height):
-    Motor_8.setPositionRelative(-height)
-    Motor_9.setPositionRelative(height)
+    with mc.burst():
+        Motor_8.setPositionRelative(-height)
+        Motor_9.setPositionRelative(height)
 
 def axle_2_raise(height):
-    Motor_7.setPositionRelative(-height)
-    Motor_A.setPositionRelative(height)
+    with mc.burst():
+        Motor_7.setPositionRelative(-height)
+        Motor_A.setPositionRelative(height)
     
 def axle_3_raise(height):
-    Motor_6.setPositionRelative(height)
-    Motor_B.setPositionRelative(-height)
+    with mc.burst():
+        Motor_6.setPositionRelative(height)
+        Motor_B.setPositionRelative(-height)
     
 def axle_4_raise(height):
-    Motor_5.setPositionRelative(height)
-    Motor_C.setPositionRelative(-height)
+    with mc.burst():
+        Motor_5.setPositionRelative(height)
+        Motor_C.setPositionRelative(-height)
     
 def axle_1_lower(height):
-    Motor_8.setPositionRelative(height)
-    Motor_9.setPositionRelative(-height)
+    with mc.burst():
+        Motor_8.setPositionRelative(height)
+        Motor_9.setPositionRelative(-height)
     
 def axle_2_lower(height):
-    Motor_7.setPositionRelative(height)
-    Motor_A.setPositionRelative(-height)
+    with mc.burst():
+        Motor_7.setPositionRelative(height)
+        Motor_A.setPositionRelative(-height)
         
 def axle_3_lower(height):
-    Motor_6.setPositionRelative(-height)
-    Motor_B.setPositionRelative(height)
+    with mc.burst():
+        Motor_6.setPositionRelative(-height)
+        Motor_B.setPositionRelative(height)
     
 def axle_4_lower(height):
-    Motor_5.setPositionRelative(-height)
-    Motor_C.setPositionRelative(height)
+    with mc.burst():
+        Motor_5.setPositionRelative(-height)
+        Motor_C.setPositionRelative(height)
     
 # Specific motor (motor ID used as index) commands for raise and lower.
 
@@ -512,31 +570,48 @@ def EC(height):
 
 # control all frour axles but on one side only.  
 def axles_raise_left_side(height):
-    Motor_6.setPositionRelative(height) 
-    Motor_7.setPositionRelative(-height)
-    Motor_5.setPositionRelative(height)
-    Motor_8.setPositionRelative(-height)
+    with mc.burst():
+        Motor_6.setPositionRelative(height) 
+        Motor_7.setPositionRelative(-height)
+        Motor_5.setPositionRelative(height)
+        Motor_8.setPositionRelative(-height)
 
 def axles_lower_left_side(height):
-    Motor_6.setPositionRelative(-height) 
-    Motor_7.setPositionRelative(height)
-    Motor_5.setPositionRelative(-height)
-    Motor_8.setPositionRelative(height)
+    with mc.burst():
+        Motor_6.setPositionRelative(-height) 
+        Motor_7.setPositionRelative(height)
+        Motor_5.setPositionRelative(-height)
+        Motor_8.setPositionRelative(height)
     
 def axles_raise_right_side(height):
-    Motor_A.setPositionRelative(height)
-    Motor_B.setPositionRelative(-height)
-    Motor_9.setPositionRelative(height)
-    Motor_C.setPositionRelative(-height)
+    with mc.burst():
+        Motor_A.setPositionRelative(height)
+        Motor_B.setPositionRelative(-height)
+        Motor_9.setPositionRelative(height)
+        Motor_C.setPositionRelative(-height)
     
 def axles_lower_right_side(height):
-    Motor_A.setPositionRelative(-height)
-    Motor_B.setPositionRelative(height)
-    Motor_9.setPositionRelative(-height)
-    Motor_C.setPositionRelative(height)
+    with mc.burst():
+        Motor_A.setPositionRelative(-height)
+        Motor_B.setPositionRelative(height)
+        Motor_9.setPositionRelative(-height)
+        Motor_C.setPositionRelative(height)
+    
     
     
     
+def axles_lift_sides(left, right):
+    """Raises (positive) or lowers (negative) the left and the right side by their own heights, in one burst."""
+    with mc.burst():
+        Motor_6.setPositionRelative(left)
+        Motor_7.setPositionRelative(-left)
+        Motor_5.setPositionRelative(left)
+        Motor_8.setPositionRelative(-left)
+        Motor_A.setPositionRelative(right)
+        Motor_B.setPositionRelative(-right)
+        Motor_9.setPositionRelative(right)
+        Motor_C.setPositionRelative(-right)
+    
     
 def axles_raise_left_side_climb(height):
     Motor_6.setPositionRelative(height) 
@@ -574,20 +649,24 @@ def axles_lower_right_side_climb(height):
     
     
 def mid_axles_right_up(height):
-    Motor_A.setPositionRelative(height)
-    Motor_B.setPositionRelative(-height)
+    with mc.burst():
+        Motor_A.setPositionRelative(height)
+        Motor_B.setPositionRelative(-height)
     
 def mid_axles_right_down(height):
-    Motor_A.setPositionRelative(-height)
-    Motor_B.setPositionRelative(height)
+    with mc.burst():
+        Motor_A.setPositionRelative(-height)
+        Motor_B.setPositionRelative(height)
     
 def mid_axles_left_up(height):
-    Motor_6.setPositionRelative(height) 
-    Motor_7.setPositionRelative(-height)
+    with mc.burst():
+        Motor_6.setPositionRelative(height) 
+        Motor_7.setPositionRelative(-height)
     
 def mid_axles_left_down(height):
-    Motor_6.setPositionRelative(-height)
-    Motor_7.setPositionRelative(height)
+    with mc.burst():
+        Motor_6.setPositionRelative(-height)
+        Motor_7.setPositionRelative(height)
     
     
 def home_slide_motor():
@@ -598,13 +677,13 @@ def home_slide_motor():
 def slide_motor_left():
     Motor_D.setPositionMode()
     Motor_D.setPositionRelative(2500)
-    sleep(5)
+    Motor_D.waitTargetReached(timeout = 5)
     
 
 def slide_motor_right():
     Motor_D.setPositionMode()
     Motor_D.setPositionRelative(-2500)
-    sleep(5)
+    Motor_D.waitTargetReached(timeout = 5)
 
     
 def stop_slide_motor():
@@ -655,50 +734,42 @@ def stop_pitch_motor():
     Motor_F.setPositionMode()
     
 def terminate_motors():
-    Motor_1.shutDown()
-    Motor_2.shutDown()
-    Motor_3.shutDown()
-    Motor_4.shutDown()
-    Motor_5.shutDown()
-    Motor_6.shutDown()
-    Motor_7.shutDown()
-    Motor_8.shutDown()
-    Motor_9.shutDown()
-    Motor_A.shutDown()
-    Motor_B.shutDown()
-    Motor_C.shutDown()
-    sleep(0.3)
+    terminate_group(WHEEL_MOTORS + LEVER_MOTORS)
     
     
 def terminate_head_motors():
-    Motor_D.shutDown()
-    Motor_E.shutDown()
-    Motor_F.shutDown()
-    sleep(0.3)
-    
-def get_all_motors_status():
-    
-    MotorsList = [Motor_1, Motor_2, Motor_3, Motor_4, Motor_5, Motor_6, Motor_7, Motor_8, Motor_9, Motor_A, Motor_B, Motor_C]
-    FaultyMotorsList = []
+    terminate_group(HEAD_MOTORS)
     
-    for index, motor in enumerate(MotorsList):
-        try:
-            motorStatus = motor.printStatus()
-        except Exception as e:
-            FaultyMotorsList.append(index+1)
-            continue
-            
-            
-        if (motorStatus != '0x1427') and (motorStatus != '0x427') and (motorStatus != '0x27'):
-            
-            FaultyMotorsList.append(index+1)
-            
-            
-#     MotorStatusList.append(Motor_D.printStatus())
-#     MotorStatusList.append(Motor_E.printStatus())
-#     MotorStatusList.append(Motor_F.printStatus())
-    
-    return(FaultyMotorsList)
+health_monitor = None
+
+def discover_motors(robot_type):
+    """
+    Start up sweep of the motors fitted to robot_type (see layout_motors()). Nodes that do not
+    answer are marked dead, so commands and status reads skip them instead of timing out, and
+    the health monitor is started to bring them back when they are powered up. Returns the
+    motors found.
+    """
+    global health_monitor
+
+    motors = layout_motors(robot_type)
+    found = mc.probe_nodes(motors)
+
+    print(f"Motor network: found {', '.join(motor.name for motor in found) or 'no motors'}.")
+    missing = [motor.name for motor in motors if motor.alive is False]
+    if missing:
+        print(f"Motor network: no answer from {', '.join(missing)}.")
+
+    if health_monitor is None:
+        health_monitor = mc.HealthMonitor(motors)
+
+    return found
+
+def get_all_motors_status(robot_type = None):
+    """Faulty traction and lever motors, or every motor of robot_type (e.g. 'LANCING') when given."""
+    if robot_type is None:
+        return get_group_status(WHEEL_MOTORS + LEVER_MOTORS)
+
+    return get_group_status(layout_motors(robot_type))
     
     
     
@@ -0,0 +1,146 @@
+#########################################################################################
+#
+# Program  : ttv7_odometry.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Odometry from the traction encoders. While a run segment is being measured
+#            (begin() ... end()) a thread reads the actual position (0x6064) of the four
+#            wheels in one bus turnaround at a fixed rate and turns the change since the
+#            last reading into distance travelled along the tubes and velocity, using the
+#            wheel diameter set by the controller (CTRL~WHEEL, from
+#            read_excel_data.wheel_diameter).
+#
+#            The traction drives are set up with gear 1:1, so 0x6064 counts motor turns,
+#            not wheel turns. The gearhead reduction comes from the calibration the Manual
+#            Distance runs used before the odometry: 10.35 cm every 0.5 s at speed 3000.
+#
+#            A wheel that slips turns further than the robot moves, so each period the
+#            wheels are compared with the median of the four and any that differ from it
+#            by more than SLIP_TOLERANCE are left out of that period's distance.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_mc5005.py
+#
+#########################################################################################
+
+import math
+import logging
+import threading
+import statistics
+import ttv7_mc5005 as mc
+from time import monotonic, sleep
+
+ODOMETRY_RATE = 10.0            # Readings per second.
+WHEEL_DIAMETER = 152.4          # mm, the big wheels, until the controller sends the fitted size.
+
+COUNTS_PER_MOTOR_REVOLUTION = 3000  # Position units (0x6064) per motor turn, the MC5005 default feed constant (0x6092).
+CALIBRATION_SPEED = 3000            # rpm at the motor, robbie.flush_speed for a FAST run.
+CALIBRATION_TRAVEL = 207.0          # mm/s travelled at CALIBRATION_SPEED on WHEEL_DIAMETER wheels.
+
+# Motor turns per wheel turn, about 116.
+GEAR_REDUCTION = (CALIBRATION_SPEED / 60) / (CALIBRATION_TRAVEL / (math.pi * WHEEL_DIAMETER))
+COUNTS_PER_REVOLUTION = COUNTS_PER_MOTOR_REVOLUTION * GEAR_REDUCTION    # Position units per wheel turn.
+
+SLIP_TOLERANCE = 0.2            # Fraction of the median a wheel may differ by before it counts as slipping.
+SLIP_MARGIN = 20                # Position units always allowed, so a robot standing still never slips.
+
+
+class OdometryService():
+    """
+    Integrates the positions of wheels, the traction MotorControllers with their forward
+    sign (ttv7_motors.MOTOR_TABLE), at rate per second between begin() and end(), once
+    start() has started the thread. distance is in mm since the last begin(), positive
+    forwards, and velocity in mm/s.
+    """
+
+    def __init__(self, wheels, rate = ODOMETRY_RATE, wheel_diameter = WHEEL_DIAMETER):
+        self.wheels = wheels
+        self.interval = 1.0 / rate
+        self.set_wheel_diameter(wheel_diameter)
+        self.positions = [None] * len(wheels)   # Latest reading of each wheel, None if it did not answer.
+        self.previous = None
+        self.time = None
+        self.lock = threading.Lock()            # begin() and update() both change distance.
+        self.active = threading.Event()         # Set between begin() and end().
+        self.distance = 0.0
+        self.velocity = 0.0
+        self.slipping = []                      # Names of the wheels left out of the last period.
+        self.errors = 0
+
+    def set_wheel_diameter(self, wheel_diameter):
+        self.wheel_diameter = float(wheel_diameter)
+        self.mm_per_count = math.pi * self.wheel_diameter / COUNTS_PER_REVOLUTION
+
+    def begin(self):
+        """Starts measuring a segment from 0. The first reading after it is the new starting point."""
+        with self.lock:
+            self.previous = None
+            self.distance = 0.0
+            self.velocity = 0.0
+        self.active.set()
+
+    def end(self):
+        """Stops reading the wheels until the next begin(), distance keeps the segment's length."""
+        self.active.clear()
+        self.velocity = 0.0
+
+    def start(self):
+        threading.Thread(target = self.run, name = "odometry", daemon = True).start()
+
+    def run(self):
+        next_reading = monotonic()
+
+        while True:
+            if not self.active.is_set():
+                self.active.wait()
+                next_reading = monotonic()
+
+            try:
+                data = mc.read_registers([(motor, 0x6064, 0) for motor in self.wheels])
+            except Exception:
+                self.errors += 1
+                logging.exception("Odometry reading failed: ")
+            else:
+                positions = [None if value is None else int.from_bytes(value, byteorder='little', signed=True) for value in data]
+                self.update(monotonic(), positions)
+
+            next_reading += self.interval
+            delay = next_reading - monotonic()
+            if delay > 0:
+                sleep(delay)
+            else:
+                next_reading = monotonic()
+
+    def update(self, time, positions):
+        with self.lock:
+            self.integrate(time, positions)
+
+    def integrate(self, time, positions):
+        previous, self.previous = self.previous, positions
+        last_time, self.time = self.time, time
+        self.positions = positions
+        if previous is None:
+            return
+
+        # Forward movement of each wheel that answered both times.
+        steps = [(motor, motor.sign * (now - before)) for motor, now, before in zip(self.wheels, positions, previous)
+                 if now is not None and before is not None]
+        if not steps:
+            self.velocity = 0.0
+            return
+
+        median = statistics.median(step for _, step in steps)
+        allowed = max(abs(median) * SLIP_TOLERANCE, SLIP_MARGIN)
+        good = [step for _, step in steps if abs(step - median) <= allowed]
+        self.slipping = [motor.name for motor, step in steps if abs(step - median) > allowed]
+        if not good:
+            # Two wheels that disagree, neither can be trusted more than the other.
+            good = [median]
+
+        moved = sum(good) / len(good) * self.mm_per_count
+        self.distance += moved
+        self.velocity = moved / (time - last_time) if time > last_time else 0.0
@@ -0,0 +1,99 @@
+#########################################################################################
+#
+# Program  : ttv7_register_cache.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Per-node cache of MC5005 register values, keyed by (address, subindex).
+#            Every register belongs to a volatility class which decides how long a
+#            value read from, or written to, the drive can be trusted:
+#
+#                STATIC  - configuration we set once at start up (gear ratio, limits)
+#                WRITTEN - only changes when we write it (targets, control word, mode)
+#                LIVE    - telemetry the drive updates itself, never cached
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import time
+
+STATIC = 'static'
+WRITTEN = 'written'
+LIVE = 'live'
+
+# Seconds a cached value stays valid. The expiries catch a drive which was reset or power
+# cycled behind our back, a node that stops answering clears its whole cache straight away.
+EXPIRY = {
+    STATIC: 600.0,
+    WRITTEN: 10.0,
+    LIVE: 0.0,
+}
+
+# Registers not listed here are LIVE, so anything new is read from the drive until it is
+# declared otherwise. Every subindex of a register is in the same class.
+REGISTER_CLASSES = {
+    0x2310: STATIC,     # digital input configuration
+    0x2311: STATIC,     # digital outputs
+    0x2325: STATIC,     # supply voltage limits
+    0x2329: STATIC,     # current limits
+    0x2331: STATIC,     # target position source
+    0x6067: STATIC,     # position window
+    0x6068: STATIC,     # position window time
+    0x607B: STATIC,     # position range limit
+    0x607D: STATIC,     # software position limit
+    0x6080: STATIC,     # max motor speed
+    0x6091: STATIC,     # gear ratio
+    0x6092: STATIC,     # feed constant
+    0x6096: STATIC,     # velocity factor
+    0x6098: STATIC,     # homing method
+    0x6099: STATIC,     # homing speeds
+
+    0x6040: WRITTEN,    # control word
+    0x6060: WRITTEN,    # operation mode
+    0x607A: WRITTEN,    # target position
+    0x6081: WRITTEN,    # profile velocity
+    0x60FF: WRITTEN,    # target velocity
+}
+
+
+def volatility(address):
+    return REGISTER_CLASSES.get(address, LIVE)
+
+
+class RegisterCache():
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, address, subindex = 0):
+        """Returns the cached data bytes of a register, or None if it has to be read from the drive."""
+        if volatility(address) == LIVE:
+            return None
+
+        entry = self.entries.get((address, subindex))
+        if entry is None or time.monotonic() >= entry[1]:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[0]
+
+    def store(self, address, subindex, data):
+        """Remembers the data bytes read from or written to a register, unless it is LIVE."""
+        lifetime = EXPIRY[volatility(address)]
+        if lifetime > 0:
+            self.entries[(address, subindex)] = (bytes(data), time.monotonic() + lifetime)
+
+    def invalidate(self, address = None, subindex = 0):
+        """Forgets one register, or every register of the node when no address is given."""
+        if address is None:
+            self.entries.clear()
+        else:
+            self.entries.pop((address, subindex), None)
@@ -88,9 +88,9 @@ class robot:
     
     # Inertial Measurement Unit values (IMU). Only interested in roll for left/right climbing.
     # Pitch will be useful if the robot is nose diving off the tubes.
-    pitch = 0       # Robot body pitch, not lance pitch.
-    roll = 0        # Robot body roll.
-    yaw = 0         # Robot body yaw, not used at all.
+    pitch = 0.0     # Robot body pitch in degrees, not lance pitch.
+    roll = 0.0      # Robot body roll in degrees.
+    yaw = 0.0       # Robot body yaw in degrees, drifts, not used at all.
     quant_roll = 0  # Quantised roll value
     
     # IMU diagnostics...
@@ -0,0 +1,142 @@
+#########################################################################################
+#
+# Program  : ttv7_server.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Control socket server for CPU1. One asyncio event loop accepts and reads
+#            every client (the robot controller with its CTRL and ADMN messages, and
+#            CPU2) instead of a blocking accept() and a thread per connection. Messages
+#            are decoded with ttv7_framing straight from the loop's receive buffer and
+#            handed to a callback, which must not block: the motor and GPIO work runs
+#            on the command executor (ttv7_executor.py).
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#            ttv7_framing.py
+#
+#########################################################################################
+
+import asyncio
+import logging
+from ttv7_framing import FrameDecoder, encode_frame, PROTOCOL_VERSION, COMMAND, REPLY
+
+
+class Request():
+    """
+    One message received from a session. Whatever is sent back through it carries the
+    message's request id, so the client can tell which of its requests it answers.
+    """
+
+    def __init__(self, session, request_id):
+        self.session = session
+        self.request_id = request_id
+
+    @property
+    def addr(self):
+        return self.session.addr
+
+    def send_message(self, payload, kind = REPLY):
+        self.session.send_message(payload, kind, self.request_id)
+
+    def close(self):
+        self.session.close()
+
+
+class ClientSession(asyncio.BufferedProtocol):
+    """
+    One connected client. send_message() and close() may be called from any thread, the
+    data is handed to the event loop which writes whole messages in the order given.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.decoder = FrameDecoder()
+        self.loop = None
+        self.transport = None
+        self.addr = None
+
+    @property
+    def legacy(self):
+        return bool(self.decoder.legacy)
+
+    def connection_made(self, transport):
+        self.loop = asyncio.get_event_loop()
+        self.transport = transport
+        self.addr = transport.get_extra_info('peername')
+        self.server.connected(self)
+
+    def get_buffer(self, sizehint):
+        return self.decoder.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        try:
+            messages = self.decoder.buffer_updated(nbytes)
+        except ValueError as error:
+            print(f"{self.addr}: {error} Closing the connection.")
+            logging.error("%s: %s Closing the connection.", self.addr, error)
+            self.transport.close()
+            return
+
+        for _, request_id, payload in messages:
+            try:
+                self.server.on_message(Request(self, request_id), payload)
+            except Exception:
+                logging.exception("Message from %s failed: ", self.addr)
+
+    def eof_received(self):
+        return False    # Close our side as well.
+
+    def connection_lost(self, exc):
+        self.server.disconnected(self)
+
+    def send_message(self, payload, kind = COMMAND, request_id = 0):
+        if self.legacy:
+            data = payload.encode() if isinstance(payload, str) else payload
+        else:
+            data = encode_frame(payload, kind, request_id, self.decoder.version or PROTOCOL_VERSION)
+        self.loop.call_soon_threadsafe(self.write, data)
+
+    def write(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.transport.close)
+
+
+class ControlServer():
+    """
+    Serves address, a (host, port) tuple. on_message(request, payload) is called on the
+    event loop for every message (see Request), on_connect(session) and
+    on_disconnect(session) when a client comes and goes.
+    """
+
+    def __init__(self, address, on_message, on_connect = None, on_disconnect = None):
+        self.address = address
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.sessions = set()
+
+    def connected(self, session):
+        self.sessions.add(session)
+        if self.on_connect is not None:
+            self.on_connect(session)
+
+    def disconnected(self, session):
+        self.sessions.discard(session)
+        if self.on_disconnect is not None:
+            self.on_disconnect(session)
+
+    async def serve(self):
+        loop = asyncio.get_event_loop()
+        server = await loop.create_server(lambda: ClientSession(self), *self.address, reuse_address = True)
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """Serves until the program is interrupted. Raises OSError if the address cannot be bound."""
+        asyncio.run(self.serve())
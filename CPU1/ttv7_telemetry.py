@@ -0,0 +1,153 @@
+#########################################################################################
+#
+# Program  : ttv7_telemetry.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Binary telemetry pushed by the robot (CPU1) to a controller (CTRL) which
+#            subscribed with CTRL~SUBSCRIBE,<rate>. Each frame is sent as a TELEMETRY
+#            message (see ttv7_framing.py) and holds
+#
+#                sequence (2 bytes) | field mask (2 bytes) | the fields in the mask
+#
+#            Only the fields which changed since the previous frame are in the mask, so
+#            a robot standing still costs 4 bytes a frame. Every KEYFRAME_INTERVAL frames
+#            all fields are sent again, which also brings a new subscriber up to date.
+#
+#            The same file is used on both sides, keep CTRL/ttv7_telemetry.py and
+#            CPU1/ttv7_telemetry.py identical.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import struct
+import threading
+import logging
+
+# Field name and encoding, in mask bit order. Fixed fields are struct formats, 'text' and
+# 'nodes' are a length byte followed by that many bytes.
+FIELDS = (
+    ('attitude', '3f'),         # Robot body roll, pitch and yaw.
+    ('head_sensors', 'B'),      # Homing sensors: bit 0 slide, bit 1 roll, bit 2 pitch.
+    ('levers', '8i'),           # CURRENT_AXLE_LIFT of the lever model, levers 5 ... C.
+    ('wheels', '4i'),           # Actual positions of Motor_1 ... Motor_4.
+    ('speed', 'i'),             # robbie.speed
+    ('command', 'text'),        # robbie.current_command
+    ('faulty_motors', 'nodes'), # Node IDs from get_all_motors_status().
+)
+
+HEADER = struct.Struct('<HH')
+KEYFRAME_INTERVAL = 25
+MAX_RATE = 20.0     # Frames per second.
+ALL_FIELDS = (1 << len(FIELDS)) - 1
+
+FORMATS = {name: struct.Struct('<' + kind) for name, kind in FIELDS if kind not in ('text', 'nodes')}
+
+
+def encode_field(name, kind, value):
+    if kind == 'text':
+        data = str(value).encode()[:255]
+        return bytes((len(data),)) + data
+    if kind == 'nodes':
+        data = bytes(value)[:255]
+        return bytes((len(data),)) + data
+    if isinstance(value, (tuple, list)):
+        return FORMATS[name].pack(*value)
+    return FORMATS[name].pack(value)
+
+
+def decode_field(name, kind, payload, offset):
+    """Returns the value of one field at offset and the offset after it."""
+    if kind in ('text', 'nodes'):
+        length = payload[offset]
+        data = bytes(payload[offset + 1:offset + 1 + length])
+        value = data.decode() if kind == 'text' else list(data)
+        return value, offset + 1 + length
+
+    fmt = FORMATS[name]
+    value = fmt.unpack_from(payload, offset)
+    if len(value) == 1:
+        value = value[0]
+    return value, offset + fmt.size
+
+
+class TelemetryEncoder():
+
+    def __init__(self):
+        self.sequence = 0
+        self.previous = {}
+
+    def encode(self, values):
+        """A frame of the fields of values (by name) that changed since the last frame."""
+        keyframe = self.sequence % KEYFRAME_INTERVAL == 0
+
+        mask = 0
+        body = []
+        for bit, (name, kind) in enumerate(FIELDS):
+            value = values.get(name)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                value = tuple(value)
+            if keyframe or self.previous.get(name) != value:
+                mask |= 1 << bit
+                body.append(encode_field(name, kind, value))
+                self.previous[name] = value
+
+        frame = HEADER.pack(self.sequence, mask) + b''.join(body)
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        return frame
+
+
+class TelemetryDecoder():
+    """Keeps the latest value of every field from the frames received so far."""
+
+    def __init__(self):
+        self.state = {}
+        self.sequence = None
+        self.missed = 0
+
+    def decode(self, payload):
+        """Applies one frame and returns a copy of the whole state."""
+        sequence, mask = HEADER.unpack_from(payload, 0)
+        if self.sequence is not None and sequence != (self.sequence + 1) & 0xFFFF:
+            self.missed += 1
+        self.sequence = sequence
+
+        offset = HEADER.size
+        for bit, (name, kind) in enumerate(FIELDS):
+            if mask & (1 << bit):
+                self.state[name], offset = decode_field(name, kind, payload, offset)
+
+        return dict(self.state)
+
+
+class TelemetryPublisher():
+    """
+    Sends send(frame) every 1/rate seconds, the frame built from sample(), a function
+    returning the field values by name, until stop() is called.
+    """
+
+    def __init__(self, sample, send, rate):
+        self.sample = sample
+        self.send = send
+        self.interval = 1.0 / min(rate, MAX_RATE)
+        self.encoder = TelemetryEncoder()
+        self.stopped = threading.Event()
+        threading.Thread(target = self.run, name = "telemetry", daemon = True).start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.send(self.encoder.encode(self.sample()))
+            except Exception:
+                logging.exception("Telemetry frame failed: ")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -33,6 +33,8 @@ import evdev
 import datetime as dt
 import threading
 import read_excel_data as excel
+from ttv7_framing import FramedSocket
+from ttv7_telemetry import TelemetryDecoder
 import openpyxl
 import io
 import struct
@@ -46,6 +48,9 @@ import ast
 HOST = '192.168.0.60'
 PORT = 22001
 
+TELEMETRY_RATE = 5          # Telemetry frames per second pushed by the robot.
+REPLY_TIMEOUT = 5           # Seconds to wait for the robot to answer a request.
+
 
 customtkinter.set_appearance_mode("Light")
   
@@ -80,6 +85,10 @@ photos = [None] * NUM_CAMS  # Store Tkinter-compatible images
 # Queue to store frames for each camera
 frame_queues = [queue.Queue(maxsize=1) for _ in range(NUM_CAMS)]
 
+# Telemetry pushed by the robot, the latest state is rendered by UpdateTelemetry().
+telemetry = TelemetryDecoder()
+latest_telemetry = None
+
 
 class MainFrame(customtkinter.CTk):
     
@@ -915,14 +924,14 @@ class MainFrame(customtkinter.CTk):
         if  self.LightsButton.cget("fg_color") == "transparent":
             self.LightsButton.configure(fg_color = "orange")
             command = 'CTRL~L-TOGGLE'
-            s.send(command.encode())
+            SendCommand(command)
             print(command)
             
         
         else:
             self.LightsButton.configure(fg_color = "transparent")
             command = 'CTRL~L-TOGGLE'
-            s.send(command.encode())
+            SendCommand(command)
             print(command)
             
             
@@ -947,6 +956,112 @@ class MainFrame(customtkinter.CTk):
 
 
 
+# ------------------ Network client -------------------------------------------------------------------------------------------
+#
+# The Tk main loop never touches the socket. Commands are sent by NetworkThread() and replies
+# come back through the completions queue, which ProcessCompletions() empties with after().
+
+
+network_jobs = queue.Queue()    # Functions for NetworkThread() to call, in order.
+completions = queue.Queue()     # PendingRequests whose reply arrived, for the Tk thread.
+
+SPINNER = '|/-\\'
+
+
+def NetworkThread():
+    while True:
+        job = network_jobs.get()
+        try:
+            job()
+        except (OSError, NameError) as msg:     # NameError: not connected yet, so no socket.
+            print(f"Sending to the robot failed: {msg}")
+
+
+def SendCommand(command):
+    # Send a command that has no reply, from any thread, without waiting for the network.
+    network_jobs.put(lambda: s.send_message(command))
+
+
+class PendingRequest():
+    """
+    A command whose reply is handed to on_reply(reply) on the Tk thread. Must be created on
+    the Tk thread. While waiting, widget (optional) is disabled and shows a spinner; after
+    timeout seconds without a reply it shows NO REPLY and on_reply is never called.
+    """
+
+    def __init__(self, command, on_reply, widget = None, timeout = REPLY_TIMEOUT):
+        self.command = command
+        self.on_reply = on_reply
+        self.widget = widget
+        self.timeout = timeout
+        self.future = None
+        self.finished = False
+        self.step = 0
+
+        if widget is not None:
+            self.text = widget.cget('text')
+            widget.configure(state = 'disabled')
+            self.Spin()
+
+        app.after(int(timeout * 1000), self.Expire)
+        network_jobs.put(self.Send)
+        print(command)
+
+    def Send(self):
+        # Network thread.
+        try:
+            future = s.request_async(self.command)
+        except (OSError, NameError) as msg:
+            print(f"Sending to the robot failed: {msg}")
+            return      # Expire() reports it.
+
+        self.future = future
+        future.add_done_callback(lambda future: completions.put(self))
+
+    def Spin(self):
+        if not self.finished:
+            self.widget.configure(text = self.text + ' ' + SPINNER[self.step % len(SPINNER)])
+            self.step += 1
+            app.after(150, self.Spin)
+
+    def Restore(self, text = None):
+        if self.widget is not None:
+            self.widget.configure(text = text or self.text, state = 'normal')
+
+    def Finish(self):
+        if self.finished:
+            return
+        reply = self.future.result()
+        if not reply:
+            self.Fail("connection to the robot lost")
+            return
+
+        self.finished = True
+        self.Restore()
+        self.on_reply(reply)
+
+    def Expire(self):
+        if not self.finished:
+            if self.future is not None:
+                s.forget_request(self.future.request_id)
+            self.Fail(f"no reply within {self.timeout}s")
+
+    def Fail(self, reason):
+        self.finished = True
+        print(f"{self.command}: {reason}.")
+        if self.widget is not None:
+            self.Restore('NO REPLY')
+            app.after(2000, self.Restore)
+
+
+def ProcessCompletions():
+    # Hand the replies that arrived to their handlers, on the Tk thread.
+    while not completions.empty():
+        completions.get().Finish()
+
+    app.after(20, ProcessCompletions)
+
+
 # ------------------ Event functions ------------------------------------------------------------------------------------------
 
 def ControllerSelection():
@@ -1259,7 +1374,7 @@ def Automatic():
             
             command = base_command + speed_command + '~' + direction_command + '~' + length_command + '~' + str(tubes_across) + '~' + tubesize_command + '~' + str(runs_per_tube_command)
             print(command)
-            s.send(command.encode())
+            SendCommand(command)
                 
     
     elif start_position_mode == "Manual Distance":
@@ -1313,20 +1428,38 @@ def Automatic():
                 tubesize_command = 'B'
             
             
+            runs_per_tube_command = RunsPerTube
+            
+            # The robot measures the run length with its wheel encoders, so it needs the wheel size.
+            SendWheelDiameter()
+            
             command = base_command + speed_command + '~' + direction_command + '~' + str(furnace_length) + '~' + str(tubes_across) + '~' + tubesize_command + '~' + str(runs_per_tube_command)
             print(command)
-            s.send(command.encode())
+            SendCommand(command)
                 
         
         
 
+def SendWheelDiameter():
+    
+    if app.wheel_sizeComboBoxVar.get() == 'Small':
+        excel.save_wheel_diameter(101.6)
+    elif app.wheel_sizeComboBoxVar.get() == 'Big':
+        excel.save_wheel_diameter(152.4)
+    
+    command = 'CTRL~WHEEL,' + str(excel.wheel_diameter)
+    SendCommand(command)
+    print(command)
+
+
 def SaveStartPosition():
+    # Save start position for automatic run.
+    PendingRequest('CTRL~SAVEMOTORPOS', StartPositionSaved, app.SaveStartPositionButton)
+
+
+def StartPositionSaved(Robot_reply):
     global start_position
     
-    # Save start position for automatic run.
-    command = 'CTRL~SAVEMOTORPOS'
-    s.send(command.encode())
-    Robot_reply = s.recv(32)
     Robot_msg = Robot_reply.decode('ascii')
     
     app.SaveStartPositionButton.place_forget()
@@ -1338,15 +1471,15 @@ def SaveStartPosition():
     
     start_position = int(Robot_msg)
     
-    print(command)
     
 def SaveFinishPosition():
+    # Save finish position for automatic run.
+    PendingRequest('CTRL~SAVEMOTORPOS', FinishPositionSaved, app.SaveFinishPositionButton)
+
+
+def FinishPositionSaved(Robot_reply):
     global finish_position
     
-    # Save start position for automatic run.
-    command = 'CTRL~SAVEMOTORPOS'
-    s.send(command.encode())
-    Robot_reply = s.recv(32)
     Robot_msg = Robot_reply.decode('ascii')
     
     app.SaveFinishPositionButton.place_forget()
@@ -1359,37 +1492,28 @@ def SaveFinishPosition():
     
     finish_position = int(Robot_msg)
     
-    print(command)
 
 def Forward():
     # Request the rover to move forwards at the speed currently set.
     command = 'CTRL~FORWARD'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
 def Reverse():
     # Request the rover to move backwards at the speed currently set.
     command = 'CTRL~REVERSE'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
 def Faster():
     # Increment the speed parameter.
-    command = 'CTRL~FASTER'
-    s.send(command.encode())
-    motor_speed_set = s.recv(32)
-    CalculateVehicleSpeed(motor_speed_set)
-    print(command)
+    PendingRequest('CTRL~FASTER', CalculateVehicleSpeed, app.SpeedVarLabel)
     
 def Slower():
     # Decrement the speed parameter.
-    command = 'CTRL~SLOWER'
-    s.send(command.encode())
-    motor_speed_set = s.recv(32)
-    CalculateVehicleSpeed(motor_speed_set)
-    print(command)
+    PendingRequest('CTRL~SLOWER', CalculateVehicleSpeed, app.SpeedVarLabel)
     
 def CalculateVehicleSpeed(ack_motor_speed_reply):
     # Obtain robot speed.
@@ -1409,7 +1533,7 @@ def OscillateLance():
             FinishOscillationAngle = app.FinishOscillationComboBox.get()
             
             command = 'ADMN~OSCILLATE' + '~' + str(																																																																																																																																																								StartOscillationAngle) + ',' + str(FinishOscillationAngle)
-            s.send(command.encode())
+            SendCommand(command)
             print(command)
             
             
@@ -1423,25 +1547,71 @@ def OscillateLance():
     else:
         
         command = 'ADMN~OSCILLATE' + '~' + 'STOP'
-        s.send(command.encode()) 
+        SendCommand(command) 
         print(command)
          
                 
 
+def SubscribeTelemetry():
+    # Ask the robot to push its telemetry, rendered by UpdateTelemetry().
+    command = 'CTRL~SUBSCRIBE,' + str(TELEMETRY_RATE)
+    try:
+        print(s.request(command, timeout = 2))
+    except socket.timeout:
+        print("The robot does not stream telemetry, use Get Status instead.")
+    print(command)
+
+
+def TelemetryReceived(payload):
+    # Called on the socket reader thread, so only keeps the frame for the GUI.
+    global latest_telemetry
+    latest_telemetry = telemetry.decode(payload)
+
+
+def UpdateTelemetry():
+    # Updates the status labels from the latest telemetry frame, never waiting for the robot.
+    state = latest_telemetry
+    
+    if state is not None:
+        if 'attitude' in state:
+            RobotRoll, RobotPitch, RobotYaw = state['attitude']
+            app.IMURollStatusLabel.configure(text = 'Roll: ' + f'{RobotRoll:.1f}')
+            app.IMUPitchStatusLabel.configure(text = 'Pitch: ' + f'{RobotPitch:.1f}')
+            app.IMUYawStatusLabel.configure(text = 'Yaw: ' + f'{RobotYaw:.1f}')
+        
+        if 'head_sensors' in state:
+            sensors = state['head_sensors']
+            app.SlideSensorLabel.configure(text = 'Slide: ' + ('Yes' if sensors & 1 else 'No'))
+            app.RollSensorLabel.configure(text = 'Roll: ' + ('Yes' if sensors & 2 else 'No'))
+            app.PitchSensorLabel.configure(text = 'Pitch: ' + ('Yes' if sensors & 4 else 'No'))
+        
+        if 'speed' in state:
+            pctg_speed = state['speed'] / 50
+            app.SpeedVarLabel.configure(text = str(int(pctg_speed)) + ' %')
+            app.SpeedVarLabel2.configure(text = str(int(pctg_speed)) + ' %')
+        
+        if 'faulty_motors' in state:
+            if not state['faulty_motors']:
+                app.MotorsStatusValuesLabel.configure(text = 'All motors are enabled and working')
+            else:
+                app.MotorsStatusValuesLabel.configure(text = 'Faulty motors: \n' + str(state['faulty_motors']))
+    
+    app.after(200, UpdateTelemetry)
+
+
 def GetSensorStatus():
-    # Return Head, Motors and IMU values.
+    # Return Head, Motors and IMU values. The three requests are in flight together.
     GetHeadSensorValues()
     GetIMUValues()
     GetMotorsStatus()
     
     
 def GetMotorsStatus():
-    
     # Get status from all Motors.
-    command = 'CTRL~MOTORS_STATUS'
-    s.send(command.encode())
-    s.settimeout(5)
-    Robot_reply = s.recv(64)
+    PendingRequest('CTRL~MOTORS_STATUS', ShowMotorsStatus, app.GetStatusButton)
+
+
+def ShowMotorsStatus(Robot_reply):
     Robot_msg = Robot_reply.decode('ascii')
     
     print(Robot_reply)
@@ -1457,19 +1627,15 @@ def GetMotorsStatus():
     
     
     
-    print(command)
-    
-    
     
     
     
 def GetHeadSensorValues():
+    # Get distance from robot head sensors.
+    PendingRequest('CTRL~HEAD_SENSORS', ShowHeadSensorValues)
 
 
-    # Get distance from robot head sensors.
-    command = 'CTRL~HEAD_SENSORS'
-    s.send(command.encode())
-    Robot_reply = s.recv(32)
+def ShowHeadSensorValues(Robot_reply):
     Robot_msg = Robot_reply.decode('ascii')
     
     print(Robot_reply)
@@ -1501,37 +1667,31 @@ def GetHeadSensorValues():
     else:
         app.PitchSensorLabel.configure(text = 'Pitch: ' + 'No')
         
-    
-    
-    
-   
-    print(command)
 
 
 
 def GetIMUValues():
+    # Get values from robot IMU.
+    PendingRequest('CTRL~IMU', ShowIMUValues)
+
+
+def ShowIMUValues(Robot_reply):
     global RobotRoll, RobotPitch, RobotYaw
 
-    # Get values from robot IMU.
-    command = 'CTRL~IMU'
-    s.send(command.encode())
-    Robot_reply = s.recv(32)
     Robot_msg = Robot_reply.decode('ascii')
     
     print(Robot_reply)
     
     Robot_msg = Robot_msg.split(",")
 
-    RobotRoll = int(Robot_msg[0])
-    RobotPitch = int(Robot_msg[1])
-    RobotYaw = int(Robot_msg[2])
+    RobotRoll = float(Robot_msg[0])
+    RobotPitch = float(Robot_msg[1])
+    RobotYaw = float(Robot_msg[2])
     
-    app.IMURollStatusLabel.configure(text = 'Roll: ' + str(int(RobotRoll)))
-    app.IMUPitchStatusLabel.configure(text = 'Pitch: ' + str(int(RobotPitch)))
-    app.IMUYawStatusLabel.configure(text = 'Yaw: ' + str(int(RobotYaw)))
+    app.IMURollStatusLabel.configure(text = 'Roll: ' + f'{RobotRoll:.1f}')
+    app.IMUPitchStatusLabel.configure(text = 'Pitch: ' + f'{RobotPitch:.1f}')
+    app.IMUYawStatusLabel.configure(text = 'Yaw: ' + f'{RobotYaw:.1f}')
     
-
-    print(command)
     
 
 def LeftClimb():
@@ -1545,7 +1705,7 @@ def LeftClimb():
     elif TubeSize == "Big":
         command = 'CTRL~L-CLIMB,B'
 
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
@@ -1560,92 +1720,84 @@ def RightClimb():
     elif TubeSize == "Big":
         command = 'CTRL~R-CLIMB,B'
 
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
 def Axle1Up():
     # Raise the front set of wheels to clear a baffle plate.
     command = 'CTRL~RAISE1'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle1Down():
     # Lower the front set of wheels to clear a baffle plate.
     command = 'CTRL~LOWER1'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle2Up():
     # Raise the 2nd set of wheels to clear a baffle plate.
     command = 'CTRL~RAISE2'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle2Down():
     # Lower the 2nd set of wheels to clear a baffle plate.
     command = 'CTRL~LOWER2'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle3Up():
     # Raise the 3rd set of wheels to clear a baffle plate.
     command = 'CTRL~RAISE3'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle3Down():
     # Lower the 3rd set of wheels to clear a baffle plate.
     command = 'CTRL~LOWER3'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle4Up():
     # Raise the back set of wheels to clear a baffle plate.
     command = 'CTRL~RAISE4'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def Axle4Down():
     # Lower the back set of wheels to clear a baffle plate.
     command = 'CTRL~LOWER4'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
-    sleep(1)
     
 def TiltRight():
     # Show stream of what front camera can see.
     command = 'CTRL~TILTR'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
 def TiltLeft():
     # Show stream of what front camera can see.
     command = 'CTRL~TILTL'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
 def Level():
     # Show stream of what front camera can see.
     command = 'CTRL~LEVEL'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
@@ -1655,7 +1807,7 @@ def HomeHead():
     if head_initialised:
         # Home the head motors
         command = 'CTRL~HOME_HEAD'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1672,7 +1824,7 @@ def ManualHomeHead():
     if head_initialised:
         # Home the head motors
         command = 'CTRL~MANUAL_HOME'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1688,7 +1840,7 @@ def SlideHome():
     if head_initialised:
         # Home the head motors
         command = 'CTRL~SLIDE_HOME'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1705,7 +1857,7 @@ def RollHome():
     if head_initialised:
         # Home the head motors
         command = 'CTRL~ROLL_HOME'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1722,7 +1874,7 @@ def PitchHome():
     if head_initialised:
         # Home the head motors
         command = 'CTRL~PITCH_HOME'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1738,7 +1890,7 @@ def InitHeadMotors():
     
     # Home the head motors
     command = 'CTRL~HEAD_INIT'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
@@ -1765,7 +1917,7 @@ def LanceAngleA():
             app.AnglesValuesLabel.place(x = 100, y = 330)
             
             command = 'CTRL~LANCE_ANGLE_A,' + str(LancingPositions[0][0]) + ',' + str(LancingPositions[0][1])
-            s.send(command.encode())
+            SendCommand(command)
             #reply = s.recv(32)
             print(command)
         
@@ -1797,7 +1949,7 @@ def LanceAngleB():
             app.AnglesValuesLabel.place(x = 100, y = 330)
             
             command = 'CTRL~LANCE_ANGLE_B,' + str(LancingPositions[1][0]) + ',' + str(LancingPositions[1][1])
-            s.send(command.encode())
+            SendCommand(command)
             #reply = s.recv(32)
             print(command)
         
@@ -1817,7 +1969,7 @@ def SlideToAngle():
         Angle = app.SlideTextBox.get("1.0", 'end-1c')
         if int(Angle) <= 94:
             command = 'CTRL~SLIDEANGLE,' + str(Angle)
-            s.send(command.encode())
+            SendCommand(command)
             #reply = s.recv(32)
             print(command)
             
@@ -1838,7 +1990,7 @@ def SlideLeft():
         
         # Move Slide to the left.
         command = 'CTRL~SLIDEL'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
     
@@ -1853,7 +2005,7 @@ def SlideRight():
         
         # Move Slide to the right.
         command = 'CTRL~SLIDER'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1871,7 +2023,7 @@ def RollToAngle():
         
         if Angle < 180 or Angle > -180:
             command = 'CTRL~ROLLANGLE,' + str(Angle)
-            s.send(command.encode())
+            SendCommand(command)
             #reply = s.recv(32)
             print(command)
             
@@ -1890,7 +2042,7 @@ def RollClock():
         
         # Show stream of what front camera can see.
         command = 'CTRL~ROLLCLOCK'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1905,7 +2057,7 @@ def RollAnticlock():
         
         # Show stream of what front camera can see.
         command = 'CTRL~ROLLANTICLOCK'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
     
@@ -1921,7 +2073,7 @@ def PitchToAngle():
         # Show stream of what front camera can see.
         Angle = app.PitchTextBox.get("1.0", 'end-1c')
         command = 'CTRL~PITCHANGLE,' + str(Angle)
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
     
@@ -1936,7 +2088,7 @@ def PitchUp():
     
         # Show stream of what front camera can see.
         command = 'CTRL~PITCHUP'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
     
@@ -1951,7 +2103,7 @@ def PitchDown():
         
         # Show stream of what front camera can see.
         command = 'CTRL~PITCHDOWN'
-        s.send(command.encode())
+        SendCommand(command)
         #reply = s.recv(32)
         print(command)
         
@@ -1963,21 +2115,21 @@ def PitchDown():
 def Stop():
     # Stop the rover immediately
     command = 'ADMN~STOP'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
 def Pause():
     # Stop the rover immediately
     command = 'ADMN~PAUSE'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
 def Resume():
     # Stop the rover immediately
     command = 'ADMN~RESUME'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
@@ -1985,14 +2137,14 @@ def Resume():
 def Initialise():
     # Re-Initialise the robot (after crossing tubes)
     command = 'CTRL~FULL_INIT'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
 
 def LevelRobot():
     # Level the robot 
     command = 'CTRL~Level'
-    s.send(command.encode())
+    SendCommand(command)
     #reply = s.recv(32)
     print(command)
     
@@ -2010,13 +2162,16 @@ def AttemptConnection():
     while True:
         try:
             
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.connect((HOST, PORT))
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.connect((HOST, PORT))
+            s = FramedSocket(sock)  # Every command and reply is sent as one framed message.
+            s.start_reader(TelemetryReceived)
             
             connected = True
             print("\nSUCCESSFUL CONNECTION WITH THE ROBOT\n")
             
+            SubscribeTelemetry()
             MonitorConnection()
             
             break # Exit the loop if connection succceds
@@ -2045,7 +2200,7 @@ def MonitorConnection():
             try:
                 
                 s.settimeout(2)
-                s.sendall(b'ping')
+                s.send_message('ping')
                 
             except:
                 connected = False
@@ -2063,6 +2218,9 @@ if __name__ == '__main__':
     Connection_thread = threading.Thread(target = AttemptConnection)
     Connection_thread.start()
     
+    network_thread = threading.Thread(target = NetworkThread, daemon = True)
+    network_thread.start()
+    
     
     app = MainFrame() # Define GUI object
     app.attributes("-fullscreen", True) # Set full-screen mode	
@@ -2109,6 +2267,8 @@ if __name__ == '__main__':
         
     # Start updating the Tkinter GUI    
     UpdateFrames()
+    UpdateTelemetry()
+    ProcessCompletions()
     
     #Run Tkinter main loop
     app.mainloop()
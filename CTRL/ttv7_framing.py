@@ -0,0 +1,322 @@
+#########################################################################################
+#
+# Program  : ttv7_framing.py
+# Version  : 0.0.0.1
+#
+# Author   : Pablo Cordoba
+# Updated  : 18/10/2026 at 09:00
+# Function : Message framing for the control socket between the robot controller (CTRL)
+#            and the robot (CPU1). TCP is a byte stream: two commands sent back to back
+#            can arrive in one recv() and one command can arrive in two, so every
+#            message is sent with a header in front of it (numbers big endian):
+#
+#                version 1:  version (1) | kind (1) | payload length (2)
+#                version 2:  version (1) | kind (1) | request id (2) | payload length (2)
+#
+#            A command sent with a request id is answered with the same id, so several
+#            requests can wait for their replies at once. Id 0 means no reply is waited
+#            for. Each peer is answered in the version it sends.
+#
+#            The version byte is never a printable character, which is how a peer still
+#            sending bare text (the old protocol) is recognised by the first byte it
+#            sends. Such a peer is answered in bare text as well.
+#
+#            The same file is used on both sides, keep CTRL/ttv7_framing.py and
+#            CPU1/ttv7_framing.py identical.
+#
+# Copyright: Tubetech Industrial Ltd. 2023.
+#
+# External dependencies (Python files):
+#
+#
+#########################################################################################
+
+import socket
+import struct
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+
+PROTOCOL_VERSION = 2
+
+# Message kinds.
+COMMAND = 1      # CTRL -> CPU1, 'CTRL~...' and 'ADMN~...' commands and the 'ping' keepalive.
+REPLY = 2        # CPU1 -> CTRL, the answer to a command.
+TELEMETRY = 3    # CPU1 -> CTRL, data sent without being asked for.
+
+HEADERS = {
+    1: struct.Struct('>BBH'),
+    2: struct.Struct('>BBHH'),
+}
+MAX_PAYLOAD = 0xFFFF
+MAX_REQUEST_ID = 0xFFFF
+BUFFER_SIZE = 4096
+
+
+def encode_frame(payload, kind = COMMAND, request_id = 0, version = PROTOCOL_VERSION):
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Message of {len(payload)} bytes is too long to frame.")
+
+    if version == 1:
+        return HEADERS[1].pack(version, kind, len(payload)) + payload
+    return HEADERS[2].pack(version, kind, request_id, len(payload)) + payload
+
+
+def header_of(buffer, offset):
+    """The header struct for the frame starting at offset. Raises ValueError for an unknown version."""
+    version = buffer[offset]
+    if version not in HEADERS:
+        raise ValueError(f"Framing lost: version byte {version}, expected one of {list(HEADERS)}.")
+    return HEADERS[version]
+
+
+def unpack_header(header, buffer, offset):
+    """(version, kind, request id, length) of the frame at offset."""
+    fields = header.unpack_from(buffer, offset)
+    if len(fields) == 3:
+        return fields[0], fields[1], 0, fields[2]
+    return fields
+
+
+class FrameDecoder():
+    """
+    Turns the bytes received from a socket back into (kind, request id, payload) messages. Data is
+    received straight into one reusable buffer with recv_into(), which only grows if a
+    message does not fit in it.
+    """
+
+    def __init__(self, size = BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        self.start = 0          # First byte not yet decoded.
+        self.end = 0            # One past the last byte received.
+        self.legacy = None      # Unknown until the first byte arrives.
+        self.version = None     # Protocol version of the last frame from the peer.
+
+    def receive(self, sock):
+        """
+        Receives once from sock and returns the list of complete messages, which may be
+        empty. Returns None when the peer has closed the connection.
+        """
+        with self.get_buffer() as view:
+            count = sock.recv_into(view)
+        if count == 0:
+            return None
+
+        return self.buffer_updated(count)
+
+    def get_buffer(self):
+        """The free end of the buffer, for the next recv_into(). Also what asyncio.BufferedProtocol asks for."""
+        self.make_room()
+        return memoryview(self.buffer)[self.end:]
+
+    def buffer_updated(self, count):
+        """Accounts for count bytes received into get_buffer() and returns the complete messages."""
+        self.end += count
+
+        if self.legacy is None:
+            self.legacy = self.buffer[self.start] not in HEADERS
+
+        return self.decode()
+
+    def decode(self):
+        messages = []
+
+        if self.legacy:
+            # Old peers send one bare text command per send(), the best we can do is
+            # take whatever arrived as one message, as before.
+            messages.append((COMMAND, 0, bytes(self.buffer[self.start:self.end])))
+            self.start = self.end
+            return messages
+
+        while self.end > self.start:
+            header = header_of(self.buffer, self.start)
+            if self.end - self.start < header.size:
+                break
+
+            version, kind, request_id, length = unpack_header(header, self.buffer, self.start)
+            payload = self.start + header.size
+            if self.end - payload < length:
+                break
+
+            self.version = version
+            messages.append((kind, request_id, bytes(self.buffer[payload:payload + length])))
+            self.start = payload + length
+
+        return messages
+
+    def make_room(self):
+        """Moves a partial message to the front of the buffer, growing it if the message needs more space."""
+        if self.start == self.end:
+            self.start = self.end = 0
+            return
+
+        if self.end < len(self.buffer):
+            return
+
+        pending = self.end - self.start
+        needed = pending + 1
+        if not self.legacy:
+            header = header_of(self.buffer, self.start)
+            if pending >= header.size:
+                needed = max(needed, header.size + unpack_header(header, self.buffer, self.start)[3])
+
+        if needed > len(self.buffer):
+            # A new buffer rather than resizing this one, which a memoryview may still refer to.
+            buffer = bytearray(needed)
+            buffer[:pending] = self.buffer[self.start:self.end]
+            self.buffer = buffer
+        else:
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+        self.start, self.end = 0, pending
+
+
+class FramedSocket():
+    """
+    A connected socket which sends and receives whole messages. Sending is locked, so the
+    keepalive and commands from different threads never interleave their bytes.
+
+    With start_reader() a thread receives everything and request() can be used from any
+    number of threads: each waits for the reply carrying its own request id.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.pending = deque()
+        self.send_lock = threading.Lock()
+        self.requests = {}          # Request id -> Future of the reply, oldest first.
+        self.requests_lock = threading.Lock()
+        self.next_request_id = 1
+        self.on_telemetry = None
+        self.closed = False
+
+    @property
+    def legacy(self):
+        return bool(self.decoder.legacy)
+
+    def send_message(self, payload, kind = COMMAND, request_id = 0):
+        if self.legacy:
+            data = payload.encode() if isinstance(payload, str) else payload
+        else:
+            data = encode_frame(payload, kind, request_id, self.decoder.version or PROTOCOL_VERSION)
+
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def receive(self):
+        """
+        Receives once and returns the list of complete message payloads, possibly empty,
+        or None when the peer has closed the connection.
+        """
+        messages = self.decoder.receive(self.sock)
+        if messages is None:
+            return None
+        return [payload for _, _, payload in messages]
+
+    def receive_message(self):
+        """Blocks until the next whole message arrives and returns its payload, b'' if the connection closed."""
+        while not self.pending:
+            messages = self.receive()
+            if messages is None:
+                return b''
+            self.pending.extend(messages)
+
+        return self.pending.popleft()
+
+    def start_reader(self, on_telemetry):
+        """
+        Receives on a thread of its own from now on: TELEMETRY messages are passed to
+        on_telemetry(payload) as they arrive, replies complete the request they answer.
+        """
+        self.on_telemetry = on_telemetry
+        threading.Thread(target = self.read_loop, name = "socket-reader", daemon = True).start()
+
+    def read_loop(self):
+        while True:
+            try:
+                messages = self.decoder.receive(self.sock)
+            except socket.timeout:
+                continue
+            except (OSError, ValueError):
+                messages = None
+
+            if messages is None:
+                self.fail_requests()
+                return
+
+            for kind, request_id, payload in messages:
+                if kind == TELEMETRY:
+                    try:
+                        self.on_telemetry(payload)
+                    except Exception:
+                        logging.exception("Telemetry message failed: ")
+                else:
+                    self.complete_request(request_id, payload)
+
+    def complete_request(self, request_id, payload):
+        with self.requests_lock:
+            future = self.requests.pop(request_id, None)
+            if future is None and self.decoder.version != PROTOCOL_VERSION and self.requests:
+                # A peer without request ids answers in order, so this is the oldest request's reply.
+                future = self.requests.pop(next(iter(self.requests)))
+
+        if future is not None:
+            future.set_result(payload)
+        elif request_id != 0:
+            print(f"Reply {payload} to request {request_id} arrived after it was given up.")
+
+    def fail_requests(self):
+        """The connection closed: every request still waiting gets b'', as recv() would return."""
+        with self.requests_lock:
+            self.closed = True
+            futures = list(self.requests.values())
+            self.requests.clear()
+
+        for future in futures:
+            future.set_result(b'')
+
+    def request_async(self, payload):
+        """Sends a command and returns the Future of its reply. Needs start_reader()."""
+        future = Future()
+        with self.requests_lock:
+            if self.closed:
+                future.set_result(b'')
+                return future
+
+            request_id = self.next_request_id
+            self.next_request_id = self.next_request_id % MAX_REQUEST_ID + 1
+            self.requests[request_id] = future
+            future.request_id = request_id
+
+        try:
+            self.send_message(payload, COMMAND, request_id)
+        except OSError:
+            self.forget_request(request_id)
+            raise
+        return future
+
+    def forget_request(self, request_id):
+        with self.requests_lock:
+            self.requests.pop(request_id, None)
+
+    def request(self, payload, timeout = None):
+        """
+        Sends a command and returns the payload of its reply, b'' if the connection closed.
+        Raises socket.timeout after timeout seconds, or after the socket's own timeout when
+        none is given.
+        """
+        future = self.request_async(payload)
+        try:
+            return future.result(timeout if timeout is not None else self.sock.gettimeout())
+        except TimeoutError:
+            self.forget_request(future.request_id)
+            raise socket.timeout(f"No reply to {payload} within the time allowed.")
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        self.sock.close()